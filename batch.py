@@ -0,0 +1,255 @@
+"""
+离线批量渲染：不经过HTTP，直接读取本地保存的BimJson文件，用多进程渲染平面图
+
+    python batch.py 输入 [输入 ...] --out 输出目录 [--workers N] [--format png|geojson]
+                    [--layers rooms,hard,...] [--pixel-size 宽] [--force] [--summary 路径]
+
+- 输入为目录（递归查找 *.json）、清单文件（.txt / .lst，每行一个路径，相对路径相对清单所在目录）或单个BimJson文件
+- 输出按输入的相对路径放到输出目录下，扩展名换成 .png / .geojson；先写临时文件再替换，中断不会留下写了一半的文件
+- 可续跑：输出已存在且不早于输入的文档直接跳过（--force 时全部重绘）；失败的文档没有输出，下次运行会重试
+- worker 由主进程 fork，继承主进程预热好的模型目录、字体缓存和Figure池；
+  模型目录为共享的SQLite，每个文档处理前同步其他worker新写入的条目，同一模型不重复请求模型接口
+- 结束时在输出目录写入汇总（batch-summary.json）：各阶段耗时分布、吞吐量和失败列表
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+SUMMARY_NAME = 'batch-summary.json'
+MANIFEST_SUFFIXES = ('.txt', '.lst')
+FORMATS = {'png': '.png', 'geojson': '.geojson'}
+STAGES = ('load', 'scene', 'render', 'total')
+# 每处理该数量的文档输出一次进度
+PROGRESS_EVERY = 100
+
+
+def discover(inputs):
+    """把输入展开为 [(BimJson路径, 相对路径), ...]，相对路径决定输出位置；重复的文件只保留一次"""
+    documents = {}
+    for source in inputs:
+        if os.path.isdir(source):
+            for directory, _, names in os.walk(source):
+                for name in sorted(names):
+                    if name.endswith('.json'):
+                        path = os.path.join(directory, name)
+                        documents.setdefault(os.path.abspath(path), os.path.relpath(path, source))
+        elif source.endswith(MANIFEST_SUFFIXES):
+            base = os.path.dirname(os.path.abspath(source))
+            with open(source, encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line or line.startswith('#'):
+                        continue
+                    path = os.path.normpath(os.path.join(base, line))
+                    relative = os.path.relpath(path, base)
+                    if relative.startswith(os.pardir):
+                        relative = os.path.basename(path)
+                    documents.setdefault(path, relative)
+        else:
+            documents.setdefault(os.path.abspath(source), os.path.basename(source))
+    return sorted(documents.items(), key=lambda entry: entry[1])
+
+
+def output_path(out_dir, relative, fmt):
+    return os.path.join(out_dir, os.path.splitext(relative)[0] + FORMATS[fmt])
+
+
+def is_done(path, output):
+    """输出已存在且不早于输入时视为已完成"""
+    try:
+        return os.stat(output).st_mtime >= os.stat(path).st_mtime
+    except OSError:
+        return False
+
+
+def _write_atomic(output, write):
+    """在输出目录中写临时文件，写完后替换为正式输出"""
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(output) or '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(temp_path, output)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def render_document(job):
+    """
+    worker 中处理一个文档：读取BimJson、一次性查询全部模型、构建场景并写出结果
+    返回 {'input', 'output', 'status': 'rendered' | 'failed', 'timings': {阶段: 秒}, 'error'}
+    """
+    import catalog
+    import check
+    import draw
+    import geoexport
+    import scene as scene_builder
+
+    path, output, options = job
+    timings = {}
+    start = time.perf_counter()
+    try:
+        with open(path, encoding='utf-8') as f:
+            bimjson = json.load(f)
+        timings['load'] = time.perf_counter() - start
+
+        step = time.perf_counter()
+        catalog.sync()
+        model_dict = check.index_models(check.get_model(check.collect_model_ids(bimjson)))
+        scene = scene_builder.build_scene(bimjson, model_dict, layers=options['layers'])
+        timings['scene'] = time.perf_counter() - step
+
+        step = time.perf_counter()
+        if options['format'] == 'geojson':
+            text = geoexport.dumps(geoexport.scene_to_geojson(scene)).encode('utf-8')
+            _write_atomic(output, lambda f: f.write(text))
+        else:
+            dpi = draw.output_dpi(options['pixel_size'])
+            fig, ax = draw.build_figure(scene, dpi=dpi)
+            _write_atomic(output, lambda f: draw.save_figure(fig, f, dpi))
+        timings['render'] = time.perf_counter() - step
+    except Exception as e:
+        print(f"渲染失败 {path}: {e}")
+        return {'input': path, 'output': output, 'status': 'failed', 'timings': timings,
+                'error': f'{type(e).__name__}: {e}'}
+    timings['total'] = time.perf_counter() - start
+    return {'input': path, 'output': output, 'status': 'rendered', 'timings': timings, 'error': None}
+
+
+def _init_worker():
+    import check
+    check.DUMP_JSON = False
+
+
+def _distribution(values):
+    if not values:
+        return None
+    values = sorted(values)
+    return {
+        'count': len(values),
+        'mean': statistics.fmean(values),
+        'p50': values[len(values) // 2],
+        'p95': values[min(len(values) - 1, int(len(values) * 0.95))],
+        'max': values[-1],
+    }
+
+
+def summarize(results, skipped, workers, elapsed):
+    rendered = [result for result in results if result['status'] == 'rendered']
+    failed = [result for result in results if result['status'] == 'failed']
+    return {
+        'workers': workers,
+        'elapsed': elapsed,
+        'documents': len(results) + skipped,
+        'rendered': len(rendered),
+        'skipped': skipped,
+        'failed': len(failed),
+        'documents_per_second': len(rendered) / elapsed if elapsed > 0 else None,
+        'stages': {stage: _distribution([result['timings'][stage] for result in rendered])
+                   for stage in STAGES},
+        'failures': [{'input': result['input'], 'error': result['error']} for result in failed],
+    }
+
+
+def _failed(job, error):
+    path, output, _ = job
+    return {'input': path, 'output': output, 'status': 'failed', 'timings': {}, 'error': error}
+
+
+def run(documents, out_dir, options, workers, force=False):
+    """
+    渲染全部文档（跳过已完成的），返回汇总
+    同时在处理中的文档不超过进程数的两倍；worker 异常退出（如内存不足被杀）时，
+    其上正在处理的文档记为失败，重建进程池继续处理其余文档
+    """
+    jobs, skipped = [], 0
+    for path, relative in documents:
+        output = output_path(out_dir, relative, options['format'])
+        if not force and is_done(path, output):
+            skipped += 1
+            continue
+        jobs.append((path, output, options))
+    print(f"共 {len(documents)} 个文档，跳过已完成 {skipped} 个，待渲染 {len(jobs)} 个，{workers} 个进程")
+
+    start = time.perf_counter()
+    results = []
+    if jobs:
+        import serve
+        # fork 前在主进程加载模型目录并预热绘图，worker 写时复制共享
+        serve.warm_up()
+        context = multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else None)
+        pending = list(reversed(jobs))
+        while pending:
+            with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker) as executor:
+                running, submitted = {}, 0
+                while pending or running:
+                    try:
+                        # 提交成功后才从待处理中取出，进程池已损坏时提交失败的文档留给重建后的进程池
+                        while pending and len(running) < workers * 2:
+                            running[executor.submit(render_document, pending[-1])] = pending[-1]
+                            pending.pop()
+                            submitted += 1
+                        done, _ = wait(running, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            results.append(future.result())
+                            del running[future]
+                    except BrokenProcessPool:
+                        print(f"worker 进程异常退出，{len(running)} 个处理中的文档记为失败，重建进程池")
+                        results += [_failed(job, 'worker 进程异常退出') for job in running.values()]
+                        if not submitted and pending:
+                            # 新建的进程池一个文档都提交不了（如 worker 初始化出错），当前文档记为失败，避免反复重建
+                            results.append(_failed(pending.pop(), 'worker 进程异常退出'))
+                        break
+                    if len(results) % PROGRESS_EVERY < len(done):
+                        rate = len(results) / (time.perf_counter() - start)
+                        print(f"已处理 {len(results)}/{len(jobs)}，{rate:.1f} 个/秒")
+    return summarize(results, skipped, workers, time.perf_counter() - start)
+
+
+def main(argv=None):
+    import scene as scene_builder
+
+    parser = argparse.ArgumentParser(description='离线批量渲染BimJson文件')
+    parser.add_argument('inputs', nargs='+', help='BimJson目录、清单文件（.txt/.lst）或单个BimJson文件')
+    parser.add_argument('--out', required=True, help='输出目录')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='进程数，默认为CPU核数')
+    parser.add_argument('--format', choices=sorted(FORMATS), default='png', help='输出格式')
+    parser.add_argument('--layers', default=None, help='逗号分隔的图层，默认同 /generate-floorplan')
+    parser.add_argument('--pixel-size', type=int, default=None, help='输出图片的目标宽度（像素）')
+    parser.add_argument('--force', action='store_true', help='忽略已有输出，全部重新渲染')
+    parser.add_argument('--summary', default=None, help=f'汇总文件路径，默认为 输出目录/{SUMMARY_NAME}')
+    args = parser.parse_args(argv)
+
+    try:
+        options = {
+            'format': args.format,
+            'layers': scene_builder.parse_layers(args.layers),
+            'pixel_size': scene_builder.parse_pixel_size(args.pixel_size),
+        }
+    except ValueError as e:
+        parser.error(str(e))
+    # geojson 总是导出房间和全部构件
+    if args.format == 'geojson':
+        options['layers'] = frozenset(scene_builder.LAYERS)
+
+    documents = discover(args.inputs)
+    summary = run(documents, args.out, options, max(1, args.workers), args.force)
+    summary_path = args.summary or os.path.join(args.out, SUMMARY_NAME)
+    os.makedirs(os.path.dirname(os.path.abspath(summary_path)), exist_ok=True)
+    with open(summary_path, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    print(f"完成: 渲染 {summary['rendered']}，跳过 {summary['skipped']}，失败 {summary['failed']}，"
+          f"耗时 {summary['elapsed']:.1f} 秒，汇总见 {summary_path}")
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,74 @@
+"""
+/generate-floorplan 端到端压测：按给定并发发送请求，统计 p50/p95/p99 延迟和吞吐
+
+用法（在仓库根目录执行，先启动 benchmarks/stub_server.py 和服务本身）:
+    python -m benchmarks.loadtest --target http://127.0.0.1:5000 \\
+        --bim-url http://127.0.0.1:8001/bim/medium.json --concurrency 8 --requests 200
+"""
+import argparse
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+
+def run_load(target, bim_url, concurrency, total, timeout):
+    """并发发送 total 个请求，返回 (延迟列表, 错误数, 总耗时)"""
+    endpoint = f"{target.rstrip('/')}/generate-floorplan"
+    local = threading.local()
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def one_request(_):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        start = time.perf_counter()
+        try:
+            response = session.post(endpoint, json={'url': bim_url}, timeout=timeout)
+            ok = response.status_code == 200
+        except Exception as e:
+            print(f"请求失败: {e}")
+            ok = False
+        elapsed = time.perf_counter() - start
+        with lock:
+            (latencies if ok else errors).append(elapsed)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one_request, range(total)))
+    return latencies, len(errors), time.perf_counter() - start
+
+
+def report(latencies, errors, elapsed, concurrency):
+    total = len(latencies) + errors
+    print(f"并发 {concurrency}，请求 {total}，失败 {errors}，总耗时 {elapsed:.2f}s")
+    print(f"吞吐: {len(latencies) / elapsed:.2f} req/s")
+    if latencies:
+        p50, p95, p99 = np.percentile(np.array(latencies) * 1000, [50, 95, 99])
+        print(f"延迟: p50 {p50:.1f}ms  p95 {p95:.1f}ms  p99 {p99:.1f}ms  "
+              f"max {max(latencies) * 1000:.1f}ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='/generate-floorplan 压测')
+    parser.add_argument('--target', default='http://127.0.0.1:5000', help='服务地址')
+    parser.add_argument('--bim-url', default='http://127.0.0.1:8001/bim/medium.json',
+                        help='请求体中的BimJson地址')
+    parser.add_argument('-c', '--concurrency', type=int, default=4)
+    parser.add_argument('-n', '--requests', type=int, default=100)
+    parser.add_argument('--timeout', type=float, default=60.0, help='单个请求超时（秒）')
+    args = parser.parse_args(argv)
+
+    latencies, errors, elapsed = run_load(args.target, args.bim_url, args.concurrency,
+                                          args.requests, args.timeout)
+    report(latencies, errors, elapsed, args.concurrency)
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
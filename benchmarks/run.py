@@ -0,0 +1,140 @@
+"""
+绘图流水线基准测试：分别统计解析、场景构建、距离计算和渲染的耗时，并与保存的基线比较
+
+用法（在仓库根目录执行）:
+    python -m benchmarks.run                      # 运行全部用例并与基线比较
+    python -m benchmarks.run --cases small medium --repeat 5
+    python -m benchmarks.run --update-baseline    # 用本次结果覆盖基线
+
+任一阶段的中位耗时超过 基线 × 阈值 时判定为退化，进程以状态码1退出
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+import matplotlib
+matplotlib.use('Agg')
+
+import check
+import draw
+import scene as scene_builder
+from benchmarks import synthetic
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+# 用例：房间数、每个房间的顶点数、三类构件数量
+CASES = {
+    'small': dict(rooms=4, vertices=4, hard=5, hydropower=10, parametric=5),
+    'medium': dict(rooms=12, vertices=8, hard=30, hydropower=60, parametric=30),
+    'large': dict(rooms=40, vertices=8, hard=150, hydropower=400, parametric=150),
+    'complex_rooms': dict(rooms=12, vertices=64, hard=30, hydropower=60, parametric=30),
+}
+STAGES = ('parse', 'scene_build', 'clearance', 'render')
+
+# 低于该耗时（秒）的差异视为噪声，不判定退化
+NOISE_FLOOR = 0.002
+
+
+def run_case(params, repeat):
+    """运行单个用例，返回 {stage: [耗时, ...]}"""
+    bimjson, catalog = synthetic.generate_bim(**params)
+    document = json.dumps(bimjson, ensure_ascii=False)
+    check.get_model = synthetic.stub_get_model(catalog)
+    check.DUMP_JSON = False
+
+    timings = {stage: [] for stage in STAGES}
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parsed = json.loads(document)
+        timings['parse'].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        scene = scene_builder.build_scene(parsed)
+        timings['scene_build'].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        scene_builder.compute_clearances(scene)
+        timings['clearance'].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        draw.plot_room_with_furniture(scene, image_path=None)
+        timings['render'].append(time.perf_counter() - start)
+    return timings
+
+
+def summarize(timings):
+    return {stage: statistics.median(values) for stage, values in timings.items()}
+
+
+def compare(results, baseline, threshold):
+    """与基线比较，返回退化列表 [(case, stage, 当前, 基线), ...]"""
+    regressions = []
+    for case, stages in results.items():
+        for stage, current in stages.items():
+            reference = baseline.get('cases', {}).get(case, {}).get(stage)
+            if reference is None:
+                continue
+            if current > reference * threshold and current - reference > NOISE_FLOOR:
+                regressions.append((case, stage, current, reference))
+    return regressions
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='平面图绘制流水线基准测试')
+    parser.add_argument('--cases', nargs='+', choices=sorted(CASES), default=list(CASES))
+    parser.add_argument('--repeat', type=int, default=3, help='每个用例重复次数，取中位数')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='基线文件路径')
+    parser.add_argument('--threshold', type=float, default=None,
+                        help='退化阈值（当前/基线），默认取基线文件中的 threshold 或 1.3')
+    parser.add_argument('--update-baseline', action='store_true', help='用本次结果覆盖基线')
+    parser.add_argument('--json', dest='json_path', help='把本次结果写入该JSON文件')
+    args = parser.parse_args(argv)
+
+    baseline = load_baseline(args.baseline)
+    threshold = args.threshold or baseline.get('threshold', 1.3)
+
+    results = {}
+    print(f"{'case':<16}" + ''.join(f'{stage:>22}' for stage in STAGES))
+    for case in args.cases:
+        results[case] = summarize(run_case(CASES[case], args.repeat))
+        cells = []
+        for stage in STAGES:
+            current = results[case][stage]
+            reference = baseline.get('cases', {}).get(case, {}).get(stage)
+            cell = f'{current * 1000:.1f}ms'
+            if reference:
+                cell += f' ({current / reference:.2f}x)'
+            cells.append(f'{cell:>22}')
+        print(f'{case:<16}' + ''.join(cells))
+
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as file:
+            json.dump({'cases': results}, file, indent=2)
+
+    if args.update_baseline:
+        baseline.setdefault('threshold', threshold)
+        baseline.setdefault('cases', {}).update(results)
+        with open(args.baseline, 'w', encoding='utf-8') as file:
+            json.dump(baseline, file, indent=2)
+            file.write('\n')
+        print(f'基线已更新: {args.baseline}')
+        return 0
+
+    regressions = compare(results, baseline, threshold)
+    for case, stage, current, reference in regressions:
+        print(f'退化: {case}.{stage} {current * 1000:.1f}ms > 基线 {reference * 1000:.1f}ms × {threshold}')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
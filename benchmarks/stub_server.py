@@ -0,0 +1,99 @@
+"""
+本地上游桩服务：代替BimJson文件服务器和模型接口 pcLoadPlanGoodsList，用于离线压测
+
+用法（在仓库根目录执行）:
+    python -m benchmarks.stub_server --port 8001 --bim-latency-ms 30 --catalog-latency-ms 80 --jitter-ms 40
+    CATALOG_BASE_URL=http://127.0.0.1:8001 gunicorn main:app
+
+接口:
+    GET  /bim/<name>.json                        合成方案（name 为 benchmarks.run.CASES 中的用例名）
+                                                 或 --bim-dir 目录下的同名文件
+    POST /api/resGoods/pcLoadPlanGoodsList       与线上格式一致的模型查询
+"""
+import argparse
+import json
+import os
+import random
+import time
+
+from flask import Flask, abort, jsonify, request
+
+from benchmarks import synthetic
+from benchmarks.run import CASES
+
+app = Flask(__name__)
+
+# 运行参数，由命令行设置
+settings = {
+    'bim_latency': 0.0,
+    'catalog_latency': 0.0,
+    'jitter': 0.0,
+    'bim_dir': None,
+}
+documents = {}
+catalog = {}
+
+
+def load_fixtures(bim_dir=None, catalog_path=None):
+    """生成全部合成方案并合并模型目录；可额外加载真实BimJson目录和模型目录文件"""
+    for index, (name, params) in enumerate(CASES.items()):
+        bimjson, case_catalog = synthetic.generate_bim(seed=index, **params)
+        documents[name] = json.dumps(bimjson, ensure_ascii=False)
+        catalog.update(case_catalog)
+    if catalog_path:
+        with open(catalog_path, encoding='utf-8') as file:
+            for model in json.load(file):
+                catalog[str(model['id'])] = model
+    settings['bim_dir'] = bim_dir
+
+
+def sleep_with_jitter(latency):
+    """模拟上游延迟：基础延迟加 [0, jitter) 的随机抖动"""
+    delay = latency + random.uniform(0, settings['jitter'])
+    if delay > 0:
+        time.sleep(delay)
+
+
+@app.route('/bim/<name>.json', methods=['GET'])
+def bim_document(name):
+    sleep_with_jitter(settings['bim_latency'])
+    if name in documents:
+        return app.response_class(documents[name], mimetype='application/json')
+    bim_dir = settings['bim_dir']
+    if bim_dir:
+        path = os.path.join(bim_dir, f'{os.path.basename(name)}.json')
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as file:
+                return app.response_class(file.read(), mimetype='application/json')
+    abort(404)
+
+
+@app.route('/api/resGoods/pcLoadPlanGoodsList', methods=['POST'])
+def load_plan_goods_list():
+    sleep_with_jitter(settings['catalog_latency'])
+    ids = request.get_json(silent=True) or []
+    data = [catalog[str(i)] for i in ids if str(i) in catalog]
+    return jsonify({'success': True, 'code': 2000, 'data': data})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='BimJson与模型接口的本地桩服务')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--bim-latency-ms', type=float, default=0.0, help='BimJson下载基础延迟')
+    parser.add_argument('--catalog-latency-ms', type=float, default=0.0, help='模型接口基础延迟')
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help='在基础延迟上叠加的随机抖动上限')
+    parser.add_argument('--bim-dir', help='额外提供的BimJson文件目录，按 /bim/<文件名>.json 访问')
+    parser.add_argument('--catalog', help='额外的模型目录JSON文件（模型列表）')
+    args = parser.parse_args(argv)
+
+    settings['bim_latency'] = args.bim_latency_ms / 1000
+    settings['catalog_latency'] = args.catalog_latency_ms / 1000
+    settings['jitter'] = args.jitter_ms / 1000
+    load_fixtures(args.bim_dir, args.catalog)
+    print(f"桩服务已就绪: 方案 {sorted(documents)}，模型 {len(catalog)} 个")
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
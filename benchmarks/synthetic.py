@@ -0,0 +1,149 @@
+"""
+合成BimJson生成器：按房间数、多边形复杂度和三类构件数量生成与线上格式一致的文档，
+同时生成对应的模型目录，供基准测试替换 check.get_model 使用
+"""
+import math
+import random
+
+# 与 check.get_hardModeList 的过滤列表一致，保证合成的非参数化模型不会被过滤掉
+HARD_CLASSIFY_NAMES = ["婴儿床", "双人床", "高低_子母床", "单人床", "沙发床", "三人沙发",
+                       "餐桌", "餐椅", "淋浴房", "双人沙发", "多人沙发", "茶几"]
+PARAMETRIC_CLASSIFY_NAMES = ["电视柜", "掩门衣柜", "玄关柜", "酒柜", "洗衣机柜"]
+POINT_USES = ["五孔插座", "空调插座", "网络插座", "电视插座", "USB插座"]
+ROOM_NAMES = ["客厅", "餐厅", "主卧", "次卧", "卫生间", "厨房", "储物间", "阳台"]
+
+ROOM_WIDTH = 400.0   # 房间格子宽度（cm）
+ROOM_DEPTH = 350.0   # 房间格子深度（cm）
+NOTCH_DEPTH = 40.0   # 锯齿深度（cm）
+
+
+def _point(x, y, z=0.0):
+    return f"X={x:.6f} Y={y:.6f} Z={z:.6f}"
+
+
+def _rotation(yaw):
+    return f"P=0.000000 Y={yaw:.6f} R=0.000000"
+
+
+def _scale(x=1.0, y=1.0, z=1.0):
+    return f"X={x:.3f} Y={y:.3f} Z={z:.3f}"
+
+
+def room_polygon(x0, y0, width, depth, vertices):
+    """
+    生成正交多边形房间轮廓，顶边做成锯齿形以控制顶点数
+    vertices: 顶点数（至少4，奇数向下取偶）
+    """
+    notches = max(0, (int(vertices) - 4) // 2)
+    x1, y1 = x0 + width, y0 + depth
+    points = [(x0, y0), (x1, y0), (x1, y1)]
+    height = y1
+    for j in range(1, notches + 1):
+        x = x1 - j * width / (notches + 1)
+        points.append((x, height))
+        height = y1 - NOTCH_DEPTH if height == y1 else y1
+        points.append((x, height))
+    points.append((x0, height))
+    return points
+
+
+def generate_bim(rooms=8, vertices=6, hard=10, hydropower=20, parametric=10, seed=0):
+    """
+    生成合成BimJson
+    rooms: 房间数；vertices: 每个房间的顶点数
+    hard / hydropower / parametric: hardMode、hydropowerMode、NewWHCMode 的构件数
+    返回: (bimjson, catalog)，catalog 为 {str(id): 模型信息}
+    """
+    rng = random.Random(seed)
+    columns = max(1, math.ceil(math.sqrt(rooms)))
+    cells = []
+    roomList = []
+    for i in range(rooms):
+        x0 = (i % columns) * ROOM_WIDTH
+        y0 = (i // columns) * ROOM_DEPTH
+        cells.append((x0, y0))
+        roomList.append({
+            "SpaceId": i + 1,
+            "Name": ROOM_NAMES[i % len(ROOM_NAMES)],
+            "points": [_point(x, y) for x, y in room_polygon(x0, y0, ROOM_WIDTH, ROOM_DEPTH, vertices)],
+        })
+
+    def random_location():
+        x0, y0 = rng.choice(cells) if cells else (0.0, 0.0)
+        x = x0 + rng.uniform(0.15, 0.85) * ROOM_WIDTH
+        y = y0 + rng.uniform(0.15, 0.85) * (ROOM_DEPTH - NOTCH_DEPTH)
+        return _point(x, y)
+
+    catalog = {}
+
+    def add_model(model_id, classify_name, sys_obj_name, length, width, height):
+        catalog[str(model_id)] = {
+            "id": model_id,
+            "name": f"{classify_name}-{model_id}_vTA",
+            "length": length,
+            "width": width,
+            "height": height,
+            "classifyName": classify_name,
+            "sysObjName": sys_obj_name,
+        }
+
+    # 同一模型在方案中会被多次摆放，模型数取构件数的一部分
+    hard_ids = [100000 + i for i in range(max(1, hard // 3))]
+    for model_id in hard_ids:
+        add_model(model_id, rng.choice(HARD_CLASSIFY_NAMES), "活动家具",
+                  rng.uniform(400, 2200), rng.uniform(400, 2000), rng.uniform(400, 1200))
+    socket_ids = [200000 + i for i in range(max(1, hydropower // 10))]
+    for model_id in socket_ids:
+        add_model(model_id, "插座", "插座", 86.0, 86.0, 86.0)
+    cab_ids = [300000 + i for i in range(max(1, parametric // 3))]
+    for model_id in cab_ids:
+        add_model(model_id, rng.choice(PARAMETRIC_CLASSIFY_NAMES), "定制系统柜",
+                  rng.uniform(300, 700), rng.uniform(600, 2600), 2400.0)
+
+    moveable_hard = [{
+        "id": rng.choice(hard_ids),
+        "location": random_location(),
+        "rotation": _rotation(rng.choice([0.0, 90.0, -90.0, 180.0, rng.uniform(-180, 180)])),
+        "scale": _scale(rng.uniform(0.8, 1.2), rng.uniform(0.8, 1.2), 1.0),
+    } for _ in range(hard)]
+
+    moveable_hydropower = [{
+        "id": rng.choice(socket_ids),
+        "pointUse": rng.choice(POINT_USES),
+        "location": random_location(),
+        "rotation": _rotation(rng.choice([0.0, 90.0, -90.0, 180.0])),
+        "scale": _scale(),
+    } for _ in range(hydropower)]
+
+    cab_data_list = []
+    for _ in range(parametric):
+        model_id = rng.choice(cab_ids)
+        model = catalog[str(model_id)]
+        cab_data_list.append({
+            "ContentItemID": model_id,
+            "name": None,
+            "Pos": random_location(),
+            "Rotation": _rotation(rng.choice([0.0, 90.0, -90.0, 180.0])),
+            "Scale": _scale(rng.choice([1.0, -1.0]), rng.choice([1.0, -1.0]), 1.0),
+            "ParameterList": [
+                {"ParamName": "深度", "Value": round(model["length"], 1)},
+                {"ParamName": "宽度", "Value": round(model["width"], 1)},
+                {"ParamName": "高度", "Value": model["height"]},
+            ],
+        })
+
+    bimjson = {
+        "layoutMode": {"roomList": roomList},
+        "hardMode": {"moveableMeshList": moveable_hard},
+        "hydropowerMode": {"moveableMeshList": moveable_hydropower},
+        "NewWHCMode": {"cab_data_list": cab_data_list},
+    }
+    return bimjson, catalog
+
+
+def stub_get_model(catalog):
+    """返回替代 check.get_model 的函数，直接从合成目录查找，不访问网络"""
+    def get_model(id_list, default_ids=[974123]):
+        ids = id_list if id_list else default_ids
+        return [catalog[str(i)] for i in ids if str(i) in catalog]
+    return get_model
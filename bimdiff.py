@@ -0,0 +1,85 @@
+import hashlib
+
+import check
+import metrics
+import scene as scene_builder
+
+# 两个版本BimJson的差异：房间按 SpaceId、构件按 (类别, id, instance) 对齐，
+# 只比较位置/旋转/缩放（房间为轮廓点）的指纹哈希，不逐字段比较整个条目，耗时与构件数成线性关系
+
+# 各类构件参与指纹的原始字段（参数化模型的字段名与其他两类不同）
+POSE_FIELDS = {
+    'hydropower': ('location', 'rotation', 'scale'),
+    'hard': ('location', 'rotation', 'scale'),
+    'parametric': ('Pos', 'Rotation', 'Scale'),
+}
+
+
+def fingerprint(values):
+    """一组字段值的指纹（16位十六进制）"""
+    digest = hashlib.blake2b(digest_size=8)
+    for value in values:
+        digest.update(str(value).encode('utf-8'))
+        digest.update(b'\x1f')
+    return digest.hexdigest()
+
+
+def room_fingerprints(bimjson):
+    """{str(SpaceId): (指纹, 房间条目)}"""
+    rooms = {}
+    for room in bimjson.get('layoutMode', {}).get('roomList', []):
+        rooms[str(room.get('SpaceId'))] = (fingerprint(room.get('points') or []), room)
+    return rooms
+
+
+def device_fingerprints(bimjson):
+    """{(类别, str(id), instance): (指纹, 原始条目)}"""
+    devices = {}
+    for family, mode_key, list_key, id_key in scene_builder.FAMILIES:
+        entries = bimjson.get(mode_key, {}).get(list_key, [])
+        fields = POSE_FIELDS[family]
+        for entry, instance in zip(entries, check.assign_instances(entries, id_key)):
+            key = (family, str(entry.get(id_key)), instance)
+            devices[key] = (fingerprint(entry.get(field) for field in fields), entry)
+    return devices
+
+
+def _compare(before, after):
+    added = [key for key in after if key not in before]
+    removed = [key for key in before if key not in after]
+    moved = [key for key, (print_after, _) in after.items()
+             if key in before and before[key][0] != print_after]
+    return added, removed, moved
+
+
+def diff_documents(before, after):
+    """
+    比较两个版本的BimJson，返回新增、删除和移动的房间与构件
+    构件的 moved 条目附带前后两个版本的位置、旋转和缩放
+    """
+    with metrics.stage('diff'):
+        room_added, room_removed, room_moved = _compare(room_fingerprints(before), room_fingerprints(after))
+        devices_before, devices_after = device_fingerprints(before), device_fingerprints(after)
+        added, removed, moved = _compare(devices_before, devices_after)
+
+    def describe(key):
+        family, item_id, instance = key
+        return {'family': family, 'id': item_id, 'instance': instance}
+
+    def pose(key, devices):
+        entry = devices[key][1]
+        return {field: entry.get(field) for field in POSE_FIELDS[key[0]]}
+
+    return {
+        'rooms': {'added': room_added, 'removed': room_removed, 'moved': room_moved},
+        'devices': {
+            'added': [describe(key) for key in added],
+            'removed': [describe(key) for key in removed],
+            'moved': [dict(describe(key), before=pose(key, devices_before), after=pose(key, devices_after))
+                      for key in moved],
+        },
+        'summary': {
+            'rooms_added': len(room_added), 'rooms_removed': len(room_removed), 'rooms_moved': len(room_moved),
+            'devices_added': len(added), 'devices_removed': len(removed), 'devices_moved': len(moved),
+        },
+    }
@@ -0,0 +1,201 @@
+import os
+import sqlite3
+import threading
+import time
+
+import metrics
+
+# 本地持久化的模型目录：id → 长宽高、分类名等
+# - 启动时整表加载到内存，已知id不再请求模型接口
+# - 后台线程定期刷新过期条目，并同步其他worker写入的新条目
+# - 模型接口不可用时，过期条目照常使用
+# SQLite 使用 WAL 模式，多个worker进程可以同时读，写入互不阻塞读
+CATALOG_DB_PATH = os.environ.get('CATALOG_DB_PATH',
+                                 os.path.join(os.path.dirname(os.path.abspath(__file__)), 'catalog.sqlite3'))
+# 条目超过该时长（秒）视为过期，由后台线程刷新
+CATALOG_MAX_AGE = float(os.environ.get('CATALOG_MAX_AGE', 24 * 3600))
+# 后台刷新间隔（秒），为0时不启动后台线程
+CATALOG_REFRESH_INTERVAL = float(os.environ.get('CATALOG_REFRESH_INTERVAL', 600))
+# 单次刷新最多请求的id数
+REFRESH_BATCH = 200
+# 模型接口明确查无结果的id记为"不存在"，该时长（秒）内不再请求，之后重新查询（模型可能新上架）
+CATALOG_MISSING_MAX_AGE = float(os.environ.get('CATALOG_MISSING_MAX_AGE', 3600))
+
+FIELDS = ('name', 'length', 'width', 'height', 'classifyName', 'sysObjName')
+
+_models = {}       # str(id) → 模型信息
+_fetched_at = {}   # str(id) → 写入时间
+_missing = {}      # str(id) → 确认不存在的时间
+_state = {'loaded': False, 'synced_at': 0.0, 'missing_synced_at': 0.0, 'thread_pid': None}
+_lock = threading.Lock()
+
+
+def _connect():
+    conn = sqlite3.connect(CATALOG_DB_PATH, timeout=5)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('''CREATE TABLE IF NOT EXISTS models (
+        id TEXT PRIMARY KEY,
+        name TEXT,
+        length REAL,
+        width REAL,
+        height REAL,
+        classifyName TEXT,
+        sysObjName TEXT,
+        fetched_at REAL NOT NULL
+    )''')
+    conn.execute('CREATE INDEX IF NOT EXISTS models_fetched_at ON models (fetched_at)')
+    conn.execute('CREATE TABLE IF NOT EXISTS missing (id TEXT PRIMARY KEY, checked_at REAL NOT NULL)')
+    return conn
+
+
+def _row_to_model(row):
+    model_id, name, length, width, height, classify_name, sys_obj_name, _ = row
+    return {
+        'id': int(model_id) if model_id.isdigit() else model_id,
+        'name': name,
+        'length': length,
+        'width': width,
+        'height': height,
+        'classifyName': classify_name,
+        'sysObjName': sys_obj_name,
+    }
+
+
+def _load_rows(since=0.0, missing_since=0.0):
+    """读取 fetched_at 大于 since 的条目、checked_at 大于 missing_since 的不存在记录到内存"""
+    try:
+        with _connect() as conn:
+            rows = conn.execute('SELECT id, name, length, width, height, classifyName, sysObjName, fetched_at '
+                                'FROM models WHERE fetched_at > ?', (since,)).fetchall()
+            missing_rows = conn.execute('SELECT id, checked_at FROM missing WHERE checked_at > ?',
+                                        (missing_since,)).fetchall()
+    except sqlite3.Error as e:
+        print(f"读取模型目录失败: {e}")
+        return
+    with _lock:
+        for row in rows:
+            _models[row[0]] = _row_to_model(row)
+            _fetched_at[row[0]] = row[-1]
+            _state['synced_at'] = max(_state['synced_at'], row[-1])
+        for model_id, checked_at in missing_rows:
+            if model_id not in _models:
+                _missing[model_id] = checked_at
+            _state['missing_synced_at'] = max(_state['missing_synced_at'], checked_at)
+
+
+def warm_start():
+    """把持久化的模型目录整表加载到内存（进程内只加载一次）"""
+    if _state['loaded']:
+        return
+    start = time.perf_counter()
+    _load_rows()
+    _state['loaded'] = True
+    metrics.observe_stage('catalog_warm_start', start)
+
+
+def lookup(ids):
+    """
+    从本地目录查找模型
+    返回 (已知模型列表, 未知id列表)；过期条目同样返回，由后台刷新；
+    近期确认不存在的id（见 store_missing）两者都不包含
+    """
+    warm_start()
+    _ensure_refresher()
+    known, missing = [], []
+    recent = time.time() - CATALOG_MISSING_MAX_AGE
+    for model_id in dict.fromkeys(ids):
+        model = _models.get(str(model_id))
+        absent = model is None and _missing.get(str(model_id), 0) > recent
+        metrics.record_cache('catalog', model is not None or absent)
+        if model is not None:
+            known.append(model)
+        elif not absent:
+            missing.append(model_id)
+    return known, missing
+
+
+def store(models):
+    """把模型接口返回的数据写入内存和SQLite"""
+    now = time.time()
+    rows = []
+    for model in models or []:
+        if not (model and isinstance(model, dict) and 'id' in model):
+            continue
+        model_id = str(model['id'])
+        entry = {'id': model['id']}
+        entry.update({field: model.get(field) for field in FIELDS})
+        with _lock:
+            _models[model_id] = entry
+            _fetched_at[model_id] = now
+            _missing.pop(model_id, None)
+        rows.append((model_id,) + tuple(entry[field] for field in FIELDS) + (now,))
+    if not rows:
+        return
+    try:
+        with _connect() as conn:
+            conn.executemany('INSERT OR REPLACE INTO models '
+                             '(id, name, length, width, height, classifyName, sysObjName, fetched_at) '
+                             'VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+    except sqlite3.Error as e:
+        print(f"写入模型目录失败: {e}")
+
+
+def store_missing(ids):
+    """记录模型接口明确查无结果的id（接口正常返回但不含该id），CATALOG_MISSING_MAX_AGE 内不再请求"""
+    now = time.time()
+    rows = [(str(model_id), now) for model_id in ids]
+    if not rows:
+        return
+    with _lock:
+        _missing.update(rows)
+    try:
+        with _connect() as conn:
+            conn.executemany('INSERT OR REPLACE INTO missing (id, checked_at) VALUES (?, ?)', rows)
+    except sqlite3.Error as e:
+        print(f"写入模型目录失败: {e}")
+
+
+def stale_ids(limit=REFRESH_BATCH):
+    """返回超过 CATALOG_MAX_AGE 的id，最旧的优先"""
+    deadline = time.time() - CATALOG_MAX_AGE
+    with _lock:
+        stale = [(fetched_at, model_id) for model_id, fetched_at in _fetched_at.items() if fetched_at < deadline]
+    return [_models[model_id]['id'] for _, model_id in sorted(stale)[:limit]]
+
+
+def sync():
+    """读取其他进程在上次同步之后写入的条目"""
+    warm_start()
+    _load_rows(_state['synced_at'], _state['missing_synced_at'])
+
+
+def refresh_once(fetch):
+    """
+    执行一次后台刷新：同步其他worker写入的条目，再用 fetch(ids) 重新请求过期条目
+    fetch 失败（返回None或空）时保留旧数据
+    """
+    sync()
+    ids = stale_ids()
+    if ids:
+        store(fetch(ids))
+
+
+def _ensure_refresher():
+    """每个进程启动一个后台刷新线程（fork 之后的worker需要各自启动）"""
+    if CATALOG_REFRESH_INTERVAL <= 0 or _state['thread_pid'] == os.getpid():
+        return
+    with _lock:
+        if _state['thread_pid'] == os.getpid():
+            return
+        _state['thread_pid'] = os.getpid()
+    threading.Thread(target=_refresh_loop, name='catalog-refresh', daemon=True).start()
+
+
+def _refresh_loop():
+    import check
+    while True:
+        time.sleep(CATALOG_REFRESH_INTERVAL)
+        try:
+            refresh_once(check.fetch_models)
+        except Exception as e:
+            print(f"刷新模型目录失败: {e}")
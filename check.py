@@ -1,6 +1,32 @@
+import concurrent.futures
 import json
+import os
+import time
+from urllib.parse import urljoin
+
 import requests
-from flask import request
+from flask import g, request
+
+import catalog
+import deadline
+import metrics
+import resilience
+import singleflight
+
+# 模型接口地址，可通过环境变量指向本地桩服务（benchmarks/stub_server.py）
+CATALOG_BASE_URL = os.environ.get('CATALOG_BASE_URL', 'http://i.bim-zeus.home.ke.com')
+# 模型接口单次请求超时（秒）
+CATALOG_TIMEOUT = float(os.environ.get('CATALOG_TIMEOUT', 5))
+# 客户端传入相对路径的BimJson地址时，以该地址为前缀
+BIM_BASE_URL = os.environ.get('BIM_BASE_URL', '')
+# BimJson下载超时（秒），请求设有延迟预算时取两者中较小的一个
+BIM_TIMEOUT = float(os.environ.get('BIM_TIMEOUT', 30))
+# 上游请求超时时可能抛出的异常
+TIMEOUT_ERRORS = (TimeoutError, concurrent.futures.TimeoutError, requests.exceptions.Timeout)
+
+# 是否把提取结果写入当前目录的 Room.json 等调试文件，仅供本地调试（FLOORPLAN_DUMP_JSON=1）；
+# 服务中并发的请求会同时写同一组文件，默认关闭
+DUMP_JSON = os.environ.get('FLOORPLAN_DUMP_JSON', '0') == '1'
 
 
 def parse_scale(scale_str):
@@ -20,22 +46,108 @@ def parse_scale(scale_str):
 
     return scale
 
+def resolve_bim_url(url):
+    """相对路径的BimJson地址拼接 BIM_BASE_URL，绝对地址原样返回"""
+    if BIM_BASE_URL and '://' not in str(url):
+        return urljoin(BIM_BASE_URL.rstrip('/') + '/', str(url).lstrip('/'))
+    return url
+
+class BimFetchError(Exception):
+    """
+    BimJson下载失败；status 为对应的HTTP状态码：
+    504 超时或延迟预算已用尽，502 上游返回错误或内容无法解析，400 请求中缺少地址
+    """
+
+    def __init__(self, message, status=502):
+        super().__init__(message)
+        self.status = status
+
+
+def fetch_bim_json(url):
+    """
+    下载并解析BimJson，不依赖Flask请求上下文；同一地址的并发下载合并为一次
+    下载和等待合并的下载都不超过请求剩余的延迟预算
+    失败时记为 bim 降级并抛出 BimFetchError，不返回None
+    """
+    if deadline.low(0):
+        deadline.degrade('bim')
+        raise BimFetchError("延迟预算已用尽，未下载BimJson", status=504)
+    timeout = deadline.timeout(BIM_TIMEOUT)
+    try:
+        bimjson = singleflight.do(('bim', str(url)), lambda: _download_bim_json(url, timeout), timeout=timeout)
+    except TIMEOUT_ERRORS as e:
+        deadline.degrade('bim')
+        raise BimFetchError(f"下载BimJson超时: {e}", status=504)
+    except (requests.RequestException, ValueError) as e:
+        deadline.degrade('bim')
+        raise BimFetchError(f"下载BimJson失败: {e}")
+    if not isinstance(bimjson, dict):
+        deadline.degrade('bim')
+        raise BimFetchError("BimJson为空或格式错误")
+    return bimjson
+
+def _download_bim_json(url, timeout=BIM_TIMEOUT):
+    with metrics.stage('bim_fetch'):
+        response = requests.get(f"{resolve_bim_url(url)}", timeout=timeout)
+        response.raise_for_status()
+    metrics.observe_response_size('bim', response)
+    with metrics.stage('parse'):
+        return response.json()
+
 def get_bim_json():
+    """当前请求体中 url 对应的BimJson；下载失败时抛出 BimFetchError"""
+    # 同一请求内只下载一次BimJson，后续调用直接复用
+    if 'bimjson' in g:
+        metrics.record_cache('bim_json', True)
+        return g.bimjson
+    metrics.record_cache('bim_json', False)
+    Bimjson_URL = (request.get_json(silent=True) or {}).get('url')
+    if not Bimjson_URL:
+        raise BimFetchError("缺少BimJson地址 url", status=400)
     try:
-        data = request.get_json()
-        Bimjson_URL = data.get('url')
-        response = requests.get(f"{Bimjson_URL}")
-        bimjson = response.json()
-        if bimjson is not None:
-            return bimjson
-        else:
-            print("data为空")
-    except Exception as e:
+        g.bimjson = fetch_bim_json(Bimjson_URL)
+    except BimFetchError as e:
         print(f"获取BimJson失败: {e}")
-        return None
+        raise
+    return g.bimjson
+
+def index_models(model_data):
+    """将模型数据转为以id为键的字典，方便查找"""
+    model_dict = {}
+    for model in model_data or []:
+        if model and isinstance(model, dict) and "id" in model:
+            model_id = str(model["id"])
+            model_dict[model_id] = model
+    return model_dict
 
-def get_roomList():
-    roomList = get_bim_json().get("layoutMode", {}).get("roomList", [])
+def assign_instances(entries, id_key):
+    """
+    同一模型id在列表中可能出现多次，按出现顺序编号，(id, instance) 唯一确定一个构件
+    条目自带 instance 字段时（如编辑请求）以其为准
+    """
+    counts = {}
+    instances = []
+    for entry in entries:
+        key = str(entry.get(id_key))
+        instances.append(entry.get("instance", counts.get(key, 0)))
+        counts[key] = counts.get(key, 0) + 1
+    return instances
+
+def collect_model_ids(bimjson, modes=("hardMode", "hydropowerMode", "NewWHCMode")):
+    """收集构件需要查询的全部模型id（去重），用于一次性查询模型接口；modes 为要收集的类别"""
+    ids = []
+    if "hardMode" in modes:
+        ids += [item.get("id") for item in bimjson.get("hardMode", {}).get("moveableMeshList", [])]
+    if "hydropowerMode" in modes:
+        ids += [item.get("id") for item in bimjson.get("hydropowerMode", {}).get("moveableMeshList", [])
+                if item.get("id") and item.get("pointUse") is not None]
+    if "NewWHCMode" in modes:
+        ids += [item.get("ContentItemID") for item in bimjson.get("NewWHCMode", {}).get("cab_data_list", [])
+                if item.get("ContentItemID") is not None]
+    return list(dict.fromkeys(ids))
+
+def get_roomList(bimjson):
+    roomList = bimjson.get("layoutMode", {}).get("roomList", [])
     Room = []
     for room in roomList:
         Room.append({
@@ -43,29 +155,25 @@ def get_roomList():
             "Name": room.get("Name"),
             "points": room.get("points")
         })
-    with open('Room.json', 'w', encoding='utf-8') as file:
-        json.dump(Room, file, ensure_ascii=False, indent=2)
+    if DUMP_JSON:
+        with open('Room.json', 'w', encoding='utf-8') as file:
+            json.dump(Room, file, ensure_ascii=False, indent=2)
     return Room
 
-def get_hardModeList():
-    hardModeList = get_bim_json().get("hardMode", {}).get("moveableMeshList", [])
+def get_hardModeList(bimjson, model_dict=None):
+    hardModeList = bimjson.get("hardMode", {}).get("moveableMeshList", [])
     hardMode = []
     # 提取所有有效的id
     hard_ids = [item.get("id") for item in hardModeList]
-    # 获取模型数据
-    model_data = get_model(hard_ids) or []
-
-    model_dict = {}
-
-    # 将模型数据转为以id为键的字典，方便查找
-    for model in model_data:
-        if model and isinstance(model, dict) and "id" in model:
-            model_id = str(model["id"])
-            model_dict[model_id] = model
-    for hard in hardModeList:
+    # 获取模型数据（调用方已查询过模型时直接复用）
+    if model_dict is None:
+        model_dict = index_models(get_model(hard_ids))
+    instances = assign_instances(hardModeList, "id")
+    for hard, instance in zip(hardModeList, instances):
             scale = parse_scale(hard.get('scale'))
             hard_info = {
                 "id": hard.get('id'),
+                "instance": instance,
                 "location": hard.get('location'),
                 "rotation": hard.get('rotation'),
                 "scale": hard.get('scale')
@@ -84,39 +192,37 @@ def get_hardModeList():
                     "length": length,
                     "width": width,
                     "height": height,
-                    "sysObjName": model.get("sysObjName")
+                    "sysObjName": model.get("sysObjName"),
+                    "classifyName": classify_name
                 })
 
             hardMode.append(hard_info)
 
-    with open('hardMode.json', 'w', encoding='utf-8') as file:
-        json.dump(hardMode, file, ensure_ascii=False, indent=2)
+    if DUMP_JSON:
+        with open('hardMode.json', 'w', encoding='utf-8') as file:
+            json.dump(hardMode, file, ensure_ascii=False, indent=2)
     return hardMode
 
-def get_hydropowerModeList():
-    hydropowerModeList = get_bim_json().get("hydropowerMode", {}).get("moveableMeshList", [])
+def get_hydropowerModeList(bimjson, model_dict=None):
+    hydropowerModeList = bimjson.get("hydropowerMode", {}).get("moveableMeshList", [])
     hydropowerMode = []
 
     # 提取所有有效的id
     hydropower_ids = [item.get("id") for item in hydropowerModeList
                       if item.get("id") and item.get("pointUse") is not None]
 
-    # 获取模型数据
-    model_data = get_model(hydropower_ids) or []
+    # 获取模型数据（调用方已查询过模型时直接复用）
+    if model_dict is None:
+        model_dict = index_models(get_model(hydropower_ids))
 
-    model_dict = {}
-    # 将模型数据转为以id为键的字典，方便查找
-    for model in model_data:
-        if model and isinstance(model, dict) and "id" in model:
-            model_id = str(model["id"])
-            model_dict[model_id] = model
-
-    for hydropower in hydropowerModeList:
+    instances = assign_instances(hydropowerModeList, "id")
+    for hydropower, instance in zip(hydropowerModeList, instances):
         hydropower_id = hydropower.get("id")
         if hydropower_id and hydropower.get("pointUse") is not None:
             scale = parse_scale(hydropower.get('scale'))
             hydropower_info = {
                 "id": hydropower_id,
+                "instance": instance,
                 "pointUse": hydropower.get('pointUse'),
                 "location": hydropower.get('location'),
                 "rotation": hydropower.get('rotation'),
@@ -139,34 +245,31 @@ def get_hydropowerModeList():
 
             hydropowerMode.append(hydropower_info)
 
-    with open('hydropowerMode.json', 'w', encoding='utf-8') as file:
-        json.dump(hydropowerMode, file, ensure_ascii=False, indent=2)
+    if DUMP_JSON:
+        with open('hydropowerMode.json', 'w', encoding='utf-8') as file:
+            json.dump(hydropowerMode, file, ensure_ascii=False, indent=2)
     return hydropowerMode
 
-def get_NewWHCModeList():
-    NewWHCModeList = get_bim_json().get("NewWHCMode", {}).get("cab_data_list", [])
+def get_NewWHCModeList(bimjson, model_dict=None):
+    NewWHCModeList = bimjson.get("NewWHCMode", {}).get("cab_data_list", [])
     NewWHCMode = []
 
     # 提取所有有效的id
     NewWHCMode_ids = [item.get("ContentItemID") for item in NewWHCModeList
                       if item.get("ContentItemID") is not None]
 
-    # 获取模型数据
-    model_data = get_model(NewWHCMode_ids) or []
-
-    model_dict = {}
-    # 将模型数据转为以id为键的字典，方便查找
-    for model in model_data:
-        if model and isinstance(model, dict) and "id" in model:
-            model_id = str(model["id"])
-            model_dict[model_id] = model
+    # 获取模型数据（调用方已查询过模型时直接复用）
+    if model_dict is None:
+        model_dict = index_models(get_model(NewWHCMode_ids))
 
-    for NewWHCM in NewWHCModeList:
+    instances = assign_instances(NewWHCModeList, "ContentItemID")
+    for NewWHCM, instance in zip(NewWHCModeList, instances):
         NewWHC_id = NewWHCM.get("ContentItemID")
         if NewWHC_id is not None:
             # 初始化基础信息
             NewWHCMode_info = {
                 "id": NewWHC_id,
+                "instance": instance,
                 "name": NewWHCM.get("name"),
                 "location": NewWHCM.get('Pos'),
                 "rotation": NewWHCM.get('Rotation'),
@@ -203,24 +306,81 @@ def get_NewWHCModeList():
 
             NewWHCMode.append(NewWHCMode_info)
 
-    with open('NewWHCMode.json', 'w', encoding='utf-8') as file:
-        json.dump(NewWHCMode, file, ensure_ascii=False, indent=2)
+    if DUMP_JSON:
+        with open('NewWHCMode.json', 'w', encoding='utf-8') as file:
+            json.dump(NewWHCMode, file, ensure_ascii=False, indent=2)
     return NewWHCMode
 
 def get_model(id_list, default_ids=[974123]):
-    model_URL = "http://i.bim-zeus.home.ke.com/api/resGoods/pcLoadPlanGoodsList"
-    try:
-        body = id_list if id_list else default_ids
-        response = requests.post(model_URL, json=body)
+    """
+    查询模型数据：本地模型目录中已有的id直接返回，其余id请求模型接口并写入目录
+    请求的延迟预算不足时不请求模型接口；因跳过、超时、失败或熔断而没有拿到结果的id记为降级
+    （构件按默认尺寸绘制），见 deadline。模型接口明确查无结果的id不算降级，由模型目录记住，近期不再请求
+    """
+    body = id_list if id_list else default_ids
+    known, missing = catalog.lookup(body)
+    if not missing:
+        return known
+    if deadline.low(deadline.CATALOG_MIN_BUDGET):
+        print(f"延迟预算不足，跳过模型查询: {len(missing)} 个id")
+        deadline.degrade('catalog', len(missing))
+        return known
+    # 其他请求正在查询的id直接等待其结果，不重复请求
+    fetched = singleflight.do_many('model', missing, _fetch_and_store_models,
+                                   timeout=deadline.timeout(CATALOG_TIMEOUT))
+    # None 为没有拿到结果，空字典为接口确认不存在
+    unresolved = sum(1 for model in fetched.values() if model is None)
+    if unresolved:
+        deadline.degrade('catalog', unresolved)
+    return known + [model for model in fetched.values() if model]
 
-        response_json = response.json()
+def _fetch_and_store_models(id_list):
+    """请求模型接口并写入模型目录；接口正常返回但不含的id结果为空字典，请求失败时全部缺失（None）"""
+    models = fetch_models(id_list)
+    if models is None:
+        return {}
+    catalog.store(models)
+    fetched = index_models(models)
+    not_found = [model_id for model_id in id_list if str(model_id) not in fetched]
+    catalog.store_missing(not_found)
+    fetched.update((str(model_id), {}) for model_id in not_found)
+    return fetched
 
-        # 检查响应状态
-        if response_json.get("success") and response_json.get("code") == 2000:
-            model = response_json.get("data", [])
-            return model
-        else:
-            return []
+def fetch_models(id_list):
+    """
+    请求模型接口 pcLoadPlanGoodsList（带对冲请求和熔断），失败或熔断时返回None
+    超时不超过请求剩余的延迟预算；因预算缩短超时而失败的请求不计入熔断
+    """
+    if not resilience.breaker_allows():
+        print(f"模型接口熔断中，跳过请求: {len(id_list)} 个id")
+        return None
+    # 对冲请求在线程池中执行，拿不到请求的预算，超时在这里算好传入
+    timeout = deadline.timeout(CATALOG_TIMEOUT)
+    try:
+        model = resilience.hedged_call(lambda: _post_models(id_list, timeout), timeout=timeout)
     except Exception as e:
+        if timeout < CATALOG_TIMEOUT and isinstance(e, TIMEOUT_ERRORS):
+            print(f"请求模型链接超出延迟预算: {timeout:.3f}s")
+            # 不计入熔断，但若本次是半开状态的试探请求，需要释放试探名额
+            resilience.release_trial()
+            return None
+        resilience.record_failure()
         print(f"请求模型链接失败: {e}")
-        return []
+        return None
+    resilience.record_success()
+    return model
+
+def _post_models(id_list, timeout=CATALOG_TIMEOUT):
+    model_URL = f"{CATALOG_BASE_URL}/api/resGoods/pcLoadPlanGoodsList"
+    start = time.perf_counter()
+    with metrics.stage('get_model'):
+        response = requests.post(model_URL, json=id_list, timeout=timeout)
+    metrics.observe_response_size('catalog', response)
+
+    response_json = response.json()
+
+    # 检查响应状态
+    if response_json.get("success") and response_json.get("code") == 2000:
+        resilience.observe_latency(time.perf_counter() - start)
+        return response_json.get("data") or []
+    raise ValueError(f"模型接口返回异常: code={response_json.get('code')}")
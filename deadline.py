@@ -0,0 +1,100 @@
+import os
+import time
+from contextvars import ContextVar
+
+import metrics
+
+# 请求的延迟预算：请求开始时设定截止时间，存放在 contextvars 中（每个请求线程各自一份），
+# BimJson下载、模型查询和绘图各阶段按剩余时间缩短自己的超时，预算不足时降级而不是一直等待：
+# - 模型查询：剩余时间不足 CATALOG_MIN_BUDGET 时不再请求模型接口，只用本地模型目录中已有的尺寸；
+#   查询超时、失败或熔断时同样只用已有的尺寸，缺少尺寸的构件按默认尺寸绘制
+# - 绘图：剩余时间不足 RENDER_MIN_BUDGET 时不放置名称标注、距离线和尺寸线（只画轮廓），并降低分辨率
+# 每项降级记为一个标记，随响应返回（degraded），客户端据此决定是否稍后重试：
+#   catalog: 使用默认尺寸的模型数   layers: 省略的图层   dpi: 降低后的分辨率
+#   bim: BimJson下载超时或失败（无法降级绘制，请求返回 504 / 502）
+# 注意线程池中的任务不继承调用方的 contextvars，超时需在请求线程中算好再传入。
+
+# 每个请求的默认预算（秒），为0时不限时
+REQUEST_BUDGET = float(os.environ.get('FLOORPLAN_REQUEST_BUDGET', 10))
+# 剩余时间低于该值（秒）时不再请求模型接口
+CATALOG_MIN_BUDGET = float(os.environ.get('FLOORPLAN_CATALOG_MIN_BUDGET', 1.0))
+# 剩余时间低于该值（秒）时简化绘图
+RENDER_MIN_BUDGET = float(os.environ.get('FLOORPLAN_RENDER_MIN_BUDGET', 2.0))
+# 简化绘图时去掉的图层和分辨率缩放比例
+DEGRADED_LAYERS = frozenset(('labels', 'clearances', 'dimensions'))
+DEGRADED_DPI_SCALE = 0.5
+# 剩余时间用尽后仍需发出的请求使用的最短超时（秒），requests 不接受0
+MIN_TIMEOUT = 0.001
+
+_deadline = ContextVar('floorplan_deadline', default=None)
+_degraded = ContextVar('floorplan_degraded', default=None)
+
+
+def parse_budget(value):
+    """解析请求头中的预算（毫秒），为空时返回默认预算（秒）；非法时抛出 ValueError"""
+    if value is None or value == '':
+        return REQUEST_BUDGET
+    try:
+        budget = float(value) / 1000
+    except (TypeError, ValueError):
+        raise ValueError("预算应为正数（毫秒）")
+    if budget <= 0:
+        raise ValueError("预算应为正数（毫秒）")
+    # 客户端只能缩短预算，不能超过服务端的上限
+    return min(budget, REQUEST_BUDGET) if REQUEST_BUDGET else budget
+
+
+def start(budget=REQUEST_BUDGET):
+    """开始一个请求：设定截止时间（budget 秒后，为0或None时不限时）并清空降级标记"""
+    _deadline.set(time.monotonic() + budget if budget else None)
+    _degraded.set({})
+
+
+def remaining():
+    """剩余时间（秒，可能为负）；未设定预算时返回None"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def timeout(default):
+    """本阶段的超时：default 与剩余时间中较小的一个"""
+    left = remaining()
+    if left is None:
+        return default
+    return max(MIN_TIMEOUT, min(default, left)) if default is not None else max(MIN_TIMEOUT, left)
+
+
+def low(threshold):
+    """剩余时间是否已低于 threshold（秒）"""
+    left = remaining()
+    return left is not None and left < threshold
+
+
+def degrade(flag, detail=True):
+    """记录一项降级；同一标记重复记录时，数值说明（如使用默认尺寸的模型数）累加，其他说明保留最后一次的"""
+    degraded = _degraded.get()
+    if degraded is None:
+        degraded = {}
+        _degraded.set(degraded)
+    if flag not in degraded:
+        metrics.record_degraded(flag)
+    elif isinstance(detail, int) and isinstance(degraded[flag], int) and not isinstance(detail, bool):
+        detail += degraded[flag]
+    degraded[flag] = detail
+
+
+def degraded():
+    """当前请求的降级标记 {标记: 说明}"""
+    return dict(_degraded.get() or {})
+
+
+def render_options(layers, dpi):
+    """剩余时间不足 RENDER_MIN_BUDGET 时去掉耗时的图层并降低分辨率，返回 (图层, 分辨率)"""
+    if not low(RENDER_MIN_BUDGET):
+        return layers, dpi
+    dropped = frozenset(layers) & DEGRADED_LAYERS
+    if dropped:
+        degrade('layers', sorted(dropped))
+    dpi = dpi * DEGRADED_DPI_SCALE
+    degrade('dpi', dpi)
+    return frozenset(layers) - dropped, dpi
@@ -3,15 +3,24 @@ import io
 
 import matplotlib.pyplot as plt
 import numpy as np
-from matplotlib.patches import Polygon, Rectangle
+from matplotlib import font_manager
+from matplotlib.collections import LineCollection, PolyCollection
+from matplotlib.patches import Polygon
 import re
 import math
-from matplotlib.transforms import Affine2D
+import os
+import time
 import matplotlib.patches as mpatches
-import check
-
-# 设置支持中文的字体
-plt.rcParams["font.family"] = ["Heiti TC"]
+import figpool
+import geometry
+import labels
+import metrics
+import spatial
+
+# 设置支持中文的字体；未安装时保留默认字体（matplotlib 3.7 每次查找缺失的字体都会缓存异常回溯，
+# 回溯引用的渲染器无法释放，每张图泄漏上百MB）
+if any(font.name == "Heiti TC" for font in font_manager.fontManager.ttflist):
+    plt.rcParams["font.family"] = ["Heiti TC"]
 plt.rcParams["axes.unicode_minus"] = False
 
 def parse_points(points_list):
@@ -51,6 +60,11 @@ def calculate_distance(p1, p2):
     """计算两点之间的欧氏距离"""
     return math.hypot(p2[0] - p1[0], p2[1] - p1[1])
 
+def box_patch(corners, color):
+    """由有向矩形的角点创建构件图形"""
+    return Polygon(corners, closed=True, facecolor=color, edgecolor='black', linewidth=1.5, alpha=0.8)
+
+
 def draw_furniture(ax, x, y, length, width, angle, color, name, unit_scale=1.0):
     """
     绘制带旋转角度的家具/设备矩形
@@ -59,53 +73,18 @@ def draw_furniture(ax, x, y, length, width, angle, color, name, unit_scale=1.0):
     angle: 旋转角度（度）
     unit_scale: 单位换算比例（如毫米转厘米为0.1）
     """
-    # 应用单位换算
-    scaled_length = length * unit_scale
-    scaled_width = width * unit_scale
-
-    # 创建矩形，以中心为原点
-    rect = Rectangle((-scaled_length / 2, -scaled_width / 2), scaled_length, scaled_width,
-                     facecolor=color, edgecolor='black',
-                     linewidth=1.5, alpha=0.8)
-
-    # 应用旋转和平移变换
-    transform = Affine2D().rotate_deg(angle).translate(x, y) + ax.transData
-    rect.set_transform(transform)
-
-    # 添加矩形到坐标轴
+    boxes = geometry.oriented_boxes([x], [y], [length], [width], [angle], unit_scale)
+    rect = box_patch(boxes['corners'][0], color)
     ax.add_patch(rect)
+    return rect
 
 def get_device_corners(x, y, length, width, angle, unit_scale=1.0):
     """
     获取设备矩形的四个角点坐标
     返回: [(x1,y1), (x2,y2), (x3,y3), (x4,y4)] 按顺时针顺序
     """
-    scaled_length = length * unit_scale
-    scaled_width = width * unit_scale
-
-    # 矩形的四个角点（以中心为原点）
-    corners = [
-        (-scaled_length/2, -scaled_width/2),  # 左下
-        (scaled_length/2, -scaled_width/2),   # 右下
-        (scaled_length/2, scaled_width/2),    # 右上
-        (-scaled_length/2, scaled_width/2)    # 左上
-    ]
-
-    # 应用旋转和平移变换
-    cos_a = math.cos(math.radians(angle))
-    sin_a = math.sin(math.radians(angle))
-
-    transformed_corners = []
-    for cx, cy in corners:
-        # 旋转
-        rx = cx * cos_a - cy * sin_a
-        ry = cx * sin_a + cy * cos_a
-        # 平移
-        tx = rx + x
-        ty = ry + y
-        transformed_corners.append((tx, ty))
-
-    return transformed_corners
+    boxes = geometry.oriented_boxes([x], [y], [length], [width], [angle], unit_scale)
+    return [tuple(corner) for corner in boxes['corners'][0]]
 
 
 def get_device_edges(corners):
@@ -289,10 +268,23 @@ def calculate_device_to_room_distances(device_info, room_coordinates, unit_scale
     return distances
 
 
+def polygon_edges(room_coordinates):
+    """房间多边形的所有边 [(x1, y1, x2, y2), ...]，共用的墙按各房间各算一次"""
+    return [(*coords[i], *coords[(i + 1) % len(coords)])
+            for coords in room_coordinates for i in range(len(coords))]
+
+
 def calculate_ray_intersection_from_center(midpoint, center, room_coordinates):
     """
     从边中点出发，沿远离中心的方向作射线，计算与房间轮廓的首次交点和距离
     """
+    return ray_intersection_from_center(midpoint, center, polygon_edges(room_coordinates))
+
+
+def ray_intersection_from_center(midpoint, center, edges):
+    """
+    同 calculate_ray_intersection_from_center，轮廓以墙段列表 [(x1, y1, x2, y2), ...] 给出
+    """
     x0, y0 = midpoint
     cx, cy = center
     dx = x0 - cx
@@ -306,89 +298,91 @@ def calculate_ray_intersection_from_center(midpoint, center, room_coordinates):
     min_distance = float('inf')
     intersection_point = None
 
-    for room_coords in room_coordinates:
-        num_points = len(room_coords)
-        for i in range(num_points):
-            x1, y1 = room_coords[i]
-            x2, y2 = room_coords[(i + 1) % num_points]
-
-            # 射线参数方程: (x, y) = (x0, y0) + t*(dx, dy)
-            # 线段参数方程: (x, y) = (x1, y1) + s*((x2-x1), (y2-y1)), 0<=s<=1
-            denom = (dx * (y1 - y2) - dy * (x1 - x2))
-            if abs(denom) < 1e-8:
-                continue  # 平行
-            t = ((x1 - x0) * (y1 - y2) - (y1 - y0) * (x1 - x2)) / denom
-            s = ((x0 - x1) * dy - (y0 - y1) * dx) / ((x2 - x1) * dy - (y2 - y1) * dx + 1e-12)
-            if t > 0 and 0 <= s <= 1:
-                ix = x0 + t * dx
-                iy = y0 + t * dy
-                distance = math.hypot(ix - x0, iy - y0)
-                if distance < min_distance:
-                    min_distance = distance
-                    intersection_point = (ix, iy)
+    for x1, y1, x2, y2 in edges:
+        # 射线参数方程: (x, y) = (x0, y0) + t*(dx, dy)
+        # 线段参数方程: (x, y) = (x1, y1) + s*((x2-x1), (y2-y1)), 0<=s<=1
+        denom = (dx * (y1 - y2) - dy * (x1 - x2))
+        if abs(denom) < 1e-8:
+            continue  # 平行
+        t = ((x1 - x0) * (y1 - y2) - (y1 - y0) * (x1 - x2)) / denom
+        s = ((x0 - x1) * dy - (y0 - y1) * dx) / ((x2 - x1) * dy - (y2 - y1) * dx + 1e-12)
+        if t > 0 and 0 <= s <= 1:
+            ix = x0 + t * dx
+            iy = y0 + t * dy
+            distance = math.hypot(ix - x0, iy - y0)
+            if distance < min_distance:
+                min_distance = distance
+                intersection_point = (ix, iy)
     return intersection_point, min_distance
 
 
-def draw_distance_lines(ax, device_info, room_coordinates, unit_scale=1.0):
-    """绘制设备边到房间边的距离线（修正版）"""
+def clearance_segments(center, corners, edges):
+    """
+    从有向矩形各边中点沿远离中心的方向计算到房间轮廓的距离
+    edges: 轮廓墙段 [(x1, y1, x2, y2), ...]，场景中用 scene_wall_edges（共用墙只算一次）
+    返回: [(midpoint, intersection, distance), ...]
+    """
+    corners = np.asarray(corners)
+    # 逐边求交在Python中进行，先转成float避免numpy标量运算的开销
+    midpoints = ((corners + np.roll(corners, -1, axis=0)) / 2).tolist()
+    center = tuple(np.asarray(center).tolist())
+    segments = []
+    for midpoint in midpoints:
+        midpoint = tuple(midpoint)
+        intersection, distance = ray_intersection_from_center(midpoint, center, edges)
+        if intersection:
+            segments.append((midpoint, intersection, distance))
+    return segments
+
+
+def calculate_clearance_segments(device_info, room_coordinates, unit_scale=1.0, is_parametric=None):
+    """
+    计算设备各边中点到房间轮廓的距离（不绘制）
+    is_parametric: 是否为参数化模型，为None时按名称判断
+    返回: [(midpoint, intersection, distance), ...]
+    """
     # 检查是参数化模型还是硬件设备
     # 参数化模型的特征：有name字段且包含特定关键词，或者来自NewWHCMode
-    is_parametric = (
-        'name' in device_info and 
-        ('电视柜' in device_info.get('name', '') or 'Y4060' in device_info.get('name', ''))
-    )
-    
-    if is_parametric:
-        # 参数化模型
-        x, y = parse_location(device_info.get('location', ''))
-        angle = parse_rotation(device_info.get('rotation', ''))
-    else:
-        # 硬件设备
-        x, y = parse_location(device_info.get('location', ''))
-        angle = parse_rotation(device_info.get('rotation', ''))
-    
-    length = float(device_info.get('length', 600))
-    width = float(device_info.get('width', 300))
-    
+    if is_parametric is None:
+        is_parametric = (
+            'name' in device_info and
+            ('电视柜' in (device_info.get('name') or '') or 'Y4060' in (device_info.get('name') or ''))
+        )
+
+    x, y = parse_location(device_info.get('location', ''))
     # 检查位置是否有效
     if (x, y) == (0, 0):
-        return
-    
-    # 对于参数化模型，需要计算中心点
-    if is_parametric:
-        # 参数化模型从端点开始，需要计算中心点
-        scaled_length = length * unit_scale
-        scaled_width = width * unit_scale
+        return []
+
+    # 参数化模型从端点开始，矩形和中心点与绘制时一致
+    boxes = geometry.oriented_boxes(
+        [x], [y], [float(device_info.get('length', 600))], [float(device_info.get('width', 300))],
+        [parse_rotation(device_info.get('rotation', ''))], unit_scale,
+        [device_info.get('scale_x', 1.0)], [device_info.get('scale_y', 1.0)], endpoint=is_parametric)
+    return clearance_segments(boxes['center'][0], boxes['corners'][0], polygon_edges(room_coordinates))
 
-        draw_angle = (270 - angle) % 360
-        
-        # 计算中心点（从端点向模型内部偏移半长度）
-        cos_a = math.cos(math.radians(draw_angle))
-        sin_a = math.sin(math.radians(draw_angle))
-        center_x = x + (scaled_length / 2) * cos_a
-        center_y = y + (scaled_length / 2) * sin_a
-        
-        print(f"    参数化模型端点: ({x:.1f}, {y:.1f})")
-        print(f"    参数化模型中心: ({center_x:.1f}, {center_y:.1f})")
-        
-        # 使用中心点进行距离计算
-        x, y = center_x, center_y
-    
-    # 获取设备角点和边
-    corners = get_device_corners(x, y, length, width, angle, unit_scale)
-    edges = get_device_edges(corners)
-    
-    # 只从模型中心计算距离，不重复计算
-    for start, end, direction in edges:
-        midpoint = get_edge_midpoint(start, end)
-        intersection, distance = calculate_ray_intersection_from_center(midpoint, (x, y), room_coordinates)
-        if intersection:
-            ix, iy = intersection
-            ax.plot([midpoint[0], ix], [midpoint[1], iy],
-                   'r--', linewidth=1, alpha=0.7)
-            ax.text((midpoint[0] + ix) / 2, (midpoint[1] + iy) / 2,
-                   f'{distance:.1f}cm', ha='center', va='center',
-                   fontsize=8, color='red', bbox=dict(facecolor='white', alpha=0.8))
+
+def draw_clearance_segments(ax, segments):
+    """把距离线画成一个 LineCollection，并标注距离；返回绘制的图形列表"""
+    if not segments:
+        return []
+    drawn = [ax.add_collection(LineCollection([(midpoint, intersection) for midpoint, intersection, _ in segments],
+                                              colors='red', linestyles='--', linewidths=1, alpha=0.7), autolim=False)]
+    for midpoint, (ix, iy), distance in segments:
+        drawn.append(ax.text((midpoint[0] + ix) / 2, (midpoint[1] + iy) / 2,
+                             f'{distance:.1f}cm', ha='center', va='center',
+                             fontsize=8, color='red', bbox=dict(facecolor='white', alpha=0.8)))
+    return drawn
+
+
+def has_clearances(item, family):
+    """构件是否标注到房间边的距离线（插座和没有位置的构件不标注）"""
+    return family != 'hydropower' and (item['x'], item['y']) != (0, 0)
+
+
+def draw_distance_lines(ax, device_info, room_coordinates, unit_scale=1.0, is_parametric=None):
+    """绘制设备边到房间边的距离线（修正版）"""
+    draw_clearance_segments(ax, calculate_clearance_segments(device_info, room_coordinates, unit_scale, is_parametric))
 
 def calculate_intersection(midpoint, direction, edge_start, edge_end):
     """计算设备边中点与房间边的交点"""
@@ -450,220 +444,601 @@ def parse_rotation_for_parametric(rotation_str):
 #     ax.add_patch(rect)
 #
 #     return start_x, start_y
+
+
 def draw_parametric_furniture(ax, start_x, start_y, length, width, angle, color, name, unit_scale=1.0, scale_x=1.0, scale_y=1.0):
     """
-    绘制参数化模型，支持沿X/Y轴翻转
+    绘制参数化模型，以端点为矩形起始点，支持沿X/Y轴翻转
     - scale_x < 0: 沿Y轴翻转（左右镜像）
     - scale_y < 0: 沿X轴翻转（上下镜像）
     """
-    # 应用单位换算
-    scaled_length = abs(length) * unit_scale
-    scaled_width = abs(width) * unit_scale
-
-    # 基础旋转角度（原始逻辑保持）
-    draw_angle = (270 - angle) % 360
-
-    if scale_x < 0 and scale_y < 0:
-        draw_angle = (draw_angle + 180) % 360
-        # 计算长度方向的偏移量（翻转后起始点沿长度方向反向移动）
-        offset_x = scaled_length * np.cos(np.radians(draw_angle))
-        offset_y = scaled_length * np.sin(np.radians(draw_angle))
-        start_x -= offset_x
-        start_y -= offset_y
-        draw_angle = (draw_angle + 180) % 360
-        # 计算宽度方向的偏移量（翻转后起始点沿宽度方向反向移动）
-        offset_x = scaled_width * np.cos(np.radians(draw_angle + 62.5))  # +90度是宽度方向的垂直角度
-        offset_y = scaled_width * np.sin(np.radians(draw_angle + 90))
-        start_x -= offset_x
-        start_y -= offset_y
-
-    # 处理沿Y轴翻转（scale_x < 0）：左右镜像
-    elif scale_x < 0:
-        # 沿Y轴翻转需要将旋转角度反向180度，并调整起始点偏移
-        draw_angle = (draw_angle + 180) % 360
-        # 计算长度方向的偏移量（翻转后起始点沿长度方向反向移动）
-        offset_x = scaled_length * np.cos(np.radians(draw_angle))
-        offset_y = scaled_length * np.sin(np.radians(draw_angle))
-        start_x -= offset_x
-        start_y -= offset_y
-
-    # 处理沿X轴翻转（scale_y < 0）：上下镜像
-    elif scale_y < 0:
-        # 沿X轴翻转需要将旋转角度反向180度，并调整起始点偏移
-        draw_angle = (draw_angle + 180) % 360
-        # 计算宽度方向的偏移量（翻转后起始点沿宽度方向反向移动）
-        offset_x = scaled_width * np.cos(np.radians(draw_angle + 90))  # +90度是宽度方向的垂直角度
-        offset_y = scaled_width * np.sin(np.radians(draw_angle + 90))
-        start_x -= offset_x
-        start_y -= offset_y
-
-    # 创建矩形（尺寸用绝对值保证正确）
-    rect = Rectangle((0, 0), scaled_length, scaled_width,
-                     facecolor=color, edgecolor='black',
-                     linewidth=1.5, alpha=0.8)
-
-    # 应用旋转和平移变换
-    transform = Affine2D().rotate_deg(draw_angle).translate(start_x, start_y) + ax.transData
-    rect.set_transform(transform)
+    boxes = geometry.oriented_boxes([start_x], [start_y], [length], [width], [angle], unit_scale,
+                                    [scale_x], [scale_y], endpoint=True)
+    rect = box_patch(boxes['corners'][0], color)
+    ax.add_patch(rect)
+    return rect
 
+
+def item_boxes(items, family, unit_scale=1.0):
+    """场景构件的有向矩形（见 geometry.oriented_boxes），参数化模型以端点为起点并处理翻转"""
+    if family != 'parametric':
+        return geometry.oriented_boxes([item['x'] for item in items], [item['y'] for item in items],
+                                       [item['length'] for item in items], [item['width'] for item in items],
+                                       [item['angle'] for item in items], unit_scale)
+    return geometry.oriented_boxes([item['x'] for item in items], [item['y'] for item in items],
+                                   [item['length'] for item in items], [item['width'] for item in items],
+                                   [item['angle'] for item in items], unit_scale,
+                                   [item['scale_x'] for item in items], [item['scale_y'] for item in items],
+                                   endpoint=True)
+
+
+def get_item_corners(item, family, unit_scale=1.0):
+    """场景构件矩形的四个角点"""
+    return [tuple(corner) for corner in item_boxes([item], family, unit_scale)['corners'][0]]
+
+
+# 各类构件的填充颜色
+FAMILY_COLORS = {'hydropower': 'blue', 'hard': 'pink', 'parametric': 'lightblue'}
+
+
+def draw_scene_item(ax, item, family, unit_scale):
+    """按类别绘制场景中的单个构件，返回对应的图形"""
+    rect = box_patch(item_boxes([item], family, unit_scale)['corners'][0], FAMILY_COLORS[family])
     ax.add_patch(rect)
-    return start_x, start_y
+    return rect
 
-def plot_room_with_furniture():
-    """绘制房间轮廓、边长及按实际尺寸的软装"""
-    fig, ax = plt.subplots(figsize=(14, 12))
-    room_colors = ['#FFA07A', '#98FB98', '#87CEFA', '#DDA0DD', '#F0E68C']
 
-    # 单位换算比例：设备尺寸（毫米）转房间坐标单位（假设为厘米）
-    # 1厘米 = 10毫米 → 比例为0.1
-    unit_scale = 0.1
+# 画布尺寸（英寸）和默认输出分辨率
+FIGSIZE = (14, 12)
+OUTPUT_DPI = 300
+# 细节层次：输出图上最长边不足该像素数的构件只画简化标记
+LOD_MIN_PIXELS = float(os.environ.get('FLOORPLAN_LOD_MIN_PX', 3))
+# 简化标记按该像素大小的网格聚合，同一格内不少于 LOD_AGGREGATE_MIN 个时只画一个计数
+LOD_AGGREGATE_PIXELS = 24
+LOD_AGGREGATE_MIN = 5
 
-    # 收集所有房间坐标用于距离计算
-    all_room_coordinates = []
 
-    # 绘制房间轮廓和边长
-    for i, room in enumerate(check.get_roomList()):
-        room_id = room['SpaceId']
-        room_name = room['Name']
-        points = room['points']
-        coordinates = parse_points(points)
+def scene_item_boxes(scene, family):
+    """构件的有向矩形，计算一次后缓存在场景中"""
+    cache = scene.setdefault('boxes', {})
+    if family not in cache:
+        cache[family] = item_boxes(scene[family], family, scene['unit_scale'])
+    return cache[family]
 
-        if not coordinates:
-            print(f"房间 {room_name} (ID: {room_id}) 没有有效的坐标点")
-            continue
 
-        all_room_coordinates.append(coordinates)
-
-        # 绘制房间多边形
-        polygon = Polygon(
-            coordinates,
-            fill=True,
-            alpha=0.5,
-            color=room_colors[i % len(room_colors)],
-            edgecolor='black',
-            linewidth=2,
-            label=f"{room_name} (ID: {room_id})"
-        )
-        ax.add_patch(polygon)
-
-        # 标注房间名称
-        centroid_x = sum(p[0] for p in coordinates) / len(coordinates)
-        centroid_y = sum(p[1] for p in coordinates) / len(coordinates)
-        plt.text(
-            centroid_x, centroid_y,
-            room_name,
-            ha='center', va='center',
-            fontweight='bold',
-            fontsize=10,
-            bbox=dict(facecolor='white', edgecolor='gray', pad=3, boxstyle='round,pad=0.5')
-        )
+def scene_item_bboxes(scene, family):
+    """构件矩形在绘图坐标下的包围盒 (N, 4)，计算一次后缓存在场景中"""
+    cache = scene.setdefault('bboxes', {})
+    if family not in cache:
+        corners = scene_item_boxes(scene, family)['corners']
+        cache[family] = np.column_stack([corners[:, :, 0].min(axis=1), corners[:, :, 1].min(axis=1),
+                                         corners[:, :, 0].max(axis=1), corners[:, :, 1].max(axis=1)])
+    return cache[family]
 
-    # # 绘制普通插座（hydropowerMode）
-    for item in check.get_hydropowerModeList():
-        if not item:
-            continue
 
-        loc = parse_location(item.get('location', ''))
-        rot = parse_rotation(item.get('rotation', ''))
-        # 插座原始尺寸（毫米）
-        length = float(item.get('length', 100))  # 实际插座约100mm
-        width = float(item.get('width', 100))
-        name = item.get('pointUse', '插座')
+def scene_spatial_index(scene, family):
+    """构件的网格空间索引，建立一次后缓存在场景中"""
+    cache = scene.setdefault('spatial', {})
+    if family not in cache:
+        cache[family] = spatial.build_grid(scene_item_bboxes(scene, family))
+    return cache[family]
 
-        # 绘制时应用单位换算
-        draw_furniture(ax, loc[0], loc[1], length, width, rot, 'blue', name, unit_scale)
 
-    # 绘制硬件设备（hardMode）
-    for item in check.get_hardModeList():
-        if not item:
-            continue
+# 墙段尺寸线：距墙内侧的距离、端部短线的半长（cm），短于 DIMENSION_MIN_LENGTH 的墙段不标注
+DIMENSION_OFFSET = 12
+DIMENSION_TICK = 4
+DIMENSION_MIN_LENGTH = 30
 
-        loc = parse_location(item.get('location', ''))
-        rot = parse_rotation(item.get('rotation', ''))
-        # 设备原始尺寸（毫米）
-        length = float(item.get('length', 600))
-        width = float(item.get('width', 300))
-        name_str = item.get('name') or item.get('pointUse') or '设备'
-        name = name_str.split('-')[0]
 
-        # 绘制时应用单位换算
-        draw_furniture(ax, loc[0], loc[1], length, width, rot, 'pink', name , unit_scale)
+def scene_wall_segments(scene):
+    """
+    房间的墙体图（geometry.wall_graph）：顶点吸附、共线边合并，相邻房间的共用墙只保留一段
+    build_scene 时已生成；从场景存储加载的场景首次使用时计算并缓存在场景中
+    """
+    if 'walls' not in scene:
+        scene['walls'] = geometry.wall_graph(scene['room_coordinates'])
+    return scene['walls']
 
-        # 绘制设备到房间边的距离线
-        # draw_distance_lines(ax, item, all_room_coordinates, unit_scale)
 
-    # 绘制参数化模型（NewWHCMode）
-    for item in check.get_NewWHCModeList():
-        if not item:
-            continue
+def scene_wall_edges(scene):
+    """
+    墙体图中房间边界（墙体内侧表面）的列表 [(x1, y1, x2, y2), ...]，供逐段求交的距离线计算使用，
+    缓存在墙体图中
+    """
+    faces = scene_wall_segments(scene)['faces']
+    if 'edge_list' not in faces:
+        faces['edge_list'] = [tuple(edge) for edge in np.hstack([faces['starts'], faces['ends']]).tolist()]
+    return faces['edge_list']
+
+
+def draw_walls(ax, walls, rooms=None):
+    """
+    把房间轮廓画成一个 LineCollection，重合的边界只画一次，颜色取法向一侧房间的颜色
+    walls: 墙体图的房间边界（wall_graph 返回值的 'faces'）
+    rooms: 只画与这些房间（下标）相邻的边界，为None时全部绘制
+    """
+    mask = np.ones(len(walls['lengths']), dtype=bool)
+    if rooms is not None:
+        mask &= np.isin(walls['rooms'], list(rooms)).any(axis=1)
+    if not mask.any():
+        return
+    colors = [ROOM_COLORS[room % len(ROOM_COLORS)] for room in walls['owners'][mask].tolist()]
+    ax.add_collection(LineCollection(np.stack([walls['starts'][mask], walls['ends'][mask]], axis=1),
+                                     colors=colors, linewidths=2, alpha=0.5), autolim=False)
+
+
+def draw_dimensions(ax, walls, rooms=None):
+    """
+    把墙段尺寸线及两端短线画成一个 LineCollection
+    rooms: 只标注与这些房间（下标）相邻的墙段，为None时全部标注；共用墙只标注一次，标在法向一侧房间内，
+    距墙体内侧表面 DIMENSION_OFFSET（中心线墙先偏移半个墙厚）
+    返回尺寸文字的标注候选，与其他标注一起放置
+    """
+    mask = walls['lengths'] >= DIMENSION_MIN_LENGTH
+    if rooms is not None:
+        mask &= np.isin(walls['rooms'], list(rooms)).any(axis=1)
+    if not mask.any():
+        return []
+    normals, lengths = walls['normals'][mask], walls['lengths'][mask]
+    offsets = (walls['thickness'][mask] / 2 + DIMENSION_OFFSET)[:, None]
+    starts = walls['starts'][mask] + normals * offsets
+    ends = walls['ends'][mask] + normals * offsets
+    tick = normals * DIMENSION_TICK
+    segments = np.concatenate([np.stack([starts, ends], axis=1),
+                               np.stack([starts - tick, starts + tick], axis=1),
+                               np.stack([ends - tick, ends + tick], axis=1)])
+    ax.add_collection(LineCollection(segments, colors='#555555', linewidths=0.6), autolim=False)
+
+    # 文字沿墙方向，保持正向可读
+    directions = ends - starts
+    angles = np.degrees(np.arctan2(directions[:, 1], directions[:, 0]))
+    angles = np.where(angles > 90, angles - 180, np.where(angles <= -90, angles + 180, angles))
+    middles = (starts + ends) / 2
+    return [labels.dimension_candidate(f'{length:.0f}', x, y, angle)
+            for length, (x, y), angle in zip(lengths, middles, angles)]
+
+
+def axis_limits(scene):
+    """按房间轮廓和构件位置计算坐标轴范围 (xlim, ylim)，没有任何点时返回None"""
+    unit_scale = scene['unit_scale']
+    # 房间部分只需包围盒的两个角点
+    all_points = [(box[0], box[1]) for box in scene['room_stats']['bbox']]
+    all_points += [(box[2], box[3]) for box in scene['room_stats']['bbox']]
+    all_points += [(item['x'], item['y']) for item in scene['hydropower']]
+    all_points += [(item['x'], item['y']) for item in scene['hard']]
+    if not all_points:
+        return None
+    all_x = [p[0] for p in all_points]
+    all_y = [p[1] for p in all_points]
+    max_size = max(
+        [item['length'] * unit_scale for item in scene['hydropower']] +
+        [item['width'] * unit_scale for item in scene['hydropower']] +
+        [item['length'] * unit_scale for item in scene['hard']] +
+        [item['width'] * unit_scale for item in scene['hard']] +
+        [50]
+    )
+    return ((min(all_x) - max_size, max(all_x) + max_size),
+            (min(all_y) - max_size, max(all_y) + max_size))
 
-        # # 参数化模型使用专门的解析函数，Y轴向下为正
-        original_loc = parse_location_for_parametric(item.get('location', ''))
-        rot = parse_rotation_for_parametric(item.get('rotation', ''))
 
-        # 解析scale值
-        scale_str = item.get('scale', 'X=1.000 Y=1.000 Z=1.000')
-        scale_x = float(scale_str.split('X=')[1].split()[0])
-        scale_y = float(scale_str.split('Y=')[1].split()[0])
+def visible_extent(fig, ax, xlim, ylim, dpi):
+    """
+    估算输出图上每cm的像素数和实际可见范围
+    等比例坐标轴会扩展较短一边的范围以填满坐标区域；tight_layout 之后坐标区域还会略微变大，
+    因此可见范围四周各多留10%
+    返回: (像素/cm, (xmin, ymin, xmax, ymax))
+    """
+    position = ax.get_position()
+    box_width = position.width * fig.get_figwidth() * dpi
+    box_height = position.height * fig.get_figheight() * dpi
+    scale = min(box_width / (xlim[1] - xlim[0]), box_height / (ylim[1] - ylim[0]))
+    center_x, center_y = (xlim[0] + xlim[1]) / 2, (ylim[0] + ylim[1]) / 2
+    half_width, half_height = box_width / scale * 0.6, box_height / scale * 0.6
+    return scale, (center_x - half_width, center_y - half_height, center_x + half_width, center_y + half_height)
+
+
+def draw_lod_markers(ax, markers, scale, dpi):
+    """
+    绘制被简化的构件：按输出图上的像素网格分组，格内构件较少时每个画一个小方块，
+    较多时只在其中心画一个计数
+    markers: [(类别, 中心x数组, 中心y数组), ...]
+    """
+    xs = np.concatenate([xs for _, xs, _ in markers])
+    ys = np.concatenate([ys for _, _, ys in markers])
+    if not len(xs):
+        return
+    families = np.concatenate([np.full(len(family_xs), i) for i, (_, family_xs, _) in enumerate(markers)])
+
+    cell = LOD_AGGREGATE_PIXELS / scale
+    cells = np.floor(np.column_stack([xs, ys]) / cell).astype(np.int64)
+    _, inverse, counts = np.unique(cells, axis=0, return_inverse=True, return_counts=True)
+    inverse = inverse.reshape(-1)
+    grouped = counts[inverse] >= LOD_AGGREGATE_MIN
+
+    # scatter 的尺寸单位是磅，按输出分辨率从像素换算
+    marker_size = (LOD_MIN_PIXELS * 72 / dpi) ** 2
+    for i, (family, _, _) in enumerate(markers):
+        single = (families == i) & ~grouped
+        if single.any():
+            ax.scatter(xs[single], ys[single], s=marker_size, c=FAMILY_COLORS[family], marker='s', linewidths=0)
+
+    clusters = np.flatnonzero(counts >= LOD_AGGREGATE_MIN)
+    if not len(clusters):
+        return
+    cluster_x = np.bincount(inverse, weights=xs)[clusters] / counts[clusters]
+    cluster_y = np.bincount(inverse, weights=ys)[clusters] / counts[clusters]
+    cluster_points = LOD_AGGREGATE_PIXELS * 72 / dpi
+    ax.scatter(cluster_x, cluster_y, s=(cluster_points * 0.6) ** 2, c='gray', alpha=0.5, linewidths=0)
+    for x, y, count in zip(cluster_x, cluster_y, counts[clusters]):
+        ax.text(x, y, str(count), ha='center', va='center', fontsize=max(4, cluster_points * 0.4), clip_on=True)
 
-        # 从 ParameterList 中获取尺寸信息
-        length = float(item.get('length', 600))
-        width = float(item.get('width', 300))
-        name_str = item.get('name') or '设备'
-        name = name_str.split('-')[0]
 
-        # 直接使用原始位置
-        loc = original_loc
+def draw_family(ax, scene, family, artists=None, cull_box=None, scale=None):
+    """
+    绘制一类构件，参数含义见 build_figure（scale 为输出图上每cm的像素数）
+    返回: (过小构件的标记 (类别, 中心x, 中心y) 或None, 标注候选, 距离线)
+    """
+    layers = scene['layers']
+    items = scene[family]
+    markers = None
+    label_candidates = []
+    clearance_lines = []
+    indices = range(len(items))
+    if cull_box is not None:
+        indices = spatial.query_grid(scene_spatial_index(scene, family), cull_box)
+    if scale is not None and len(indices):
+        # 输出图上过小的构件只记录中心，最后统一画成标记
+        bboxes = scene_item_bboxes(scene, family)[np.asarray(indices)]
+        sizes = np.maximum(bboxes[:, 2] - bboxes[:, 0], bboxes[:, 3] - bboxes[:, 1]) * scale
+        tiny = sizes < LOD_MIN_PIXELS
+        if tiny.any():
+            markers = (family, (bboxes[tiny, 0] + bboxes[tiny, 2]) / 2, (bboxes[tiny, 1] + bboxes[tiny, 3]) / 2)
+            indices = np.asarray(indices)[~tiny]
+
+    indices = np.asarray(indices, dtype=int)
+    boxes = scene_item_boxes(scene, family)
+    if artists is None and len(indices):
+        # 整个类别画成一个 PolyCollection
+        ax.add_collection(PolyCollection(boxes['corners'][indices], facecolors=FAMILY_COLORS[family],
+                                         edgecolors='black', linewidths=1.5, alpha=0.8), autolim=False)
+    for index in indices:
+        item = items[index]
+        key = item_key(family, item)
+        if artists is not None:
+            # 编辑会话需要逐个构件的图形，以便单独移动和重绘
+            rect = box_patch(boxes['corners'][index], FAMILY_COLORS[family])
+            ax.add_patch(rect)
+            artists[key] = rect
+        if 'labels' in layers:
+            label_candidates.append((key, labels.item_candidate(item['label'], scene_item_bboxes(scene, family)[index])))
+
+        # 设备到房间边的距离线；编辑会话中每个构件的距离线单独绘制，随构件重绘
+        if 'clearances' in layers and has_clearances(item, family):
+            segments = clearance_segments(boxes['center'][index], boxes['corners'][index], scene_wall_edges(scene))
+            if artists is not None:
+                artists.setdefault('clearances', {})[key] = draw_clearance_segments(ax, segments)
+            else:
+                clearance_lines += segments
+    return markers, label_candidates, clearance_lines
+
+
+# 房间填充颜色，按房间顺序循环使用
+ROOM_COLORS = ['#FFA07A', '#98FB98', '#87CEFA', '#DDA0DD', '#F0E68C']
+
+
+def draw_scene(fig, ax, scene, limits, cull_box=None, scale=None, dpi=None, artists=None):
+    """
+    在坐标区域中绘制场景内容：房间、墙段尺寸、各类构件、距离线、简化标记和标注，不含图例和坐标轴装饰
+    limits: 坐标轴范围 (xlim, ylim)，用于换算标注大小，为None时不绘制标注
+    cull_box、scale、dpi、artists 见 build_figure 和 draw_family
+    """
+    layers = scene['layers']
+    label_candidates = []
+    visible_rooms = []
 
-        # 绘制时应用单位换算
-        draw_parametric_furniture(ax, loc[0], loc[1], length, width, rot, 'lightblue', name, unit_scale, scale_x, scale_y)
+    # 绘制房间轮廓和边长
+    for i, room in enumerate(scene['rooms']):
+        room_id = room['SpaceId']
+        room_name = room['Name']
+        coordinates = room['coordinates']
+        if cull_box is not None:
+            room_box = scene['room_stats']['bbox'][i]
+            if (room_box[0] > cull_box[2] or room_box[2] < cull_box[0] or
+                    room_box[1] > cull_box[3] or room_box[3] < cull_box[1]):
+                continue
+        visible_rooms.append(i)
+
+        # 绘制房间多边形（只填充，轮廓由墙体图统一绘制）
+        if 'rooms' in layers:
+            polygon = Polygon(
+                coordinates,
+                fill=True,
+                alpha=0.5,
+                color=ROOM_COLORS[i % len(ROOM_COLORS)],
+                linewidth=0,
+                label=f"{room_name} (ID: {room_id})"
+            )
+            ax.add_patch(polygon)
+
+        if 'labels' not in layers:
+            continue
 
-        # # 绘制设备到房间边的距离线
-        # draw_distance_lines(ax, item, all_room_coordinates, unit_scale)
-    # 添加图例
-    # room_patch = mpatches.Patch(color=room_colors[0], alpha=0.5, label='房间（单位：cm）')
+        # 房间名称标注，统一在最后放置
+        label_candidates.append((('room', i), labels.room_candidate(room, scene['room_stats']['centroid'][i])))
+
+    # 房间轮廓，共用墙只画一次
+    if 'rooms' in layers and visible_rooms:
+        draw_walls(ax, scene_wall_segments(scene)['faces'], visible_rooms)
+
+    # 墙段尺寸
+    if 'dimensions' in layers:
+        for n, candidate in enumerate(draw_dimensions(ax, scene_wall_segments(scene), visible_rooms)):
+            label_candidates.append((('dimension', n), candidate))
+
+    # 依次绘制普通插座（hydropowerMode）、硬件设备（hardMode）和参数化模型（NewWHCMode）
+    markers = []
+    clearance_lines = []
+    for family in ('hydropower', 'hard', 'parametric'):
+        family_markers, family_labels, family_lines = draw_family(ax, scene, family, artists, cull_box, scale)
+        if family_markers is not None:
+            markers.append(family_markers)
+        label_candidates += family_labels
+        clearance_lines += family_lines
+    draw_clearance_segments(ax, clearance_lines)
+    if markers:
+        draw_lod_markers(ax, markers, scale, dpi)
+
+    # 房间和构件名称由一个图层批量绘制，放置时避免相互重叠
+    if label_candidates and limits is not None:
+        points_per_cm, _ = visible_extent(fig, ax, limits[0], limits[1], 72)
+        label_layer = labels.LabelLayer(1 / points_per_cm)
+        for key, candidate in label_candidates:
+            label_layer.set_label(key, candidate)
+        label_layer.place()
+        ax.add_artist(label_layer)
+        if artists is not None:
+            artists['labels'] = label_layer
+
+
+
+def build_figure(scene, artists=None, viewport=None, dpi=None):
+    """
+    绘制房间轮廓、边长及按实际尺寸的软装，返回 (fig, ax)
+    artists: 传入字典时，按 (类别, id, instance) 记录每个构件对应的矩形，'labels' 键记录标注图层，
+             'clearances' 键记录 {构件键: 该构件的距离线图形列表}
+    viewport: 绘图坐标下的可见范围 (xmin, ymin, xmax, ymax)，范围外的房间和构件不绘制
+    dpi: 输出分辨率，给定时按输出像素做细节层次简化，过小的构件画成标记或聚合计数
+    """
+    # 从Figure池借出已装饰好的画布，由 encode_figure 归还
+    fig, ax = figpool.acquire(FIGSIZE)
+    layers = scene['layers']
+
+    # 坐标轴范围和输出图上的比例尺，用于视口裁剪和细节层次
+    limits = axis_limits(scene)
+    if viewport is not None:
+        limits = ((viewport[0], viewport[2]), (viewport[1], viewport[3]))
+    scale, cull_box = None, None
+    if limits is not None and (viewport is not None or dpi is not None):
+        pixels_per_cm, visible = visible_extent(fig, ax, limits[0], limits[1], dpi or fig.dpi)
+        scale = pixels_per_cm if dpi is not None else None
+        cull_box = visible if viewport is not None else None
+
+    draw_scene(fig, ax, scene, limits, cull_box, scale, dpi, artists)
+
+    # 添加图例（只包含已绘制的类别）
+    # room_patch = mpatches.Patch(color=ROOM_COLORS[0], alpha=0.5, label='房间（单位：cm）')
     socket_patch = mpatches.Patch(color='blue', alpha=0.8, label='插座（单位：cm）')
     device_patch = mpatches.Patch(color='pink', alpha=0.8, label='非参数化模型（单位：cm）')
     NewWHCMode_patch = mpatches.Patch(color='lightblue', alpha=0.8, label='参数化模型（单位：cm）')
-    # distance_patch = mpatches.Patch(color='red', alpha=0.7, label='设备到房间边距离')
-    ax.legend(handles=[socket_patch, device_patch, NewWHCMode_patch], loc='upper right')
+    distance_patch = mpatches.Patch(color='red', alpha=0.7, label='设备到房间边距离')
+    handles = [patch for patch, layer in ((socket_patch, 'sockets'), (device_patch, 'hard'),
+                                          (NewWHCMode_patch, 'parametric'), (distance_patch, 'clearances'))
+               if layer in layers]
+    if handles:
+        ax.legend(handles=handles, loc='upper right')
 
-    # 设置图表属性
-    plt.axis('equal')
-    plt.grid(True, linestyle='--', alpha=0.7)
-    plt.title('平面图', fontsize=14)
-    plt.xlabel('X坐标（cm）', fontsize=12)
-    plt.ylabel('Y坐标（cm）', fontsize=12)
+    # 网格、标题、坐标轴标签和Y轴标签格式已由Figure池设置
+    ax.axis('equal')
 
     # 调整坐标轴范围
-    all_points = [p for room in check.get_roomList() for p in parse_points(room['points'])]
-    all_points += [parse_location(item.get('location', '')) for item in check.get_hydropowerModeList() if item]
-    all_points += [parse_location(item.get('location', '')) for item in check.get_hardModeList() if item]
-    if all_points:
-        all_x = [p[0] for p in all_points]
-        all_y = [p[1] for p in all_points]
-        max_size = max(
-            [float(item.get('length', 0)) * unit_scale for item in check.get_hydropowerModeList() if item] +
-            [float(item.get('width', 0)) * unit_scale for item in check.get_hydropowerModeList() if item] +
-            [float(item.get('length', 0)) * unit_scale for item in check.get_hardModeList() if item] +
-            [float(item.get('width', 0)) * unit_scale for item in check.get_hardModeList() if item] +
-            [50]
-        )
-        plt.xlim(min(all_x) - max_size, max(all_x) + max_size)
-        plt.ylim(min(all_y) - max_size, max(all_y) + max_size)
-    # 反转Y轴标签
-    yticks = ax.get_yticks()
-    ax.set_yticklabels([-ytick for ytick in yticks])
-    plt.tight_layout()
-    image_path = 'floorplan.png'
-    plt.savefig(image_path)
+    if limits is not None:
+        ax.set_xlim(*limits[0])
+        ax.set_ylim(*limits[1])
+    fig.tight_layout()
+    return fig, ax
+
+
+def output_dpi(pixel_size=None):
+    """按目标像素尺寸 (宽, 高) 计算输出分辨率，高为None时只按宽度计算"""
+    if pixel_size is None:
+        return OUTPUT_DPI
+    width, height = pixel_size
+    dpi = width / FIGSIZE[0]
+    if height is not None:
+        dpi = min(dpi, height / FIGSIZE[1])
+    return dpi
+
+
+def encode_figure(fig, dpi=OUTPUT_DPI, image_path=None, bbox_inches='tight', transparent=False):
+    """
+    把Figure编码为base64 PNG并归还Figure池；image_path 不为空时额外保存一份图片
+    bbox_inches: 输出范围（英寸），默认裁掉空白；transparent: 背景透明，用于叠加层
+    """
+    encode_start = time.perf_counter()
+    if image_path:
+        fig.savefig(image_path)
     # 保存图片到内存
     buf = io.BytesIO()
-    plt.savefig(buf, format='png', bbox_inches='tight', dpi=300)
+    fig.savefig(buf, format='png', bbox_inches=bbox_inches, dpi=dpi, transparent=transparent)
     buf.seek(0)
 
     # 转换为base64编码
     image_data = base64.b64encode(buf.read()).decode('utf-8')
-    plt.show()
-    plt.close(fig)
-    return image_data
\ No newline at end of file
+    metrics.observe_stage('encode', encode_start)
+    figpool.release(fig)
+    return image_data
+
+
+def save_figure(fig, path, dpi=OUTPUT_DPI):
+    """把Figure保存为PNG文件（裁掉空白）并归还Figure池"""
+    encode_start = time.perf_counter()
+    fig.savefig(path, format='png', bbox_inches='tight', dpi=dpi)
+    metrics.observe_stage('encode', encode_start)
+    figpool.release(fig)
+
+
+def plot_room_with_furniture(scene, image_path='floorplan.png', viewport=None, pixel_size=None, dpi=None):
+    """
+    绘制平面图并返回base64编码的PNG
+    scene: scene.build_scene 构建的场景
+    image_path: 额外保存一份图片的路径，为None时不保存
+    viewport: 只绘制该范围（绘图坐标）内的内容，见 scene.parse_viewport
+    pixel_size: 目标像素尺寸 (宽, 高)，决定输出分辨率和细节层次
+    dpi: 直接指定输出分辨率，优先于 pixel_size
+    """
+    dpi = dpi or output_dpi(pixel_size)
+    draw_start = time.perf_counter()
+    fig, ax = build_figure(scene, viewport=viewport, dpi=dpi)
+    metrics.observe_stage('draw', draw_start)
+    return encode_figure(fig, dpi, image_path)
+
+
+def plot_base(scene, dpi=OUTPUT_DPI):
+    """
+    绘制渐进式平面图的底图（房间轮廓、标注和图例），构件列表此时可以为空
+    返回: (base64 PNG, 叠加层对齐用的画面参数)
+    画面参数记录底图的坐标区域位置、等比例调整后的坐标轴范围和裁剪后的输出范围
+    """
+    draw_start = time.perf_counter()
+    fig, ax = build_figure(scene, dpi=dpi)
+    ax.apply_aspect()
+    frame = {
+        'position': ax.get_position(),
+        'xlim': ax.get_xlim(),
+        'ylim': ax.get_ylim(),
+        'bbox_inches': fig.get_tightbbox(fig.canvas.get_renderer()).padded(plt.rcParams['savefig.pad_inches']),
+        'room_labels': [labels.room_candidate(room) for room in scene['rooms']] if 'labels' in scene['layers'] else [],
+    }
+    metrics.observe_stage('draw', draw_start)
+    return encode_figure(fig, dpi, bbox_inches=frame['bbox_inches']), frame
+
+
+def plot_overlay(scene, family, frame, dpi=OUTPUT_DPI):
+    """
+    在透明背景上只绘制一类构件（含标注、距离线），画面与 plot_base 的底图对齐，返回base64 PNG
+    构件标注避让房间名，不避让其他类别的构件标注
+    """
+    draw_start = time.perf_counter()
+    fig = figpool.new_figure(FIGSIZE)
+    ax = fig.add_axes(frame['position'])
+    ax.set_axis_off()
+    xlim, ylim = frame['xlim'], frame['ylim']
+    ax.set_xlim(*xlim)
+    ax.set_ylim(*ylim)
+    scale, _ = visible_extent(fig, ax, xlim, ylim, dpi)
+
+    markers, label_candidates, clearance_lines = draw_family(ax, scene, family, scale=scale)
+    draw_clearance_segments(ax, clearance_lines)
+    if markers is not None:
+        draw_lod_markers(ax, [markers], scale, dpi)
+    if label_candidates:
+        points_per_cm, _ = visible_extent(fig, ax, xlim, ylim, 72)
+        label_layer = labels.LabelLayer(1 / points_per_cm, kinds={'device'})
+        for n, candidate in enumerate(frame['room_labels']):
+            label_layer.set_label(('room', n), candidate)
+        for key, candidate in label_candidates:
+            label_layer.set_label(key, candidate)
+        label_layer.place()
+        ax.add_artist(label_layer)
+    metrics.observe_stage('draw', draw_start)
+    return encode_figure(fig, dpi, bbox_inches=frame['bbox_inches'], transparent=True)
+
+
+def draw_clearance_zones(ax, audit):
+    """净空规则检查结果（见 rules.audit_scene）：满足的净空区域画绿色虚线框，违规的画红色半透明区域"""
+    zones = audit['zones']
+    if not len(zones['owner']):
+        return
+    u, v = zones['axes'][:, 0], zones['axes'][:, 1]
+    du, dv = u * zones['half'][:, :1], v * zones['half'][:, 1:]
+    center = zones['center']
+    corners = np.stack([center - du - dv, center + du - dv, center + du + dv, center - du + dv], axis=1)
+    violated = audit['violated']
+    if (~violated).any():
+        ax.add_collection(PolyCollection(corners[~violated], facecolors='none', edgecolors='green',
+                                         linewidths=1, linestyles='--', zorder=4), autolim=False)
+    if violated.any():
+        ax.add_collection(PolyCollection(corners[violated], facecolors='red', edgecolors='red',
+                                         linewidths=1, alpha=0.35, zorder=4), autolim=False)
+
+
+def plot_clearance_audit(scene, audit):
+    """绘制平面图并叠加净空规则检查结果，返回base64编码的PNG"""
+    draw_start = time.perf_counter()
+    fig, ax = build_figure(scene, dpi=OUTPUT_DPI)
+    draw_clearance_zones(ax, audit)
+    metrics.observe_stage('draw', draw_start)
+    return encode_figure(fig)
+
+
+# 差异高亮的颜色
+CHANGE_COLORS = {'added': 'limegreen', 'removed': 'red', 'moved': 'darkorange'}
+
+
+def item_key(family, item):
+    """构件在场景中的唯一键: (类别, id, instance)，编辑会话、差异高亮和净空检查共用"""
+    return (family, str(item.get('id')), item.get('instance', 0))
+
+
+def scene_item_lookup(scene, family):
+    """{(str(id), instance): 构件下标}"""
+    return {item_key(family, item)[1:]: index for index, item in enumerate(scene[family])}
+
+
+def draw_changes(ax, before, after, changes):
+    """
+    在新版本平面图上高亮差异（见 bimdiff.diff_documents）：
+    新增和移动后的房间、构件画实线轮廓，删除的和移动前的画虚线轮廓，移动前后的中心用细线相连
+    """
+    solid = {kind: [] for kind in CHANGE_COLORS}
+    dashed = {kind: [] for kind in CHANGE_COLORS}
+    links = []
+
+    rooms_before = {str(room['SpaceId']): room['coordinates'] for room in before['rooms']}
+    rooms_after = {str(room['SpaceId']): room['coordinates'] for room in after['rooms']}
+    for kind, target, rooms in (('added', solid, rooms_after), ('moved', solid, rooms_after),
+                                ('removed', dashed, rooms_before), ('moved', dashed, rooms_before)):
+        target[kind] += [rooms[space_id] for space_id in changes['rooms'][kind] if space_id in rooms]
+
+    for family in ('hydropower', 'hard', 'parametric'):
+        boxes_before, boxes_after = scene_item_boxes(before, family), scene_item_boxes(after, family)
+        index_before, index_after = scene_item_lookup(before, family), scene_item_lookup(after, family)
+        for kind in CHANGE_COLORS:
+            for change in changes['devices'][kind]:
+                if change['family'] != family:
+                    continue
+                key = (change['id'], change['instance'])
+                if kind != 'removed' and key in index_after:
+                    solid[kind].append(boxes_after['corners'][index_after[key]])
+                if kind != 'added' and key in index_before:
+                    dashed[kind].append(boxes_before['corners'][index_before[key]])
+                if kind == 'moved' and key in index_before and key in index_after:
+                    links.append((boxes_before['center'][index_before[key]], boxes_after['center'][index_after[key]]))
+
+    for kind, color in CHANGE_COLORS.items():
+        for polygons, linestyle in ((solid[kind], '-'), (dashed[kind], '--')):
+            if polygons:
+                ax.add_collection(PolyCollection(polygons, facecolors='none', edgecolors=color,
+                                                 linewidths=2.5, linestyles=linestyle, zorder=4), autolim=False)
+    if links:
+        ax.add_collection(LineCollection(links, colors=CHANGE_COLORS['moved'], linewidths=1, zorder=4),
+                          autolim=False)
+
+
+def plot_changes(before, after, changes):
+    """绘制新版本平面图并高亮两个版本的差异，返回base64编码的PNG"""
+    draw_start = time.perf_counter()
+    fig, ax = build_figure(after, dpi=OUTPUT_DPI)
+    draw_changes(ax, before, after, changes)
+    metrics.observe_stage('draw', draw_start)
+    return encode_figure(fig)
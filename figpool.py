@@ -0,0 +1,93 @@
+import os
+import threading
+import weakref
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from matplotlib.ticker import FuncFormatter
+
+# 每个worker进程内的 Figure 池：Figure/Axes 和固定装饰（网格、标题、坐标轴标签、Y轴刻度格式）只创建一次，
+# 请求借出后绘制数据图形，编码完成后归还，归还时只移除数据图形（房间、构件、标注、图例等）。
+# 直接使用面向对象的 Figure API，不经过 pyplot 的全局图形管理器，多个线程各自借出的 Figure 互不影响。
+# 借出后不归还的 Figure（如编辑会话长期持有的）由调用方自行管理，池会按需新建。
+
+# 池中最多保留的空闲 Figure 数
+FIGPOOL_SIZE = int(os.environ.get('FLOORPLAN_FIGPOOL_SIZE', 4))
+
+_idle = []
+_members = weakref.WeakSet()  # 由池创建的 Figure
+_lock = threading.Lock()
+
+
+def new_figure(figsize):
+    """新建使用 Agg 画布的 Figure（不注册到 pyplot）"""
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def _decorate(ax):
+    ax.grid(True, linestyle='--', alpha=0.7)
+    ax.set_title('平面图', fontsize=14)
+    ax.set_xlabel('X坐标（cm）', fontsize=12)
+    ax.set_ylabel('Y坐标（cm）', fontsize=12)
+    # 反转Y轴标签
+    ax.yaxis.set_major_formatter(FuncFormatter(lambda ytick, pos: f'{-ytick}'))
+
+
+def _create(figsize):
+    fig = new_figure(figsize)
+    ax = fig.add_subplot()
+    _decorate(ax)
+    # 新建时的边距和分辨率，归还时恢复（tight_layout 会修改边距，会话会修改分辨率）
+    pars = fig.subplotpars
+    fig.floorplan_defaults = {
+        'subplotpars': dict(left=pars.left, right=pars.right, bottom=pars.bottom, top=pars.top,
+                            wspace=pars.wspace, hspace=pars.hspace),
+        'dpi': fig.dpi,
+    }
+    _members.add(fig)
+    return fig, ax
+
+
+def acquire(figsize):
+    """借出一个已装饰好的 (fig, ax)，没有空闲的同尺寸 Figure 时新建"""
+    with _lock:
+        for n, (fig, ax) in enumerate(_idle):
+            if tuple(fig.get_size_inches()) == tuple(figsize):
+                return _idle.pop(n)
+    return _create(figsize)
+
+
+def _reset(fig, ax):
+    """移除数据图形，坐标区域位置、范围和分辨率恢复为新建时的状态"""
+    for artist in (*ax.patches, *ax.collections, *ax.lines, *ax.texts, *ax.images, *ax.artists, *ax.tables):
+        artist.remove()
+    legend = ax.get_legend()
+    if legend is not None:
+        legend.remove()
+    ax.containers.clear()
+    ax.relim()
+    ax.set_aspect('auto', adjustable='box')
+    ax.set_xlim(0, 1)
+    ax.set_ylim(0, 1)
+    ax.set_autoscale_on(True)
+    fig.subplots_adjust(**fig.floorplan_defaults['subplotpars'])
+    fig.set_dpi(fig.floorplan_defaults['dpi'])
+
+
+def release(fig):
+    """
+    归还 Figure；池已满或不是池创建的 Figure 时直接丢弃
+    归还后调用方不能再使用该 Figure
+    """
+    if fig not in _members:
+        return
+    ax = fig.axes[0]
+    with _lock:
+        if len(_idle) >= FIGPOOL_SIZE:
+            return
+    _reset(fig, ax)
+    with _lock:
+        if len(_idle) < FIGPOOL_SIZE:
+            _idle.append((fig, ax))
@@ -0,0 +1,95 @@
+import json
+
+import numpy as np
+
+import draw
+import geometry
+import metrics
+
+# 场景导出为 GeoJSON（FeatureCollection），供客户端自行绘制：
+# 房间为多边形，三类构件为旋转后的矩形轮廓，属性中带模型目录信息。
+# 坐标为BimJson坐标系（Y轴不取反），单位cm；外环按 RFC 7946 统一为逆时针、首尾闭合。
+
+# 坐标保留的小数位数
+DEFAULT_PRECISION = 1
+# 导出到构件属性中的字段（存在时才导出）
+ITEM_PROPERTIES = ('name', 'label', 'pointUse', 'sysObjName', 'classifyName', 'length', 'width', 'height')
+
+
+def parse_precision(value):
+    """解析请求中的 precision 参数（0~6 的整数），为空时返回默认值；非法时抛出 ValueError"""
+    if value is None:
+        return DEFAULT_PRECISION
+    try:
+        precision = int(value)
+    except (TypeError, ValueError):
+        raise ValueError("precision 应为 0~6 的整数")
+    if not 0 <= precision <= 6:
+        raise ValueError("precision 应为 0~6 的整数")
+    return precision
+
+
+def room_features(scene, precision=DEFAULT_PRECISION):
+    """房间多边形要素，属性含 SpaceId、Name 和面积（m²）"""
+    polygons = scene['room_coordinates']
+    if not polygons:
+        return []
+    # 绘图坐标Y轴取反后环的方向随之反转，按取反后的有向面积统一为逆时针
+    packed = geometry.pack_polygons(polygons)
+    clockwise = geometry.signed_areas(*packed) > 0
+    features = []
+    for room, coordinates, area, reverse in zip(scene['rooms'], polygons, scene['room_stats']['area'], clockwise):
+        ring = np.round(np.asarray(coordinates, dtype=float) * (1, -1), precision)
+        if reverse:
+            ring = ring[::-1]
+        ring = ring.tolist()
+        features.append({
+            'type': 'Feature',
+            'geometry': {'type': 'Polygon', 'coordinates': [ring + ring[:1]]},
+            'properties': {
+                'kind': 'room',
+                'SpaceId': room['SpaceId'],
+                'Name': room['Name'],
+                'area_m2': round(float(area) / 10000, 4),
+            },
+        })
+    return features
+
+
+def item_features(scene, family, precision=DEFAULT_PRECISION):
+    """一类构件的矩形轮廓要素，属性含类别、id、instance、旋转角度和模型目录信息"""
+    items = scene[family]
+    if not items:
+        return []
+    corners = draw.scene_item_boxes(scene, family)['corners']
+    # 角点在绘图坐标下为逆时针，Y轴取反后倒序即为逆时针，再补上首点闭合
+    rings = np.round(corners[:, [0, 3, 2, 1, 0]] * (1, -1), precision).tolist()
+    features = []
+    for item, ring in zip(items, rings):
+        properties = {
+            'kind': family,
+            'id': item.get('id'),
+            'instance': item.get('instance', 0),
+            'rotation': item['angle'],
+        }
+        properties.update((key, item[key]) for key in ITEM_PROPERTIES if item.get(key) is not None)
+        features.append({
+            'type': 'Feature',
+            'geometry': {'type': 'Polygon', 'coordinates': [ring]},
+            'properties': properties,
+        })
+    return features
+
+
+def scene_to_geojson(scene, precision=DEFAULT_PRECISION):
+    """把场景导出为 GeoJSON FeatureCollection（字典）"""
+    with metrics.stage('geojson'):
+        features = room_features(scene, precision)
+        for family in ('hydropower', 'hard', 'parametric'):
+            features += item_features(scene, family, precision)
+    return {'type': 'FeatureCollection', 'properties': {'unit': 'cm'}, 'features': features}
+
+
+def dumps(collection):
+    """紧凑的JSON文本（不含空格，保留中文）"""
+    return json.dumps(collection, ensure_ascii=False, separators=(',', ':'))
@@ -0,0 +1,438 @@
+import os
+
+import numpy as np
+
+# 房间多边形的批量几何计算：所有多边形拼接成一个顶点数组，
+# 按所属多边形分组做向量化计算，不逐个房间循环
+
+# 判断相邻两边共线时允许的夹角正弦值
+COLLINEAR_TOLERANCE = 1e-3
+# 长度小于该值（cm）的边视为重复顶点
+MIN_EDGE_LENGTH = 1e-6
+# 构建墙体图时，坐标相差不超过该值（cm）的顶点视为同一点
+SNAP_TOLERANCE = 0.5
+# 墙体最大厚度（cm）：两个房间相对的边界间距不超过该值时视为同一面墙的两侧
+MAX_WALL_THICKNESS = float(os.environ.get('FLOORPLAN_MAX_WALL_THICKNESS', 30))
+
+
+def pack_polygons(polygons):
+    """
+    把多边形列表拼成一个顶点数组
+    返回: (顶点 (N, 2), 所属多边形下标 (N,), 各多边形起始下标 (M,), 各多边形顶点数 (M,))
+    """
+    counts = np.array([len(polygon) for polygon in polygons], dtype=int)
+    points = np.array([point for polygon in polygons for point in polygon], dtype=float).reshape(-1, 2)
+    owners = np.repeat(np.arange(len(polygons)), counts)
+    return points, owners, np.cumsum(counts) - counts, counts
+
+
+def _repack(points, owners, polygon_count):
+    counts = np.bincount(owners, minlength=polygon_count)
+    return points, owners, np.cumsum(counts) - counts, counts
+
+
+def next_indices(owners, starts, counts):
+    """每个顶点在所属多边形中的下一个顶点下标（首尾相接）"""
+    index = np.arange(len(owners))
+    last = starts[owners] + counts[owners] - 1
+    return np.where(index == last, starts[owners], index + 1)
+
+
+def previous_indices(owners, starts, counts):
+    """每个顶点在所属多边形中的上一个顶点下标（首尾相接）"""
+    index = np.arange(len(owners))
+    return np.where(index == starts[owners], starts[owners] + counts[owners] - 1, index - 1)
+
+
+def simplify_polygons(points, owners, starts, counts):
+    """去掉重复顶点和共线边中间的顶点，相邻的共线墙段合并为一段"""
+    polygon_count = len(counts)
+    following = points[next_indices(owners, starts, counts)]
+    keep = np.hypot(*(following - points).T) > MIN_EDGE_LENGTH
+    points, owners, starts, counts = _repack(points[keep], owners[keep], polygon_count)
+
+    incoming = points - points[previous_indices(owners, starts, counts)]
+    outgoing = points[next_indices(owners, starts, counts)] - points
+    cross = incoming[:, 0] * outgoing[:, 1] - incoming[:, 1] * outgoing[:, 0]
+    dot = (incoming * outgoing).sum(axis=1)
+    norms = np.hypot(*incoming.T) * np.hypot(*outgoing.T)
+    collinear = (np.abs(cross) <= COLLINEAR_TOLERANCE * norms) & (dot > 0)
+    return _repack(points[~collinear], owners[~collinear], polygon_count)
+
+
+def signed_areas(points, owners, starts, counts):
+    """各多边形的有向面积（鞋带公式），逆时针为正"""
+    following = points[next_indices(owners, starts, counts)]
+    cross = points[:, 0] * following[:, 1] - following[:, 0] * points[:, 1]
+    return np.bincount(owners, weights=cross, minlength=len(counts)) / 2
+
+
+def wall_segments(polygons):
+    """
+    合并共线边后的所有墙段
+    返回: {'starts', 'ends': (K, 2) 端点, 'lengths': (K,), 'owners': (K,) 所属多边形下标,
+           'normals': (K, 2) 指向多边形内部的单位法向量}
+    """
+    packed = simplify_polygons(*pack_polygons(polygons))
+    points, owners, starts, counts = packed
+    ends = points[next_indices(owners, starts, counts)]
+    vectors = ends - points
+    lengths = np.hypot(*vectors.T)
+    # 逆时针多边形的内侧在边的左边，顺时针则相反
+    orientation = np.sign(signed_areas(*packed))[owners]
+    normals = np.column_stack([-vectors[:, 1], vectors[:, 0]]) / np.where(lengths == 0, 1, lengths)[:, None]
+    return {
+        'starts': points,
+        'ends': ends,
+        'lengths': lengths,
+        'owners': owners,
+        'normals': normals * orientation[:, None],
+    }
+
+
+def snap_values(values, tolerance=SNAP_TOLERANCE):
+    """
+    一维坐标吸附：排序后相邻差值不超过 tolerance 的坐标归为一簇（链式），
+    每簇取出现次数最多的原始值，坐标一致的常见情况下不改变坐标
+    """
+    if not len(values):
+        return values
+    order = np.argsort(values, kind='stable')
+    ordered = values[order]
+    clusters = np.concatenate([[0], np.cumsum(np.diff(ordered) > tolerance)])
+    unique, first, counts = np.unique(ordered, return_index=True, return_counts=True)
+    unique_clusters = clusters[first]
+    # 每簇按出现次数从多到少排在最前的值
+    ranked = np.lexsort((-counts, unique_clusters))
+    leaders = ranked[np.concatenate([[True], np.diff(unique_clusters[ranked]) != 0])]
+    snapped = np.empty_like(values)
+    snapped[order] = unique[leaders][clusters]
+    return snapped
+
+
+def _unique_rows(rows):
+    """
+    二维数组中不重复的行（按列字典序）及每行在其中的下标，同 np.unique(rows, axis=0, return_inverse=True)
+    np.unique 按行去重时以结构化类型排序，行数多时明显更慢，这里改用 lexsort
+    """
+    order = np.lexsort(rows.T[::-1])
+    ordered = rows[order]
+    first = np.concatenate([[True], (ordered[1:] != ordered[:-1]).any(axis=1)])[:len(rows)]
+    inverse = np.empty(len(rows), dtype=int)
+    inverse[order] = np.cumsum(first) - 1
+    return ordered[first], inverse
+
+
+def _covering_room(query_lines, query_values, lines, lo, hi, rooms):
+    """
+    各查询点（直线编号, 直线方向上的参数）处覆盖它的边所属的房间，没有为 -1；多条边覆盖时取延伸最远的
+    扫描：边按起点、查询点按位置排进同一序列（按直线分段），逐个累计已开始的边中终点最远的一条
+    """
+    edges = np.flatnonzero(rooms >= 0)
+    if not len(edges) or not len(query_lines):
+        return np.full(len(query_lines), -1)
+    # 编码 = 直线编号 * stride + 终点排名 + 1，先按直线、再按终点比较，累计最大值即为同一直线上终点最远的边
+    by_hi = np.argsort(hi[edges], kind='stable')
+    ranks = np.empty(len(edges), dtype=np.int64)
+    ranks[by_hi] = np.arange(len(edges))
+    stride = len(edges) + 1
+    codes = np.concatenate([lines[edges] * stride + ranks + 1, np.zeros(len(query_lines), dtype=np.int64)])
+    event_lines = np.concatenate([lines[edges], query_lines])
+    event_values = np.concatenate([lo[edges], query_values])
+    # 同一位置上边排在查询点之前
+    kinds = np.concatenate([np.zeros(len(edges)), np.ones(len(query_lines))])
+    order = np.lexsort((kinds, event_values, event_lines))
+    running = np.empty_like(codes)
+    running[order] = np.maximum.accumulate(codes[order])
+    query_codes = running[len(edges):]
+    edge = edges[by_hi[np.maximum(query_codes % stride - 1, 0)]]
+    hit = (query_codes > 0) & (query_codes // stride == query_lines) & (hi[edge] > query_values)
+    return np.where(hit, rooms[edge], -1)
+
+
+def _segment_lines(lines, lo, hi, plus, minus):
+    """
+    各直线上的边在所有端点处拆分为基本区间，同一直线上相邻且两侧房间相同的区间合并为一段墙
+    lines: 各边所在直线编号；lo, hi: 各边在直线方向上的投影区间；plus, minus: 各边在法向正侧 / 负侧的房间（没有为 -1）
+    返回: (直线编号, 起点参数, 终点参数, 正侧房间, 负侧房间)，均为数组
+    """
+    if not len(lines):
+        empty = np.zeros(0)
+        return np.zeros(0, dtype=int), empty, empty, np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+    bound_lines, bound_values = np.concatenate([lines, lines]), np.concatenate([lo, hi])
+    order = np.lexsort((bound_values, bound_lines))
+    bound_lines, bound_values = bound_lines[order], bound_values[order]
+    distinct = np.concatenate([[True], (np.diff(bound_lines) != 0) | (np.diff(bound_values) != 0)])
+    bound_lines, bound_values = bound_lines[distinct], bound_values[distinct]
+    # 同一直线上相邻两个端点之间为一个基本区间
+    inner = np.flatnonzero(bound_lines[1:] == bound_lines[:-1])
+    interval_lines, begin, end = bound_lines[inner], bound_values[inner], bound_values[inner + 1]
+    middles = (begin + end) / 2
+    plus_room = _covering_room(interval_lines, middles, lines, lo, hi, plus)
+    minus_room = _covering_room(interval_lines, middles, lines, lo, hi, minus)
+    # 被覆盖的区间中，与前一个（后一个）区间不相接或两侧房间不同的是一段墙的起点（终点）
+    covered = (plus_room >= 0) | (minus_room >= 0)
+    same = (covered[1:] & covered[:-1] & (interval_lines[1:] == interval_lines[:-1]) &
+            (end[:-1] == begin[1:]) & (plus_room[1:] == plus_room[:-1]) & (minus_room[1:] == minus_room[:-1]))
+    first = np.flatnonzero(covered & ~np.concatenate([[False], same]))
+    last = np.flatnonzero(covered & ~np.concatenate([same, [False]]))
+    return interval_lines[first], begin[first], end[last], plus_room[first], minus_room[first]
+
+
+def _pair_faces(angles, offsets, lo, hi, plus, minus, thickness):
+    """
+    墙两侧的房间边界配对：方向相同、房间分别在两侧且背向对方（之间是墙体）、间距不超过 thickness、投影重叠
+    angles: 各边界的方向编号；offsets: 法向偏移；lo, hi: 投影区间；plus, minus: 法向正侧 / 负侧的房间
+    返回: (负侧边界下标, 正侧边界下标, 间距, 重叠起点, 重叠终点)，均为数组
+    """
+    # 房间在正侧的边界，墙体在其负侧；反之亦然
+    upper = np.flatnonzero((plus >= 0) & (minus < 0))
+    lower = np.flatnonzero((minus >= 0) & (plus < 0))
+    if not len(upper) or not len(lower) or thickness <= 0:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int), np.zeros(0), np.zeros(0), np.zeros(0)
+    # 方向编号和法向偏移组合为一维有序键，不同方向之间留出大于 thickness 的间隔，
+    # 每条负侧边界在正侧边界中二分查找偏移在 (o, o + thickness] 内的候选
+    base = offsets.min()
+    span = offsets.max() - base + 2 * thickness + 1
+    keys = np.unique(angles, return_inverse=True)[1] * span + (offsets - base)
+    order = upper[np.argsort(keys[upper], kind='stable')]
+    first = np.searchsorted(keys[order], keys[lower], side='right')
+    counts = np.searchsorted(keys[order], keys[lower] + thickness, side='right') - first
+    below = np.repeat(lower, counts)
+    above = order[np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(first, counts)]
+
+    gaps = offsets[above] - offsets[below]
+    overlap_lo, overlap_hi = np.maximum(lo[below], lo[above]), np.minimum(hi[below], hi[above])
+    keep = ((angles[above] == angles[below]) & (gaps > 0) & (gaps <= thickness) &
+            (overlap_hi - overlap_lo > MIN_EDGE_LENGTH) & (plus[above] != minus[below]))
+    return below[keep], above[keep], gaps[keep], overlap_lo[keep], overlap_hi[keep]
+
+
+def _assign_pairs(lo, hi, below, above, gaps, overlap_lo, overlap_hi):
+    """
+    各边界在配对重叠区间的端点处拆分，每段取覆盖它且间距最小的配对
+    返回: (边界下标, 起点参数, 终点参数, 配对下标，没有配对为 -1)，均为数组
+    """
+    face_count, pair_count = len(lo), len(gaps)
+    bound_faces = np.concatenate([np.arange(face_count), np.arange(face_count), below, below, above, above])
+    bound_values = np.concatenate([lo, hi, overlap_lo, overlap_hi, overlap_lo, overlap_hi])
+    order = np.lexsort((bound_values, bound_faces))
+    bound_faces, bound_values = bound_faces[order], bound_values[order]
+    distinct = np.concatenate([[True], (np.diff(bound_faces) != 0) | (np.diff(bound_values) != 0)])[:len(order)]
+    bound_faces, bound_values = bound_faces[distinct], bound_values[distinct]
+    inner = np.flatnonzero(bound_faces[1:] == bound_faces[:-1])
+    faces, begin, end = bound_faces[inner], bound_values[inner], bound_values[inner + 1]
+    middles = (begin + end) / 2
+
+    # 候选：区间所在边界参与的所有配对
+    pair_faces = np.concatenate([below, above])
+    pair_ids = np.concatenate([np.arange(pair_count), np.arange(pair_count)])
+    by_face = np.argsort(pair_faces, kind='stable')
+    pair_faces, pair_ids = pair_faces[by_face], pair_ids[by_face]
+    first = np.searchsorted(pair_faces, faces, side='left')
+    counts = np.searchsorted(pair_faces, faces, side='right') - first
+    intervals = np.repeat(np.arange(len(faces)), counts)
+    candidates = pair_ids[np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) +
+                          np.repeat(first, counts)]
+    covering = (overlap_lo[candidates] < middles[intervals]) & (overlap_hi[candidates] > middles[intervals])
+    intervals, candidates = intervals[covering], candidates[covering]
+    nearest = np.lexsort((gaps[candidates], intervals))
+    leading = nearest[np.concatenate([[True], np.diff(intervals[nearest]) != 0])[:len(nearest)]]
+    assigned = np.full(len(faces), -1)
+    assigned[intervals[leading]] = candidates[leading]
+    return faces, begin, end, assigned
+
+
+def _line_frames(lines, directions, normals, offsets):
+    """
+    各直线的方向、法向取其中一条边的，法向偏移取各边的平均值
+    lines: 各边所在直线编号；返回按直线编号索引的 (方向, 法向, 偏移)
+    """
+    count = lines.max() + 1 if len(lines) else 0
+    representative = np.zeros(count, dtype=int)
+    representative[lines[::-1]] = np.arange(len(lines))[::-1]
+    line_offsets = np.bincount(lines, weights=offsets, minlength=count) / \
+        np.maximum(np.bincount(lines, minlength=count), 1)
+    return directions[representative], normals[representative], line_offsets
+
+
+def _place_segments(lines, begin, end, plus_room, minus_room, frames):
+    """直线参数表示的墙段换算为端点，返回 (起点, 终点, 两侧房间 [法向所指一侧, 另一侧], 法向)"""
+    line_directions, line_normals, line_offsets = (values[lines] for values in frames)
+    # 加0.0把 -0.0 归一为 0.0，否则同一顶点在去重后的输出中显示不一致
+    starts = line_normals * line_offsets[:, None] + line_directions * begin[:, None] + 0.0
+    ends = line_normals * line_offsets[:, None] + line_directions * end[:, None] + 0.0
+    # 正侧有房间时法向指向正侧的房间，否则指向负侧的房间
+    has_plus = plus_room >= 0
+    rooms = np.column_stack([np.where(has_plus, plus_room, minus_room), np.where(has_plus, minus_room, -1)])
+    return starts, ends, rooms.reshape(-1, 2), np.where(has_plus[:, None], line_normals, -line_normals)
+
+
+def wall_graph(polygons, tolerance=SNAP_TOLERANCE, thickness=MAX_WALL_THICKNESS):
+    """
+    由房间多边形构建去重后的墙体图：
+    1. 顶点坐标按轴吸附（snap_values），相邻房间本应重合的墙对齐到同一条直线
+    2. 去掉重复顶点、合并多边形内的共线边（simplify_polygons）
+    3. 所有房间的边按所在直线分组，同一直线上重叠的边拆分合并为房间边界，重合的边界只保留一段
+    4. 墙体两侧相对的房间边界（间距不超过 thickness）配对，重叠部分合并为两者中间的一段中心线墙，
+       没有配对的部分仍为单侧的墙
+    返回: {'starts', 'ends': (K, 2) 端点, 'lengths': (K,),
+           'rooms': (K, 2) 墙两侧的房间下标 [法向所指一侧, 另一侧]，外墙另一侧为 -1,
+           'owners': (K,) 即 rooms[:, 0], 'normals': (K, 2) 指向 rooms[:, 0] 内部的单位法向量,
+           'thickness': (K,) 配对的两侧边界间距，未配对为 0,
+           'shared': (K,) 是否为两个房间的共用墙,
+           'vertices': (V, 2) 墙体图顶点, 'edges': (K, 2) 每段墙两端的顶点下标,
+           'adjacency': (P, 2) 相邻房间下标对（小的在前）, 'adjacency_lengths': (P,) 共用墙总长,
+           'faces': 房间边界（墙体表面），{'starts', 'ends', 'lengths', 'rooms', 'owners'} 含义同上，
+                    轮廓绘制、距离线和净空检查按房间内侧表面计算}
+    """
+    points, owners, starts, counts = pack_polygons(polygons)
+    points = np.column_stack([snap_values(points[:, 0], tolerance), snap_values(points[:, 1], tolerance)])
+    packed = simplify_polygons(points, owners, starts, counts)
+    points, owners, starts, counts = packed
+    ends = points[next_indices(owners, starts, counts)]
+    vectors = ends - points
+    lengths = np.hypot(*vectors.T)
+    # 逆时针多边形的内侧在边的左边，顺时针则相反
+    orientation = np.sign(signed_areas(*packed))[owners]
+    inward = np.column_stack([-vectors[:, 1], vectors[:, 0]]) * orientation[:, None]
+
+    # 所在直线：方向统一为 x 分量为正（竖直时 y 为正），法向为方向逆时针旋转90度，按角度和法向偏移分组
+    directions = vectors / np.where(lengths == 0, 1, lengths)[:, None]
+    flip = (directions[:, 0] < 0) | ((directions[:, 0] == 0) & (directions[:, 1] < 0))
+    directions[flip] *= -1
+    normals = np.column_stack([-directions[:, 1], directions[:, 0]])
+    offsets = (points * normals).sum(axis=1)
+    angles = np.round(np.arctan2(directions[:, 1], directions[:, 0]) / COLLINEAR_TOLERANCE)
+
+    a, b = (points * directions).sum(axis=1), (ends * directions).sum(axis=1)
+    lo, hi = np.minimum(a, b), np.maximum(a, b)
+    # 房间在边所在直线法向的正侧还是负侧
+    plus_side = (inward * normals).sum(axis=1) > 0
+    plus = np.where(plus_side, owners, -1)
+    minus = np.where(plus_side, -1, owners)
+
+    valid = lengths > MIN_EDGE_LENGTH
+    directions, normals, offsets, angles = directions[valid], normals[valid], offsets[valid], angles[valid]
+    line_keys, lines = _unique_rows(np.column_stack([angles, np.round(offsets / tolerance)]))
+    face_lines, face_lo, face_hi, face_plus, face_minus = _segment_lines(
+        lines, lo[valid], hi[valid], plus[valid], minus[valid])
+    frames = _line_frames(lines, directions, normals, offsets)
+    face_starts, face_ends, face_rooms, _ = _place_segments(
+        face_lines, face_lo, face_hi, face_plus, face_minus, frames)
+    face_directions, face_normals, face_offsets = (values[face_lines] for values in frames)
+    face_angles = line_keys[face_lines, 0]
+
+    # 配对部分移到两侧边界中间的中心线上，再按直线拆分合并，两侧的房间落在中心线的两侧
+    below, above, gaps, overlap_lo, overlap_hi = _pair_faces(
+        face_angles, face_offsets, face_lo, face_hi, face_plus, face_minus, thickness)
+    pieces, begin, end, assigned = _assign_pairs(face_lo, face_hi, below, above, gaps, overlap_lo, overlap_hi)
+    # 末尾补一项，未配对（-1）时取到 0
+    centers = np.append((face_offsets[below] + face_offsets[above]) / 2, 0.0)
+    piece_offsets = np.where(assigned >= 0, centers[assigned], face_offsets[pieces])
+    piece_gaps = np.append(gaps, 0.0)[assigned]
+    piece_lines = _unique_rows(np.column_stack([face_angles[pieces], np.round(piece_offsets / tolerance)]))[1]
+    members, begin, end, plus_room, minus_room = _segment_lines(
+        piece_lines, begin, end, face_plus[pieces], face_minus[pieces])
+    frames = _line_frames(piece_lines, face_directions[pieces], face_normals[pieces], piece_offsets)
+    line_gaps = np.zeros(len(frames[2]))
+    np.maximum.at(line_gaps, piece_lines, piece_gaps)
+    wall_starts, wall_ends, wall_rooms, wall_normals = _place_segments(
+        members, begin, end, plus_room, minus_room, frames)
+    wall_lengths = np.hypot(*(wall_ends - wall_starts).T)
+
+    vertices, edges = _unique_rows(np.concatenate([wall_starts, wall_ends]).reshape(-1, 2))
+    edges = edges.reshape(2, -1).T
+    shared = wall_rooms[:, 1] >= 0
+    pairs = np.sort(wall_rooms[shared], axis=1).reshape(-1, 2)
+    adjacency, pair_index = _unique_rows(pairs)
+    adjacency_lengths = np.bincount(pair_index, weights=wall_lengths[shared], minlength=len(adjacency))
+    return {
+        'starts': wall_starts.reshape(-1, 2),
+        'ends': wall_ends.reshape(-1, 2),
+        'lengths': wall_lengths,
+        'rooms': wall_rooms,
+        'owners': wall_rooms[:, 0],
+        'normals': wall_normals.reshape(-1, 2),
+        'thickness': line_gaps[members],
+        'shared': shared,
+        'vertices': vertices,
+        'edges': edges,
+        'adjacency': adjacency.astype(int).reshape(-1, 2),
+        'adjacency_lengths': adjacency_lengths,
+        'faces': {
+            'starts': face_starts.reshape(-1, 2),
+            'ends': face_ends.reshape(-1, 2),
+            'lengths': np.hypot(*(face_ends - face_starts).reshape(-1, 2).T),
+            'rooms': face_rooms,
+            'owners': face_rooms[:, 0],
+        },
+    }
+
+
+def room_stats(polygons):
+    """
+    各多边形的面积、周长、面积加权质心和包围盒，一次向量化计算
+    面积为0的多边形质心取顶点平均值
+    返回: {'area': (M,), 'perimeter': (M,), 'centroid': (M, 2), 'bbox': (M, 4) [xmin, ymin, xmax, ymax]}
+    """
+    points, owners, starts, counts = pack_polygons(polygons)
+    if not len(points):
+        return {'area': np.zeros(0), 'perimeter': np.zeros(0), 'centroid': np.zeros((0, 2)),
+                'bbox': np.zeros((0, 4))}
+    following = points[next_indices(owners, starts, counts)]
+    polygon_count = len(counts)
+    cross = points[:, 0] * following[:, 1] - following[:, 0] * points[:, 1]
+    signed = np.bincount(owners, weights=cross, minlength=polygon_count) / 2
+    perimeter = np.bincount(owners, weights=np.hypot(*(following - points).T), minlength=polygon_count)
+
+    mean = np.column_stack([np.bincount(owners, weights=points[:, k], minlength=polygon_count) for k in (0, 1)])
+    mean /= np.maximum(counts, 1)[:, None]
+    weighted = np.column_stack([
+        np.bincount(owners, weights=(points[:, k] + following[:, k]) * cross, minlength=polygon_count)
+        for k in (0, 1)])
+    degenerate = np.abs(signed) < 1e-9
+    centroid = np.where(degenerate[:, None], mean,
+                        weighted / (6 * np.where(degenerate, 1, signed))[:, None])
+
+    bbox = np.column_stack([np.minimum.reduceat(points[:, 0], starts), np.minimum.reduceat(points[:, 1], starts),
+                            np.maximum.reduceat(points[:, 0], starts), np.maximum.reduceat(points[:, 1], starts)])
+    return {'area': np.abs(signed), 'perimeter': perimeter, 'centroid': centroid, 'bbox': bbox}
+
+
+def oriented_boxes(x, y, length, width, angle, unit_scale=1.0, scale_x=None, scale_y=None, endpoint=False):
+    """
+    由位置、旋转、尺寸和翻转批量计算构件在绘图坐标下的有向矩形
+    x, y: 位置（cm）；length, width: 尺寸（毫米，按 unit_scale 换算）；angle: rotation 中的Y值（度）
+    endpoint: False 时位置为矩形中心，长度方向角度为 angle；
+              True 时为参数化模型：位置为端点，长度方向角度为 270 - angle，矩形从端点沿长度、宽度方向展开；
+              scale_y < 0 时翻到端点在长度方向的另一侧，scale_x < 0 时翻到宽度方向的另一侧，两者可叠加
+    返回: {'corners': (N, 4, 2) 四个角点（从起点沿长度、再沿宽度方向）, 'center': (N, 2),
+           'axes': (N, 2, 2) 长度方向和宽度方向单位向量, 'size': (N, 2) 长宽（cm）, 'angle': (N,) 长度方向角度}
+    """
+    x, y, angle = (np.asarray(v, dtype=float).reshape(-1) for v in (x, y, angle))
+    lengths = np.abs(np.asarray(length, dtype=float).reshape(-1)) * unit_scale
+    widths = np.abs(np.asarray(width, dtype=float).reshape(-1)) * unit_scale
+
+    draw_angle = (270 - angle) % 360 if endpoint else angle
+    radians = np.radians(draw_angle)
+    axis_u = np.column_stack([np.cos(radians), np.sin(radians)])
+    axis_v = np.column_stack([-axis_u[:, 1], axis_u[:, 0]])
+    along, across = axis_u * lengths[:, None], axis_v * widths[:, None]
+
+    origin = np.column_stack([x, y])
+    if endpoint:
+        flip_x = np.asarray(scale_x if scale_x is not None else np.ones_like(x), dtype=float).reshape(-1) < 0
+        flip_y = np.asarray(scale_y if scale_y is not None else np.ones_like(x), dtype=float).reshape(-1) < 0
+        origin = origin - flip_y[:, None] * along - flip_x[:, None] * across
+    else:
+        origin = origin - along / 2 - across / 2
+
+    corners = np.stack([origin, origin + along, origin + along + across, origin + across], axis=1)
+    return {
+        'corners': corners,
+        'center': origin + along / 2 + across / 2,
+        'axes': np.stack([axis_u, axis_v], axis=1),
+        'size': np.column_stack([lengths, widths]),
+        'angle': draw_angle,
+    }
@@ -0,0 +1,61 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+# Prometheus 多进程模式：各 worker 把指标写入同一目录，/metrics 汇总
+# 必须在 worker 导入 prometheus_client 之前设置
+if not os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+    os.environ['PROMETHEUS_MULTIPROC_DIR'] = os.path.join(tempfile.gettempdir(), 'floorplan-metrics')
+
+# 服务配置（环境变量）
+bind = os.environ.get('FLOORPLAN_BIND', '0.0.0.0:5000')
+# 绘图是CPU密集型，worker 数默认与CPU核数相同
+workers = int(os.environ.get('FLOORPLAN_WORKERS', multiprocessing.cpu_count()))
+# sync 每个worker同时处理一个请求；gthread 可用线程并发处理等待模型接口、BimJson下载的请求。
+# Agg 绘图持有GIL，同一worker内的多个线程不能并行绘图，只会叠加各自Figure的内存，
+# 因此默认每个worker一个线程，并发数等于worker数、内存可预估；
+# 请求大多在等待上游（模型目录命中率低）时可调大 FLOORPLAN_THREADS，内存按 线程数 × 单张图 增加
+worker_class = os.environ.get('FLOORPLAN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('FLOORPLAN_THREADS', 1))
+timeout = int(os.environ.get('FLOORPLAN_TIMEOUT', 120))
+graceful_timeout = int(os.environ.get('FLOORPLAN_GRACEFUL_TIMEOUT', 60))
+# 主进程预加载应用，见 serve.warm_up
+preload_app = True
+# 按请求数回收worker（0为不限制），加随机抖动避免同时重启
+max_requests = int(os.environ.get('FLOORPLAN_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+
+# worker 常驻内存水位线（MB），超过后处理完当前请求即平滑退出；0为不限制
+MAX_RSS_MB = float(os.environ.get('FLOORPLAN_MAX_RSS_MB', 1024))
+
+
+def on_starting(server):
+    """主进程启动时清空上一次运行遗留的指标文件"""
+    metrics_dir = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+
+
+def when_ready(server):
+    """fork worker 之前在主进程中预热"""
+    import serve
+    serve.warm_up()
+    server.log.info("预热完成，主进程内存 %.0f MB", serve.current_rss_mb())
+
+
+def post_request(worker, req, environ, resp):
+    """worker 内存超过水位线时不再接受新请求，处理完手头的请求后退出"""
+    if MAX_RSS_MB <= 0 or not worker.alive:
+        return
+    import serve
+    rss = serve.current_rss_mb()
+    if rss > MAX_RSS_MB:
+        worker.log.info("worker %s 内存 %.0f MB 超过水位线 %.0f MB，平滑重启", worker.pid, rss, MAX_RSS_MB)
+        worker.alive = False
+
+
+def child_exit(server, worker):
+    """worker 退出后标记其指标文件失效"""
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,212 @@
+import heapq
+import math
+
+import numpy as np
+from matplotlib.artist import Artist
+from matplotlib.text import Text
+
+import geometry
+import spatial
+
+# 标注放置：房间名放在多边形的极点（离边界最远的内部点），墙段尺寸放在尺寸线中点，构件名放在构件中心或四周，
+# 按优先级依次放置，与已放置的标注重叠时换下一个候选位置，都不行则不画（房间名始终绘制）。
+# 所有标注由一个 LabelLayer 批量绘制。
+
+# 各类标注的样式
+LABEL_STYLES = {
+    'room': dict(ha='center', va='center', fontweight='bold', fontsize=10,
+                 bbox=dict(facecolor='white', edgecolor='gray', pad=3, boxstyle='round,pad=0.5')),
+    'dimension': dict(ha='center', va='center', fontsize=6, color='#555555',
+                      bbox=dict(facecolor='white', edgecolor='none', pad=0.5)),
+    'device': dict(ha='center', va='center', fontsize=6, color='#333333'),
+}
+# 边框占用的额外宽高（字号的倍数）
+LABEL_PADDING = {'room': 1.0, 'dimension': 0.2, 'device': 0.0}
+# 放置优先级，数值小的先放
+LABEL_PRIORITY = {'room': 0, 'dimension': 1, 'device': 2}
+# 房间极点的求解精度（相对房间包围盒短边）
+POLE_PRECISION = 0.02
+POLE_MAX_CELLS = 2000
+
+
+def _signed_distances(xs, ys, starts, ends):
+    """一组点到多边形边界的距离，点在多边形内为正、在外为负"""
+    px, py = xs[:, None], ys[:, None]
+    ax, ay = starts[:, 0], starts[:, 1]
+    dx, dy = ends[:, 0] - ax, ends[:, 1] - ay
+    length2 = np.where(dx * dx + dy * dy == 0, 1.0, dx * dx + dy * dy)
+    t = np.clip(((px - ax) * dx + (py - ay) * dy) / length2, 0, 1)
+    distance = np.hypot(px - (ax + t * dx), py - (ay + t * dy)).min(axis=1)
+
+    # 射线法判断点是否在多边形内
+    crosses = ((ay > py) != (ends[:, 1] > py)) & (
+        px < ax + (py - ay) * dx / np.where(dy == 0, 1e-12, dy))
+    inside = crosses.sum(axis=1) % 2 == 1
+    return np.where(inside, distance, -distance)
+
+
+def pole_of_inaccessibility(coordinates, precision=None, centroid=None):
+    """
+    多边形内离边界最远的点（polylabel 网格细分算法），适合放置凹多边形的标注
+    precision: 求解精度，默认为包围盒短边的 POLE_PRECISION 倍
+    centroid: 已算好的面积加权质心（见 geometry.room_stats），作为初始最优点
+    返回: (x, y, 到边界的距离)
+    """
+    points = np.asarray(coordinates, dtype=float)
+    starts, ends = points, np.roll(points, -1, axis=0)
+    min_x, min_y = points.min(axis=0)
+    max_x, max_y = points.max(axis=0)
+    cell = min(max_x - min_x, max_y - min_y)
+    if centroid is None:
+        centroid = geometry.room_stats([points])['centroid'][0]
+    if cell <= 0:
+        return centroid[0], centroid[1], 0.0
+    if precision is None:
+        precision = cell * POLE_PRECISION
+
+    def evaluate(xs, ys, half):
+        distances = _signed_distances(np.asarray(xs, dtype=float), np.asarray(ys, dtype=float), starts, ends)
+        return [(-(d + half * math.sqrt(2)), x, y, half, d) for x, y, d in zip(xs, ys, distances)]
+
+    # 以质心作为初始最优点，用覆盖包围盒的方格作为初始候选
+    best = evaluate([centroid[0]], [centroid[1]], 0)[0]
+    grid_x, grid_y = np.meshgrid(np.arange(min_x, max_x, cell) + cell / 2, np.arange(min_y, max_y, cell) + cell / 2)
+    queue = evaluate(grid_x.ravel(), grid_y.ravel(), cell / 2)
+    heapq.heapify(queue)
+
+    evaluated = len(queue)
+    while queue and evaluated < POLE_MAX_CELLS:
+        candidate = heapq.heappop(queue)
+        if candidate[4] > best[4]:
+            best = candidate
+        # 该方格内不可能再找到明显更好的点
+        if -candidate[0] - best[4] <= precision:
+            continue
+        _, x, y, half, _ = candidate
+        quarter = half / 2
+        for child in evaluate([x - quarter, x + quarter, x - quarter, x + quarter],
+                              [y - quarter, y - quarter, y + quarter, y + quarter], quarter):
+            heapq.heappush(queue, child)
+        evaluated += 4
+    return float(best[1]), float(best[2]), float(best[4])
+
+
+def room_candidate(room, centroid=None):
+    """房间名标注的候选：极点，计算结果缓存在房间信息中"""
+    if 'label_point' not in room:
+        room['label_point'] = pole_of_inaccessibility(room['coordinates'], centroid=centroid)[:2]
+    x, y = room['label_point']
+    return {'text': room['Name'], 'kind': 'room', 'x': x, 'y': y, 'half': (0.0, 0.0), 'required': True}
+
+
+def item_candidate(text, bbox):
+    """构件名标注的候选：构件包围盒中心，放不下时依次尝试上、下、右、左"""
+    return {
+        'text': text,
+        'kind': 'device',
+        'x': (bbox[0] + bbox[2]) / 2,
+        'y': (bbox[1] + bbox[3]) / 2,
+        'half': ((bbox[2] - bbox[0]) / 2, (bbox[3] - bbox[1]) / 2),
+        'required': False,
+    }
+
+
+def dimension_candidate(text, x, y, rotation):
+    """墙段尺寸文字的候选：尺寸线中点，沿墙方向旋转"""
+    return {'text': text, 'kind': 'dimension', 'x': x, 'y': y, 'half': (0.0, 0.0),
+            'required': False, 'rotation': rotation}
+
+
+def label_size(text, kind):
+    """估算标注的宽高（磅），中日韩字符按1个字号宽，其余按0.6个字号宽"""
+    style = LABEL_STYLES[kind]
+    fontsize = style['fontsize']
+    width = sum(1.0 if ord(char) >= 0x2E80 else 0.6 for char in str(text)) * fontsize
+    height = fontsize * 1.2
+    padding = LABEL_PADDING[kind] * fontsize
+    return width + padding, height + padding
+
+
+def place_labels(candidates, units_per_point):
+    """
+    按优先级放置标注，避免相互重叠
+    units_per_point: 每磅对应的绘图坐标长度
+    返回: [(文字, x, y, 类型, 旋转角度), ...]
+    """
+    placed = []
+    spatial_hash = spatial.new_hash(40 * units_per_point)
+    for candidate in sorted(candidates, key=lambda c: LABEL_PRIORITY[c['kind']]):
+        if not candidate['text']:
+            continue
+        width, height = label_size(candidate['text'], candidate['kind'])
+        rotation = candidate.get('rotation', 0.0)
+        if rotation:
+            # 旋转后的外接矩形
+            cos_r, sin_r = abs(math.cos(math.radians(rotation))), abs(math.sin(math.radians(rotation)))
+            width, height = width * cos_r + height * sin_r, width * sin_r + height * cos_r
+        half_w, half_h = width * units_per_point / 2, height * units_per_point / 2
+        x, y = candidate['x'], candidate['y']
+        item_w, item_h = candidate['half']
+        positions = [(x, y)]
+        if item_w or item_h:
+            positions += [(x, y + item_h + half_h), (x, y - item_h - half_h),
+                          (x + item_w + half_w, y), (x - item_w - half_w, y)]
+        for px, py in positions:
+            box = (px - half_w, py - half_h, px + half_w, py + half_h)
+            if not spatial.hash_collides(spatial_hash, box):
+                break
+        else:
+            if not candidate['required']:
+                continue
+            px, py = positions[0]
+            box = (px - half_w, py - half_h, px + half_w, py + half_h)
+        spatial.hash_insert(spatial_hash, box)
+        placed.append((candidate['text'], px, py, candidate['kind'], rotation))
+    return placed
+
+
+class LabelLayer(Artist):
+    """
+    批量绘制标注的图层：每种样式复用一个 Text 逐条绘制，不为每条标注创建Artist
+    候选按键（房间或构件）保存，构件移动后更新对应候选并重新 place() 即可
+    kinds: 只绘制这些类型的标注，其余候选只参与避让；为None时全部绘制
+    """
+    zorder = 3
+
+    def __init__(self, units_per_point, kinds=None):
+        super().__init__()
+        self.units_per_point = units_per_point
+        self.kinds = kinds
+        self._candidates = {}
+        self._placed = []
+
+    def set_label(self, key, candidate):
+        """设置或删除（candidate 为None）一条标注候选"""
+        if candidate is None:
+            self._candidates.pop(key, None)
+        else:
+            self._candidates[key] = candidate
+        self.stale = True
+
+    def place(self):
+        self._placed = place_labels(list(self._candidates.values()), self.units_per_point)
+        self.stale = True
+
+    def draw(self, renderer):
+        if not self.get_visible():
+            return
+        templates = {}
+        for text, x, y, kind, rotation in self._placed:
+            if self.kinds is not None and kind not in self.kinds:
+                continue
+            template = templates.get(kind)
+            if template is None:
+                template = templates[kind] = Text(0, 0, '', **LABEL_STYLES[kind])
+                template.set_figure(self.figure)
+                template.set_transform(self.axes.transData)
+                template.set_clip_box(self.axes.bbox)
+            template.set_position((x, y))
+            template.set_text(text)
+            template.set_rotation(rotation)
+            template.draw(renderer)
+        self.stale = False
@@ -1,21 +1,255 @@
-from flask import Flask, abort, send_file, jsonify, request
+from flask import Flask, Response, abort, send_file, jsonify, make_response, request, stream_with_context
 from flask_cors import CORS
+import bimdiff
 import draw
 import check
+import deadline
+import geoexport
+import metrics
+import profiling
+import rules
+import scenestore
+import sessions
+import stream
+import tiles
+from scene import build_scene, describe_rooms, parse_layers, parse_pixel_size, parse_viewport
 
 app = Flask(__name__)
 CORS(app)  # 启用跨域支持
+# 客户端可通过该请求头缩短本次请求的延迟预算（毫秒），不能超过服务端的上限
+BUDGET_HEADER = 'X-Floorplan-Budget-Ms'
+
+
+@app.before_request
+def start_deadline():
+    """每个请求开始时设定延迟预算（见 deadline）"""
+    try:
+        budget = deadline.parse_budget(request.headers.get(BUDGET_HEADER))
+    except ValueError as e:
+        abort(make_response(jsonify({'error': f'{BUDGET_HEADER}: {e}'}), 400))
+    deadline.start(budget)
+
+
+@app.after_request
+def mark_degraded(response):
+    """本次请求有降级时在响应头中列出降级标记（图片等非JSON响应也能看到）"""
+    degraded = deadline.degraded()
+    if degraded:
+        response.headers['X-Floorplan-Degraded'] = ','.join(degraded)
+    return response
+
+
+@app.errorhandler(check.BimFetchError)
+def bim_fetch_failed(e):
+    """BimJson下载失败或延迟预算用尽时返回 502 / 504，degraded 中列出降级标记（含 bim）"""
+    return jsonify({'error': str(e), 'degraded': sorted(deadline.degraded())}), e.status
+
+
+def requested_option(key, parse):
+    """用 parse 解析请求体中的 key 参数，非法时返回400"""
+    data = request.get_json(silent=True) or {}
+    try:
+        return parse(data.get(key))
+    except ValueError as e:
+        abort(make_response(jsonify({'error': str(e)}), 400))
+
+
+def requested_layers():
+    return requested_option('layers', parse_layers)
+
+
+def requested_scene(layers):
+    """请求中BimJson地址对应的场景，优先从场景存储加载（见 scenestore）"""
+    url = (request.get_json(silent=True) or {}).get('url')
+    return scenestore.get_scene(url, layers, check.get_bim_json)
+
+
+def render_floorplan(layers, viewport=None, pixel_size=None):
+    scene = requested_scene(layers)
+    # 延迟预算不足时只画轮廓并降低分辨率（见 deadline）
+    layers, dpi = deadline.render_options(scene['layers'], draw.output_dpi(pixel_size))
+    if layers != scene['layers']:
+        scene = dict(scene, layers=layers)
+    # 不额外保存 floorplan.png：并发的请求会同时写当前目录下的同一个文件
+    return draw.plot_room_with_furniture(scene, image_path=None, viewport=viewport, dpi=dpi)
+
 
 @app.route('/generate-floorplan', methods=['POST'])
 def generate_floorplan():
-    check.get_bim_json()
-    image_data= draw.plot_room_with_furniture()
+    profile_mode = profiling.requested_mode()
+    layers = requested_layers()
+    viewport = requested_option('viewport', parse_viewport)
+    pixel_size = requested_option('pixel_size', parse_pixel_size)
+    profile = None
+    with metrics.stage('total'):
+        if profile_mode:
+            image_data, profile = profiling.run(lambda: render_floorplan(layers, viewport, pixel_size), profile_mode)
+        else:
+            image_data = render_floorplan(layers, viewport, pixel_size)
     # if image_path and os.path.exists(image_path):
         # return send_file(image_path, mimetype='image/png')
+    result = {
+        'image_data': image_data,
+        'degraded': deadline.degraded(),
+    }
+    if profile is not None:
+        result['profile'] = profile
+    return jsonify(result)
+
+
+@app.route('/generate-floorplan/stream', methods=['POST'])
+def stream_floorplan():
+    """
+    渐进式平面图（text/event-stream）：先发送房间轮廓底图，再按模型查询完成的顺序发送各类构件的透明叠加层
+    消息格式见 stream.stream_floorplan
+    """
+    layers = requested_layers()
+    pixel_size = requested_option('pixel_size', parse_pixel_size)
+    bimjson = check.get_bim_json()
+    events = stream.stream_floorplan(bimjson, layers, pixel_size)
+    # 关闭反向代理缓冲，每条消息到达后立即转发
+    return Response(stream_with_context(events), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+def requested_document(key):
+    """
+    请求体中的BimJson：地址（字符串）或文档本身（对象），缺失时返回400
+    地址下载失败时返回 502 / 504，错误信息和 side 字段指明是哪一个版本
+    """
+    value = (request.get_json(silent=True) or {}).get(key)
+    if isinstance(value, dict):
+        return value
+    if isinstance(value, str) and value:
+        try:
+            return check.fetch_bim_json(value)
+        except check.BimFetchError as e:
+            abort(make_response(jsonify({'error': f'{key}: {e}', 'side': key,
+                                         'degraded': sorted(deadline.degraded())}), e.status))
+    abort(make_response(jsonify({'error': f'{key} 应为BimJson地址或文档'}), 400))
+
+
+@app.route('/diff', methods=['POST'])
+def diff_plans():
+    """
+    比较两个版本的BimJson（before / after），返回新增、删除和移动的房间与构件
+    overlay 为true时附带高亮差异的新版本平面图
+    """
+    data = request.get_json(silent=True) or {}
+    before, after = requested_document('before'), requested_document('after')
+    result = bimdiff.diff_documents(before, after)
+    if data.get('overlay'):
+        layers = requested_layers()
+        result['image_data'] = draw.plot_changes(build_scene(before, layers=layers),
+                                                 build_scene(after, layers=layers), result)
+    return jsonify(result)
+
+
+@app.route('/clearance-audit', methods=['POST'])
+def clearance_audit():
+    """
+    按分类名的净空规则检查家具（规则见 rules），返回违规的构件、方向和阻挡物
+    overlay 为true时附带标出净空区域的平面图
+    """
+    data = request.get_json(silent=True) or {}
+    layers = requested_layers() | {'rooms', 'hard', 'parametric'}
+    scene = requested_scene(layers)
+    audit = rules.audit_scene(scene)
+    result = {
+        'checked': audit['checked'],
+        'violations': audit['violations'],
+        'summary': {'zones': len(audit['violated']), 'violations': len(audit['violations'])},
+    }
+    if data.get('overlay'):
+        result['image_data'] = draw.plot_clearance_audit(scene, audit)
+    return jsonify(result)
+
+
+@app.route('/room-stats', methods=['POST'])
+def room_stats():
+    """返回每个房间的面积、周长、质心和包围盒，不绘图、不查询模型接口"""
+    scene = requested_scene({'rooms'})
+    return jsonify({'unit': 'cm', 'rooms': describe_rooms(scene)})
+
+
+@app.route('/geojson', methods=['POST'])
+def export_geojson():
+    """
+    返回解析后的场景（GeoJSON FeatureCollection），由客户端自行绘制
+    layers 决定导出哪些构件类别，precision 为坐标保留的小数位数
+    """
+    layers = requested_layers()
+    precision = requested_option('precision', geoexport.parse_precision)
+    scene = requested_scene(layers)
+    return Response(geoexport.dumps(geoexport.scene_to_geojson(scene, precision)), mimetype='application/geo+json')
+
+
+@app.route('/tiles/<int:z>/<int(signed=True):x>/<int(signed=True):y>.png', methods=['GET'])
+def get_tile(z, x, y):
+    """
+    平面图瓦片（坐标约定见 tiles），供地图式查看器按需加载
+    查询参数: url BimJson地址（必填），layers 图层（逗号分隔）
+    """
+    url = request.args.get('url')
+    if not url:
+        return jsonify({'error': '缺少 url 参数'}), 400
+    if z > tiles.TILE_MAX_ZOOM:
+        return jsonify({'error': f'z 应为 0~{tiles.TILE_MAX_ZOOM}'}), 400
+    try:
+        layers = parse_layers(request.args.get('layers'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        data = tiles.get_tile(url, layers, z, x, y, lambda: check.fetch_bim_json(url))
+    except check.BimFetchError as e:
+        # 查看器会同时请求大量瓦片，BimJson下载失败时返回 502 / 504 且不缓存，由查看器稍后重试
+        return (jsonify({'error': str(e), 'degraded': sorted(deadline.degraded())}), e.status,
+                {'Cache-Control': 'no-store'})
+    return Response(data, mimetype='image/png', headers={'Cache-Control': 'max-age=60'})
+
+
+@app.route('/sessions', methods=['POST'])
+def create_session():
+    """创建编辑会话，返回会话id、版本号和完整平面图"""
+    dpi = requested_option('dpi', sessions.parse_dpi)
+    session, image_data = sessions.create_session(check.get_bim_json(), dpi, requested_layers())
+    return jsonify({
+        'session_id': session['id'],
+        'version': session['version'],
+        'image_data': image_data,
+    })
+
+
+@app.route('/sessions/<session_id>/edits', methods=['POST'])
+def edit_session(session_id):
+    """提交变动的构件条目，只重绘这些构件；version 必须与会话当前版本一致"""
+    session = sessions.get_session(session_id)
+    if session is None:
+        abort(404)
+    try:
+        image_data, redrawn, version = sessions.apply_edits(session, request.get_json(silent=True) or {})
+    except sessions.VersionConflict as e:
+        return jsonify({'error': 'version conflict', 'version': e.version}), 409
     return jsonify({
+        'session_id': session_id,
+        'version': version,
+        'redrawn': redrawn,
         'image_data': image_data,
     })
 
 
+@app.route('/sessions/<session_id>', methods=['DELETE'])
+def delete_session(session_id):
+    if not sessions.close_session(session_id):
+        abort(404)
+    return jsonify({'session_id': session_id})
+
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    body, content_type = metrics.render_latest()
+    return Response(body, mimetype=content_type)
+
+
 if __name__ == "__main__":
-    app.run(host='0.0.0.0', port=5000)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=5000)
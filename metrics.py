@@ -0,0 +1,101 @@
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (CONTENT_TYPE_LATEST, CollectorRegistry, Counter,
+                               Histogram, generate_latest)
+from prometheus_client import multiprocess
+
+# 多进程（gunicorn 多 worker）时需设置 PROMETHEUS_MULTIPROC_DIR，
+# 各 worker 把指标写入该目录，/metrics 汇总所有 worker 的数据
+
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (1e3, 1e4, 5e4, 1e5, 5e5, 1e6, 5e6, 1e7, 5e7)
+COUNT_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+STAGE_SECONDS = Histogram(
+    'floorplan_stage_seconds',
+    '生成平面图各阶段耗时（秒）',
+    ['stage'],
+    buckets=STAGE_BUCKETS,
+)
+UPSTREAM_RESPONSE_BYTES = Histogram(
+    'floorplan_upstream_response_bytes',
+    '上游响应大小（字节）',
+    ['upstream'],
+    buckets=SIZE_BUCKETS,
+)
+ITEM_COUNT = Histogram(
+    'floorplan_items',
+    '每次请求各类构件的数量',
+    ['family'],
+    buckets=COUNT_BUCKETS,
+)
+CACHE_REQUESTS = Counter(
+    'floorplan_cache_requests',
+    '缓存访问次数，result 为 hit 或 miss',
+    ['cache', 'result'],
+)
+UPSTREAM_EVENTS = Counter(
+    'floorplan_upstream_events',
+    '上游调用事件：hedge_sent / hedge_won / breaker_open / breaker_rejected',
+    ['upstream', 'event'],
+)
+DEGRADED = Counter(
+    'floorplan_degraded',
+    '因延迟预算或上游失败而降级的请求数：catalog / layers / dpi',
+    ['flag'],
+)
+
+
+@contextmanager
+def stage(name):
+    """统计一个阶段的耗时，用法: with metrics.stage('draw'): ..."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.labels(stage=name).observe(time.perf_counter() - start)
+
+
+def observe_stage(name, start):
+    """记录从 start（time.perf_counter() 的返回值）到现在的阶段耗时"""
+    STAGE_SECONDS.labels(stage=name).observe(time.perf_counter() - start)
+
+
+def observe_response_size(upstream, response):
+    """记录上游响应体大小"""
+    try:
+        UPSTREAM_RESPONSE_BYTES.labels(upstream=upstream).observe(len(response.content))
+    except Exception as e:
+        print(f"记录响应大小失败: {e}")
+
+
+def observe_items(family, items):
+    """记录某一类构件的数量"""
+    ITEM_COUNT.labels(family=family).observe(len(items or []))
+
+
+def record_cache(cache, hit):
+    """记录一次缓存命中或未命中，命中率 = hit / (hit + miss)"""
+    CACHE_REQUESTS.labels(cache=cache, result='hit' if hit else 'miss').inc()
+
+
+def record_upstream_event(upstream, event):
+    """记录一次对冲或熔断事件"""
+    UPSTREAM_EVENTS.labels(upstream=upstream, event=event).inc()
+
+
+def record_degraded(flag):
+    """记录一次降级（见 deadline）"""
+    DEGRADED.labels(flag=flag).inc()
+
+
+def render_latest():
+    """返回 /metrics 的响应体和 Content-Type"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        from prometheus_client import REGISTRY as registry
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,102 @@
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import tempfile
+import time
+import uuid
+
+from flask import abort, jsonify, make_response, request
+
+# 按需对单次请求做性能剖析，需同时满足:
+#   1. 服务端设置了 FLOORPLAN_PROFILE_TOKEN（未设置时该功能关闭）
+#   2. 请求头 X-Profile-Token 与之相同
+#   3. 请求体带 "profile": true（返回热点函数）或 "profile": "file"（保存 .prof 文件）
+PROFILE_TOKEN = os.environ.get('FLOORPLAN_PROFILE_TOKEN', '')
+PROFILE_DIR = os.environ.get('FLOORPLAN_PROFILE_DIR',
+                             os.path.join(tempfile.gettempdir(), 'floorplan-profiles'))
+DEFAULT_TOP = 30
+MAX_TOP = 500
+SORT_KEYS = ('tottime', 'cumulative', 'ncalls')
+
+
+def requested_mode():
+    """
+    读取当前请求的剖析开关
+    返回 None（不剖析）、'top' 或 'file'；带了开关但未通过校验时返回403
+    """
+    data = request.get_json(silent=True) or {}
+    flag = data.get('profile')
+    if not flag:
+        return None
+    token = request.headers.get('X-Profile-Token', '')
+    if not PROFILE_TOKEN or not hmac.compare_digest(token, PROFILE_TOKEN):
+        abort(403)
+    return 'file' if flag == 'file' else 'top'
+
+
+def parse_top(value):
+    """解析 profile_top（返回的热点函数数），为空时返回 DEFAULT_TOP；非正整数时抛出 ValueError"""
+    if value is None or value == '':
+        return DEFAULT_TOP
+    try:
+        top = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"profile_top 应为 1~{MAX_TOP} 之间的整数")
+    if not 0 < top <= MAX_TOP:
+        raise ValueError(f"profile_top 应为 1~{MAX_TOP} 之间的整数")
+    return top
+
+
+def run(func, mode, top=None, sort=None):
+    """
+    在 cProfile 下执行 func，返回 (func的返回值, 剖析结果)
+    mode='top' 时剖析结果为热点函数列表，mode='file' 时为保存的 .prof 文件路径
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        top = parse_top(data.get('profile_top') if top is None else top)
+    except ValueError as e:
+        abort(make_response(jsonify({'error': str(e)}), 400))
+    sort = sort or data.get('profile_sort')
+    if sort not in SORT_KEYS:
+        sort = 'tottime'
+
+    profiler = cProfile.Profile()
+    start = time.perf_counter()
+    profiler.enable()
+    try:
+        result = func()
+    finally:
+        profiler.disable()
+    elapsed = time.perf_counter() - start
+
+    stats = pstats.Stats(profiler, stream=io.StringIO())
+    profile = {'mode': mode, 'sort': sort, 'total_seconds': round(elapsed, 4)}
+    if mode == 'file':
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}.prof")
+        stats.dump_stats(path)
+        profile['path'] = path
+    else:
+        profile['hotspots'] = hotspots(stats, top, sort)
+    return result, profile
+
+
+def hotspots(stats, top, sort):
+    """把 pstats 结果整理为可序列化的热点列表"""
+    rows = []
+    for (filename, line, function), (cc, ncalls, tottime, cumtime, _) in stats.stats.items():
+        rows.append({
+            'function': function,
+            'file': filename,
+            'line': line,
+            'ncalls': ncalls,
+            'primitive_calls': cc,
+            'tottime': round(tottime, 6),
+            'cumtime': round(cumtime, 6),
+        })
+    key = {'tottime': 'tottime', 'cumulative': 'cumtime', 'ncalls': 'ncalls'}[sort]
+    rows.sort(key=lambda row: row[key], reverse=True)
+    return rows[:top]
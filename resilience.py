@@ -0,0 +1,130 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import metrics
+
+# 模型接口的对冲请求与熔断
+# - 对冲：首个请求在 hedge_delay() 内未返回时再发一个相同请求，取先成功的结果；
+#   延迟取近期成功请求耗时的分位数（CATALOG_HEDGE_PERCENTILE），并限制在 [MIN, MAX] 内
+# - 熔断：连续失败 CATALOG_BREAKER_FAILURES 次后，在 CATALOG_BREAKER_COOLDOWN 秒内不再请求，
+#   冷却结束后放行一个试探请求，成功则恢复，失败则继续熔断
+HEDGE_PERCENTILE = float(os.environ.get('CATALOG_HEDGE_PERCENTILE', 95))
+HEDGE_MIN_DELAY = float(os.environ.get('CATALOG_HEDGE_MIN_MS', 50)) / 1000
+HEDGE_MAX_DELAY = float(os.environ.get('CATALOG_HEDGE_MAX_MS', 1000)) / 1000
+# 样本不足时使用的对冲延迟
+HEDGE_DEFAULT_DELAY = float(os.environ.get('CATALOG_HEDGE_DEFAULT_MS', 200)) / 1000
+HEDGE_MIN_SAMPLES = 20
+LATENCY_WINDOW = 200
+
+BREAKER_FAILURES = int(os.environ.get('CATALOG_BREAKER_FAILURES', 5))
+BREAKER_COOLDOWN = float(os.environ.get('CATALOG_BREAKER_COOLDOWN', 30))
+
+_latencies = deque(maxlen=LATENCY_WINDOW)
+_breaker = {'failures': 0, 'opened_at': None, 'trial_running': False}
+_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='catalog-hedge')
+
+
+def observe_latency(seconds):
+    """记录一次成功请求的耗时，用于计算对冲延迟"""
+    with _lock:
+        _latencies.append(seconds)
+
+
+def hedge_delay():
+    """根据近期耗时分位数计算对冲延迟（秒）；CATALOG_HEDGE_PERCENTILE<=0 时不对冲，返回None"""
+    if HEDGE_PERCENTILE <= 0:
+        return None
+    with _lock:
+        samples = sorted(_latencies)
+    if len(samples) < HEDGE_MIN_SAMPLES:
+        return HEDGE_DEFAULT_DELAY
+    index = min(len(samples) - 1, int(len(samples) * HEDGE_PERCENTILE / 100))
+    return min(HEDGE_MAX_DELAY, max(HEDGE_MIN_DELAY, samples[index]))
+
+
+def hedged_call(fn, upstream='catalog', timeout=None):
+    """
+    执行 fn()，超过对冲延迟仍未返回时并发再执行一次，返回先成功的结果
+    两次都失败时抛出最后一个异常；timeout 为整体等待上限（秒）
+    """
+    delay = hedge_delay()
+    deadline = None if timeout is None else time.monotonic() + timeout
+    primary = _executor.submit(fn)
+    if delay is None:
+        return primary.result(timeout=timeout)
+
+    done, _ = wait([primary], timeout=delay if timeout is None else min(delay, timeout))
+    if done:
+        return primary.result()
+
+    metrics.record_upstream_event(upstream, 'hedge_sent')
+    hedge = _executor.submit(fn)
+    pending = {primary, hedge}
+    error = None
+    while pending:
+        remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+        done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+        if not done:
+            raise TimeoutError(f"{upstream} 请求超时")
+        for future in done:
+            try:
+                result = future.result()
+            except Exception as e:
+                error = e
+                continue
+            if future is hedge:
+                metrics.record_upstream_event(upstream, 'hedge_won')
+            return result
+    raise error
+
+
+def breaker_allows(upstream='catalog'):
+    """熔断器是否放行本次请求"""
+    with _lock:
+        opened_at = _breaker['opened_at']
+        if opened_at is None:
+            return True
+        if time.monotonic() - opened_at >= BREAKER_COOLDOWN and not _breaker['trial_running']:
+            # 半开：只放行一个试探请求
+            _breaker['trial_running'] = True
+            return True
+    metrics.record_upstream_event(upstream, 'breaker_rejected')
+    return False
+
+
+def record_success():
+    with _lock:
+        _breaker.update(failures=0, opened_at=None, trial_running=False)
+
+
+def release_trial():
+    """
+    结束试探请求但不计成功或失败（如因请求自身的延迟预算不足而超时），
+    熔断器保持半开，下一个请求重新试探
+    """
+    with _lock:
+        _breaker['trial_running'] = False
+
+
+def record_failure(upstream='catalog'):
+    with _lock:
+        _breaker['failures'] += 1
+        should_open = _breaker['trial_running'] or _breaker['failures'] >= BREAKER_FAILURES
+        if should_open:
+            _breaker.update(opened_at=time.monotonic(), trial_running=False)
+    if should_open:
+        metrics.record_upstream_event(upstream, 'breaker_open')
+
+
+def breaker_state():
+    """熔断器状态: closed / open / half_open"""
+    with _lock:
+        if _breaker['opened_at'] is None:
+            return 'closed'
+        if time.monotonic() - _breaker['opened_at'] >= BREAKER_COOLDOWN:
+            return 'half_open'
+        return 'open'
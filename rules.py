@@ -0,0 +1,196 @@
+import json
+import os
+
+import numpy as np
+
+import draw
+import metrics
+
+# 家具净空规则：按模型分类名（classifyName）规定构件四周需要留出的净空（cm），
+# 每条规则在构件对应一侧生成一个净空区域（有向矩形），区域与墙段或其他家具相交即为违规。
+# 所有区域与所有墙段、所有家具一次性做分离轴检测（向量化），不逐个构件循环。
+#
+# 四个方向按构件自身的坐标轴确定：front 为长度方向（模型局部X轴）正向，back 为其反向，
+# left / right 为面向 front 时的左右两侧。
+
+# 默认规则；ignore 中的分类视为配套家具，不算作阻挡（如餐桌四周的餐椅）
+DEFAULT_RULES = {
+    '双人床': {'front': 60, 'left': 60, 'right': 60},
+    '单人床': {'front': 60, 'left': 60},
+    '婴儿床': {'left': 50},
+    '高低_子母床': {'front': 60, 'left': 60},
+    '沙发床': {'front': 90},
+    '三人沙发': {'front': 45},
+    '双人沙发': {'front': 45},
+    '多人沙发': {'front': 45},
+    '茶几': {'front': 30, 'back': 30},
+    '餐桌': {'front': 75, 'back': 75, 'left': 60, 'right': 60, 'ignore': ['餐椅']},
+    '餐椅': {'back': 45, 'ignore': ['餐桌', '餐椅']},
+    '淋浴房': {'front': 60},
+}
+# 自定义规则文件（JSON，格式同 DEFAULT_RULES），设置后替换默认规则
+RULES_PATH = os.environ.get('FLOORPLAN_CLEARANCE_RULES', '')
+SIDES = ('front', 'back', 'left', 'right')
+# 净空区域与构件之间、与相邻边缘之间留出的容差（cm），贴边摆放不算相交
+TOLERANCE = 1.0
+# 参与检测的构件类别（插座贴墙安装，不作为阻挡）
+FAMILIES = ('hard', 'parametric')
+
+_rules = {}
+
+
+def load_rules():
+    """当前生效的规则（进程内只读取一次规则文件）"""
+    if 'rules' not in _rules:
+        rules = DEFAULT_RULES
+        if RULES_PATH:
+            try:
+                with open(RULES_PATH, encoding='utf-8') as f:
+                    rules = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"读取净空规则失败 {RULES_PATH}: {e}，使用默认规则")
+        _rules['rules'] = rules
+    return _rules['rules']
+
+
+def _obstacles(scene):
+    """所有参与检测的家具：(有向矩形中心, 坐标轴, 半长宽, 键列表, 分类名列表)"""
+    centers, axes, halves, keys, classes = [], [], [], [], []
+    for family in FAMILIES:
+        items = scene[family]
+        if not items:
+            continue
+        boxes = draw.scene_item_boxes(scene, family)
+        centers.append(boxes['center'])
+        axes.append(boxes['axes'])
+        halves.append(boxes['size'] / 2)
+        keys += [draw.item_key(family, item) for item in items]
+        classes += [item.get('classifyName') for item in items]
+    if not keys:
+        return np.zeros((0, 2)), np.zeros((0, 2, 2)), np.zeros((0, 2)), [], []
+    return np.concatenate(centers), np.concatenate(axes), np.concatenate(halves), keys, classes
+
+
+def clearance_zones(scene, rules=None):
+    """
+    按规则为每个匹配的构件生成各侧的净空区域
+    返回: {'center': (K, 2), 'axes': (K, 2, 2), 'half': (K, 2), 'owner': (K,) 家具下标,
+           'side': [...], 'required': (K,), 以及 _obstacles 的全部结果}
+    """
+    rules = load_rules() if rules is None else rules
+    centers, axes, halves, keys, classes = _obstacles(scene)
+    owners, sides, required = [], [], []
+    for index, classify_name in enumerate(classes):
+        rule = rules.get(classify_name)
+        if not rule:
+            continue
+        for side in SIDES:
+            if rule.get(side, 0) > 0:
+                owners.append(index)
+                sides.append(side)
+                required.append(float(rule[side]))
+    owners = np.asarray(owners, dtype=int)
+    required = np.asarray(required, dtype=float)
+
+    # 沿长度方向（front/back）的区域：宽度同构件宽度；沿宽度方向（left/right）的区域：宽度同构件长度
+    along = np.isin(sides, ('front', 'back'))
+    sign = np.where(np.isin(sides, ('front', 'left')), 1.0, -1.0)
+    owner_axes, owner_half = axes[owners], halves[owners]
+    normal_axis = np.where(along, 0, 1)
+    normal = owner_axes[np.arange(len(owners)), normal_axis] * sign[:, None]
+    offset = owner_half[np.arange(len(owners)), normal_axis] + TOLERANCE + required / 2
+    zone_half = np.where(along[:, None],
+                         np.column_stack([required / 2, owner_half[:, 1] - TOLERANCE]),
+                         np.column_stack([owner_half[:, 0] - TOLERANCE, required / 2]))
+    return {
+        'center': centers[owners] + normal * offset[:, None],
+        'axes': owner_axes,
+        'half': np.maximum(zone_half, 0).reshape(-1, 2),
+        'owner': owners,
+        'side': sides,
+        'required': required,
+        'obstacles': (centers, axes, halves, keys, classes),
+    }
+
+
+def _project(center, axes, half, axis):
+    """有向矩形在给定轴上的投影区间 (中心, 半长)，按最后一维广播"""
+    middle = (center * axis).sum(axis=-1)
+    radius = half[..., 0] * np.abs((axes[..., 0, :] * axis).sum(axis=-1)) + \
+        half[..., 1] * np.abs((axes[..., 1, :] * axis).sum(axis=-1))
+    return middle, radius
+
+
+def _boxes_overlap(zones, centers, axes, halves):
+    """K 个净空区域与 M 个家具矩形两两是否相交（分离轴检测），返回 (K, M) 布尔矩阵"""
+    zc, za, zh = zones['center'][:, None], zones['axes'][:, None], zones['half'][:, None]
+    oc, oa, oh = centers[None], axes[None], halves[None]
+    overlap = np.ones((len(zones['center']), len(centers)), dtype=bool)
+    for source in (za, oa):
+        for k in (0, 1):
+            axis = source[..., k, :]
+            zone_middle, zone_radius = _project(zc, za, zh, axis)
+            box_middle, box_radius = _project(oc, oa, oh, axis)
+            overlap &= np.abs(zone_middle - box_middle) < zone_radius + box_radius
+    return overlap
+
+
+def _walls_overlap(zones, starts, ends):
+    """K 个净空区域与 W 个墙段两两是否相交（分离轴检测），返回 (K, W) 布尔矩阵"""
+    zc, za, zh = zones['center'][:, None], zones['axes'][:, None], zones['half'][:, None]
+    starts, ends = starts[None], ends[None]
+    vectors = ends - starts
+    lengths = np.hypot(vectors[..., 0], vectors[..., 1])
+    normals = np.stack([-vectors[..., 1], vectors[..., 0]], axis=-1) / np.where(lengths == 0, 1, lengths)[..., None]
+    overlap = np.ones((len(zones['center']), starts.shape[1]), dtype=bool)
+    for axis in (za[..., 0, :], za[..., 1, :], normals):
+        zone_middle, zone_radius = _project(zc, za, zh, axis)
+        a, b = (starts * axis).sum(axis=-1), (ends * axis).sum(axis=-1)
+        overlap &= (np.maximum(a, b) > zone_middle - zone_radius) & (np.minimum(a, b) < zone_middle + zone_radius)
+    return overlap
+
+
+def audit_scene(scene, rules=None):
+    """
+    检查场景中所有匹配规则的家具
+    返回: {'checked': 检查的构件数, 'zones': 净空区域, 'violated': (K,) 是否违规,
+           'violations': [{'family', 'id', 'instance', 'classifyName', 'side', 'required', 'blocked_by'}, ...]}
+    """
+    with metrics.stage('rules'):
+        rules = load_rules() if rules is None else rules
+        zones = clearance_zones(scene, rules)
+        centers, axes, halves, keys, classes = zones['obstacles']
+        owners = zones['owner']
+        # 按房间边界（墙体内侧表面）检查，净空区域伸入墙体即算阻挡
+        walls = draw.scene_wall_segments(scene)['faces']
+        wall_hits = _walls_overlap(zones, walls['starts'], walls['ends'])
+        item_hits = _boxes_overlap(zones, centers, axes, halves)
+        # 自身和规则中声明的配套家具不算阻挡
+        item_hits[np.arange(len(owners)), owners] = False
+        class_names = np.array(classes, dtype=object)
+        owner_classes = class_names[owners]
+        for classify_name, rule in rules.items():
+            if rule.get('ignore'):
+                item_hits[np.ix_(owner_classes == classify_name, np.isin(class_names, rule['ignore']))] = False
+        violated = wall_hits.any(axis=1) | item_hits.any(axis=1)
+
+    room_ids = [room['SpaceId'] for room in scene['rooms']]
+    violations = []
+    for k in np.flatnonzero(violated).tolist():
+        owner = owners[k]
+        family, item_id, instance = keys[owner]
+        # 两个房间重合的边界两侧都记为阻挡来源，另一侧没有房间（-1）不计
+        blocked_by = [{'type': 'wall', 'SpaceId': room_ids[room]}
+                      for room in sorted(set(walls['rooms'][wall_hits[k]].ravel().tolist()) - {-1})]
+        blocked_by += [{'type': 'item', 'family': keys[m][0], 'id': keys[m][1], 'instance': keys[m][2],
+                        'classifyName': classes[m]} for m in np.flatnonzero(item_hits[k]).tolist()]
+        violations.append({
+            'family': family, 'id': item_id, 'instance': instance, 'classifyName': classes[owner],
+            'side': zones['side'][k], 'required': zones['required'][k].item(), 'blocked_by': blocked_by,
+        })
+    return {
+        'checked': len(set(owners.tolist())),
+        'zones': zones,
+        'violated': violated,
+        'violations': violations,
+    }
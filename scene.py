@@ -0,0 +1,246 @@
+import check
+import draw
+import geometry
+import metrics
+
+# 单位换算比例：设备尺寸（毫米）转房间坐标单位（厘米）
+UNIT_SCALE = 0.1
+
+
+def parse_room(room):
+    """解析单个房间，返回带坐标的房间信息；没有有效坐标点时返回None"""
+    coordinates = draw.parse_points(room.get('points') or [])
+    if not coordinates:
+        print(f"房间 {room.get('Name')} (ID: {room.get('SpaceId')}) 没有有效的坐标点")
+        return None
+    return {
+        'SpaceId': room.get('SpaceId'),
+        'Name': room.get('Name'),
+        'coordinates': coordinates,
+    }
+
+
+def parse_hydropower_item(item):
+    """解析插座：中心点、角度和尺寸（毫米）"""
+    x, y = draw.parse_location(item.get('location') or '')
+    return dict(
+        item,
+        x=x, y=y,
+        angle=draw.parse_rotation(item.get('rotation') or ''),
+        # 实际插座约100mm
+        length=float(item.get('length', 100)),
+        width=float(item.get('width', 100)),
+        label=item.get('pointUse', '插座'),
+    )
+
+
+def parse_hard_item(item):
+    """解析非参数化模型：中心点、角度和尺寸（毫米）"""
+    x, y = draw.parse_location(item.get('location') or '')
+    name_str = item.get('name') or item.get('pointUse') or '设备'
+    return dict(
+        item,
+        x=x, y=y,
+        angle=draw.parse_rotation(item.get('rotation') or ''),
+        length=float(item.get('length', 600)),
+        width=float(item.get('width', 300)),
+        label=name_str.split('-')[0],
+    )
+
+
+def parse_parametric_item(item):
+    """解析参数化模型：端点、角度、尺寸（毫米）和翻转"""
+    # 参数化模型使用专门的解析函数，Y轴向下为正
+    x, y = draw.parse_location_for_parametric(item.get('location') or '')
+    scale = check.parse_scale(item.get('scale') or 'X=1.000 Y=1.000 Z=1.000')
+    name_str = item.get('name') or '设备'
+    return dict(
+        item,
+        x=x, y=y,
+        angle=draw.parse_rotation_for_parametric(item.get('rotation') or ''),
+        length=float(item.get('length', 600)),
+        width=float(item.get('width', 300)),
+        scale_x=scale['X'],
+        scale_y=scale['Y'],
+        label=name_str.split('-')[0],
+    )
+
+
+# 可选图层；rooms 房间轮廓，sockets 插座，hard 非参数化模型，parametric 参数化模型，
+# labels 名称标注，clearances 设备到墙的距离线，dimensions 墙段尺寸
+LAYERS = ('rooms', 'sockets', 'hard', 'parametric', 'labels', 'clearances', 'dimensions')
+DEFAULT_LAYERS = frozenset(('rooms', 'sockets', 'hard', 'parametric', 'labels'))
+# 构件类别对应的图层
+FAMILY_LAYERS = {'hydropower': 'sockets', 'hard': 'hard', 'parametric': 'parametric'}
+# 需要房间轮廓数据的图层
+ROOM_LAYERS = frozenset(('rooms', 'labels', 'clearances', 'dimensions'))
+
+
+def parse_layers(value):
+    """
+    解析请求中的 layers 参数（列表或逗号分隔的字符串），为空时返回默认图层
+    格式错误或含未知图层时抛出 ValueError
+    """
+    if value is None:
+        return DEFAULT_LAYERS
+    if isinstance(value, str):
+        value = value.split(',')
+    if not isinstance(value, (list, tuple)) or not all(isinstance(layer, str) for layer in value):
+        raise ValueError(f"layers 应为图层名列表或逗号分隔的字符串，可选: {', '.join(LAYERS)}")
+    layers = frozenset(str(layer).strip() for layer in value if str(layer).strip())
+    unknown = layers - set(LAYERS)
+    if unknown:
+        raise ValueError(f"未知图层: {', '.join(sorted(unknown))}，可选: {', '.join(LAYERS)}")
+    return layers or DEFAULT_LAYERS
+
+
+# 单边最大输出像素，防止请求超大图片
+MAX_PIXEL_SIZE = 8000
+
+
+def parse_viewport(value):
+    """
+    解析请求中的 viewport 参数：BIM坐标（cm）下的 [xmin, ymin, xmax, ymax]，为空时返回None
+    返回绘图坐标（Y轴取反）下的包围盒 (xmin, ymin, xmax, ymax)；格式错误时抛出 ValueError
+    """
+    if value is None:
+        return None
+    try:
+        xmin, ymin, xmax, ymax = (float(v) for v in value)
+    except (TypeError, ValueError):
+        raise ValueError("viewport 应为 [xmin, ymin, xmax, ymax]（cm）")
+    if not (xmin < xmax and ymin < ymax):
+        raise ValueError("viewport 需满足 xmin < xmax 且 ymin < ymax")
+    return (xmin, -ymax, xmax, -ymin)
+
+
+def parse_pixel_size(value):
+    """
+    解析请求中的 pixel_size 参数：目标宽度（像素）或 [宽, 高]，为空时返回None
+    返回 (宽, 高)，只给宽度时高为None；格式错误时抛出 ValueError
+    """
+    if value is None:
+        return None
+    size = list(value) if isinstance(value, (list, tuple)) else [value]
+    try:
+        size = [int(v) for v in size]
+    except (TypeError, ValueError):
+        raise ValueError("pixel_size 应为整数宽度或 [宽, 高]")
+    if len(size) not in (1, 2) or not all(0 < v <= MAX_PIXEL_SIZE for v in size):
+        raise ValueError(f"pixel_size 应为 1~{MAX_PIXEL_SIZE} 之间的整数宽度或 [宽, 高]")
+    return (size[0], size[1] if len(size) == 2 else None)
+
+
+# 构件类别与BimJson中的位置：(类别, 顶层键, 列表键, id字段)
+FAMILIES = (
+    ('hydropower', 'hydropowerMode', 'moveableMeshList', 'id'),
+    ('hard', 'hardMode', 'moveableMeshList', 'id'),
+    ('parametric', 'NewWHCMode', 'cab_data_list', 'ContentItemID'),
+)
+PARSERS = {
+    'hydropower': parse_hydropower_item,
+    'hard': parse_hard_item,
+    'parametric': parse_parametric_item,
+}
+EXTRACTORS = {
+    'hydropower': check.get_hydropowerModeList,
+    'hard': check.get_hardModeList,
+    'parametric': check.get_NewWHCModeList,
+}
+
+
+def resolve_items(family, entries, model_dict):
+    """用已查询的模型数据把BimJson原始条目解析为场景构件（不访问模型接口）"""
+    mode_key, list_key = next((m, l) for f, m, l, _ in FAMILIES if f == family)
+    document = {mode_key: {list_key: entries}}
+    return [PARSERS[family](item) for item in EXTRACTORS[family](document, model_dict) if item]
+
+
+def build_scene_steps(bimjson, model_dict=None, layers=DEFAULT_LAYERS):
+    """
+    逐步构建场景的生成器：先解析房间，再依次提取各类构件（各自查询模型接口）
+    每完成一步产出 (步骤, scene)，步骤为 'rooms' 或构件类别，未请求的类别跳过；
+    每次产出的是同一个场景字典，尚未提取的构件类别为空列表
+    """
+    layers = frozenset(layers)
+    scene = {'unit_scale': UNIT_SCALE, 'layers': layers}
+    rooms = []
+    if layers & ROOM_LAYERS:
+        rooms = [r for r in map(parse_room, check.get_roomList(bimjson)) if r]
+        metrics.observe_items('rooms', rooms)
+    scene['rooms'] = rooms
+    # 所有房间坐标，用于距离计算和坐标轴范围
+    scene['room_coordinates'] = [room['coordinates'] for room in rooms]
+    # 面积、周长、质心和包围盒，供标注放置、视口裁剪和房间统计接口使用
+    scene['room_stats'] = geometry.room_stats(scene['room_coordinates'])
+    # 去重后的墙体图和房间相邻关系，供房间轮廓、尺寸线、距离线、净空检查和房间统计使用
+    scene['walls'] = geometry.wall_graph(scene['room_coordinates'])
+    for family, _, _, _ in FAMILIES:
+        scene[family] = []
+    yield 'rooms', scene
+
+    for family, _, _, _ in FAMILIES:
+        if FAMILY_LAYERS[family] not in layers:
+            continue
+        items = [PARSERS[family](item) for item in EXTRACTORS[family](bimjson, model_dict) if item]
+        metrics.observe_items(family, items)
+        scene[family] = items
+        yield family, scene
+
+
+def build_scene(bimjson, model_dict=None, layers=DEFAULT_LAYERS):
+    """
+    由BimJson构建场景：提取房间和三类构件（含模型接口查询），并解析坐标、角度和尺寸
+    返回的场景供绘图、距离计算等后续阶段使用，各阶段不再重复解析字符串
+    model_dict: 已查询好的模型数据（check.index_models 的结果），为None时按类别查询模型接口
+    layers: 需要的图层，未请求的构件类别不提取、不查询模型接口，对应列表为空
+    """
+    with metrics.stage('scene_build'):
+        for _, scene in build_scene_steps(bimjson, model_dict, layers):
+            pass
+    return scene
+
+
+def describe_rooms(scene):
+    """
+    房间几何统计，坐标换回BimJson坐标系（Y轴不取反），长度单位cm
+    neighbors: 与该房间有共用墙的房间及共用墙总长，按共用墙长度从长到短
+    返回: [{'SpaceId', 'Name', 'area', 'area_m2', 'perimeter', 'centroid', 'bbox', 'neighbors'}, ...]
+    """
+    stats = scene['room_stats']
+    walls = draw.scene_wall_segments(scene)
+    neighbors = [[] for _ in scene['rooms']]
+    for (a, b), length in zip(walls['adjacency'].tolist(), walls['adjacency_lengths'].tolist()):
+        neighbors[a].append({'SpaceId': scene['rooms'][b]['SpaceId'], 'shared_length': round(length, 2)})
+        neighbors[b].append({'SpaceId': scene['rooms'][a]['SpaceId'], 'shared_length': round(length, 2)})
+    rooms = []
+    for room, room_neighbors, area, perimeter, (cx, cy), (xmin, ymin, xmax, ymax) in zip(
+            scene['rooms'], neighbors, stats['area'], stats['perimeter'], stats['centroid'], stats['bbox']):
+        rooms.append({
+            'SpaceId': room['SpaceId'],
+            'Name': room['Name'],
+            'area': round(float(area), 2),
+            'area_m2': round(float(area) / 10000, 4),
+            'perimeter': round(float(perimeter), 2),
+            'centroid': [round(float(cx), 2), round(float(-cy), 2)],
+            'bbox': [round(float(xmin), 2), round(float(-ymax), 2), round(float(xmax), 2), round(float(-ymin), 2)],
+            'neighbors': sorted(room_neighbors, key=lambda neighbor: -neighbor['shared_length']),
+        })
+    return rooms
+
+
+def compute_clearances(scene):
+    """
+    计算非参数化模型和参数化模型各边到房间轮廓的距离
+    返回: [{'id', 'family', 'segments': [(midpoint, intersection, distance), ...]}, ...]
+    """
+    with metrics.stage('clearance'):
+        clearances = []
+        for family in ('hard', 'parametric'):
+            boxes = draw.scene_item_boxes(scene, family)
+            for item, center, corners in zip(scene[family], boxes['center'], boxes['corners']):
+                segments = []
+                if (item['x'], item['y']) != (0, 0):
+                    segments = draw.clearance_segments(center, corners, draw.scene_wall_edges(scene))
+                clearances.append({'id': item.get('id'), 'family': family, 'segments': segments})
+    return clearances
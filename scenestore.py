@@ -0,0 +1,313 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+import deadline
+import geometry
+import metrics
+import scene as scene_builder
+
+# 解析好的场景按BimJson地址持久化为二进制文件，同一方案换图层、视口或分辨率重绘时
+# 不再下载BimJson、不再解析字符串、不再查询模型接口。
+# 文件格式：魔数 | 头部长度 (uint32) | JSON头部 | 按8字节对齐的定长数组
+# - 头部记录各数组的 dtype、形状和偏移，以及房间名称、构件id等字符串属性
+# - 数组为房间顶点、房间几何统计和各类构件的数值列（位置、角度、尺寸、翻转）
+# 读取时整个文件 mmap 到内存，数组为零拷贝的只读视图；多个worker打开同一文件时共享页缓存。
+# 场景按内容分组存储：房间（rooms）和各构件类别（hydropower / hard / parametric），头部记录已存储的分组。
+# 只构建请求需要的分组（只要房间时不查询模型接口），请求用到尚未存储的分组时只构建缺少的分组，
+# 与已存储的合并后重写文件；读取时再按请求的图层裁剪。
+
+# 存储目录，为空字符串时不使用场景存储
+SCENE_STORE_DIR = os.environ.get('FLOORPLAN_SCENE_STORE', os.path.join(tempfile.gettempdir(), 'floorplan-scenes'))
+# 场景文件的有效期（秒），过期后重新下载和解析
+SCENE_STORE_TTL = float(os.environ.get('FLOORPLAN_SCENE_STORE_TTL', 600))
+
+MAGIC = b'FPSCENE1'
+ALIGNMENT = 8
+# 构件的数值列；非参数化模型没有翻转，scale_x / scale_y 记为1
+ITEM_COLUMNS = ('x', 'y', 'angle', 'length', 'width', 'scale_x', 'scale_y')
+# 每个进程最多保持映射的文件数，超出时丢弃最久未用的（仍被数组视图引用的映射在视图释放后关闭）
+SCENE_STORE_OPEN = 64
+
+_mapped = OrderedDict()  # 路径 → (修改时间, 头部, mmap)
+_lock = threading.Lock()
+
+
+def scene_path(url):
+    """BimJson地址对应的场景文件路径"""
+    digest = hashlib.sha1(str(url).encode('utf-8')).hexdigest()
+    return os.path.join(SCENE_STORE_DIR, f'{digest}.scene')
+
+
+def scene_version(url):
+    """场景文件的修改时间，用作缓存的版本号；未启用场景存储、文件不存在或已过期时返回None"""
+    if not SCENE_STORE_DIR or not url:
+        return None
+    path = scene_path(url)
+    if _open_fresh(path) is None:
+        return None
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+def scene_groups(layers):
+    """图层需要的内容分组：房间（任一需要房间轮廓的图层）和请求的构件类别"""
+    layers = frozenset(layers)
+    groups = {'rooms'} if layers & scene_builder.ROOM_LAYERS else set()
+    groups.update(family for family, layer in scene_builder.FAMILY_LAYERS.items() if layer in layers)
+    return groups
+
+
+def _group_layers(groups):
+    """构建这些内容分组所需的图层"""
+    layers = {'rooms'} if 'rooms' in groups else set()
+    layers.update(scene_builder.FAMILY_LAYERS[family] for family in groups if family != 'rooms')
+    return frozenset(layers)
+
+
+def _item_arrays(scene, family):
+    items = scene[family]
+    columns = np.array([[float(item.get(column, 1.0)) for column in ITEM_COLUMNS] for item in items],
+                       dtype=np.float64).reshape(-1, len(ITEM_COLUMNS))
+    properties = [{key: value for key, value in item.items() if key not in ITEM_COLUMNS} for item in items]
+    return columns, properties
+
+
+def write_scene(path, scene, groups=None, built_at=None):
+    """
+    把场景写入文件（先写临时文件再替换，读取方不会看到写了一半的文件）
+    groups: 场景包含的内容分组（见 scene_groups），为None时按全部分组记录
+    built_at: 场景中最早构建的分组的构建时间，有效期从该时间算起，为None时取当前时间
+    """
+    rooms = scene['rooms']
+    counts = np.array([len(room['coordinates']) for room in rooms], dtype=np.int64)
+    stats = scene['room_stats']
+    arrays = {
+        'room_points': np.array([point for room in rooms for point in room['coordinates']],
+                                dtype=np.float64).reshape(-1, 2),
+        'room_offsets': np.concatenate([[0], np.cumsum(counts)]).astype(np.int64),
+        'room_area': stats['area'],
+        'room_perimeter': stats['perimeter'],
+        'room_centroid': stats['centroid'],
+        'room_bbox': stats['bbox'],
+    }
+    items = {}
+    for family, _, _, _ in scene_builder.FAMILIES:
+        arrays[f'{family}_columns'], items[family] = _item_arrays(scene, family)
+
+    layout, offset = {}, 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array, dtype=np.float64 if array.dtype.kind == 'f' else np.int64)
+        arrays[name] = array
+        layout[name] = [array.dtype.str, list(array.shape), offset]
+        offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+    header = json.dumps({
+        'unit_scale': scene['unit_scale'],
+        'groups': sorted(scene_groups(scene_builder.LAYERS) if groups is None else groups),
+        'built_at': time.time() if built_at is None else built_at,
+        'arrays': layout,
+        'rooms': [{'SpaceId': room['SpaceId'], 'Name': room['Name']} for room in rooms],
+        'items': items,
+    }, ensure_ascii=False, default=str).encode('utf-8')
+    prefix = len(MAGIC) + 4 + len(header)
+    padding = -prefix % ALIGNMENT
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(MAGIC + struct.pack('<I', len(header) + padding) + header + b' ' * padding)
+        for array in arrays.values():
+            f.write(array.tobytes())
+            f.write(b'\0' * (-array.nbytes % ALIGNMENT))
+    os.replace(temp_path, path)
+
+
+def _open(path):
+    """mmap 场景文件并解析头部，按修改时间缓存；文件不存在或格式不对时返回None"""
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        return None
+    with _lock:
+        cached = _mapped.get(path)
+        if cached is not None and cached[0] == mtime:
+            _mapped.move_to_end(path)
+            return cached[1], cached[2]
+    try:
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError) as e:
+        print(f"打开场景文件失败 {path}: {e}")
+        return None
+    try:
+        if mapped[:len(MAGIC)] != MAGIC:
+            raise ValueError("文件头不匹配")
+        header_size = struct.unpack_from('<I', mapped, len(MAGIC))[0]
+        start = len(MAGIC) + 4
+        header = json.loads(bytes(mapped[start:start + header_size]).decode('utf-8'))
+        header['data_offset'] = start + header_size
+    except (struct.error, ValueError) as e:
+        # 格式不对的文件不会被缓存，这里关闭 mmap，否则映射要等垃圾回收才释放
+        print(f"场景文件格式不对 {path}: {e}")
+        mapped.close()
+        return None
+    with _lock:
+        _mapped[path] = (mtime, header, mapped)
+        _mapped.move_to_end(path)
+        while len(_mapped) > SCENE_STORE_OPEN:
+            _mapped.popitem(last=False)
+    return header, mapped
+
+
+def _view(header, mapped, name):
+    dtype, shape, offset = header['arrays'][name]
+    count = int(np.prod(shape))
+    return np.frombuffer(mapped, dtype=dtype, count=count, offset=header['data_offset'] + offset).reshape(shape)
+
+
+def _open_fresh(path):
+    """
+    打开未过期的场景文件，返回 (头部, mmap)，不存在、已过期或格式不对时返回None
+    补充分组会重写文件，有效期按头部记录的最早构建时间计算
+    """
+    try:
+        if time.time() - os.stat(path).st_mtime > SCENE_STORE_TTL:
+            return None
+    except OSError:
+        return None
+    opened = _open(path)
+    if opened is None or time.time() - opened[0].get('built_at', 0) > SCENE_STORE_TTL:
+        return None
+    return opened
+
+
+def _stored_groups(header):
+    # 没有记录分组的文件由旧版本写入，包含全部分组
+    return set(header.get('groups') or scene_groups(scene_builder.LAYERS))
+
+
+def load_scene(path, layers=scene_builder.DEFAULT_LAYERS):
+    """
+    从场景文件加载场景（按图层裁剪），文件不存在、已过期、格式不对或缺少请求需要的分组时返回None
+    房间几何统计和构件矩形直接由文件中的数组得到，不重新计算
+    """
+    opened = _open_fresh(path)
+    if opened is None:
+        return None
+    header, mapped = opened
+    layers = frozenset(layers)
+    if not scene_groups(layers) <= _stored_groups(header):
+        return None
+    unit_scale = header['unit_scale']
+    scene = {'unit_scale': unit_scale, 'layers': layers}
+
+    rooms = []
+    room_stats = geometry.room_stats([])
+    if layers & scene_builder.ROOM_LAYERS:
+        points = _view(header, mapped, 'room_points')
+        offsets = _view(header, mapped, 'room_offsets').tolist()
+        # 距离计算逐点在Python中进行，房间顶点转成元组列表
+        rooms = [dict(room, coordinates=[tuple(point) for point in points[begin:end].tolist()])
+                 for room, begin, end in zip(header['rooms'], offsets, offsets[1:])]
+        room_stats = {key: _view(header, mapped, f'room_{key}') for key in ('area', 'perimeter', 'centroid', 'bbox')}
+    scene['rooms'] = rooms
+    scene['room_coordinates'] = [room['coordinates'] for room in rooms]
+    scene['room_stats'] = room_stats
+
+    boxes = scene['boxes'] = {}
+    for family, _, _, _ in scene_builder.FAMILIES:
+        if scene_builder.FAMILY_LAYERS[family] not in layers:
+            scene[family] = []
+            continue
+        columns = _view(header, mapped, f'{family}_columns')
+        scene[family] = [dict(properties, **dict(zip(ITEM_COLUMNS, values)))
+                         for properties, values in zip(header['items'][family], columns.tolist())]
+        x, y, angle, length, width, scale_x, scale_y = columns.T
+        if family == 'parametric':
+            boxes[family] = geometry.oriented_boxes(x, y, length, width, angle, unit_scale, scale_x, scale_y,
+                                                    endpoint=True)
+        else:
+            boxes[family] = geometry.oriented_boxes(x, y, length, width, angle, unit_scale)
+    return scene
+
+
+def _trim(full, layers):
+    """把刚构建的场景（尚未绘制过）裁剪为请求的图层"""
+    layers = frozenset(layers)
+    scene = dict(full, layers=layers)
+    if not layers & scene_builder.ROOM_LAYERS:
+        scene.update(rooms=[], room_coordinates=[], room_stats=geometry.room_stats([]), walls=geometry.wall_graph([]))
+    scene['boxes'] = dict(full.get('boxes', {}))
+    for key in ('bboxes', 'spatial'):
+        scene.pop(key, None)
+    for family, _, _, _ in scene_builder.FAMILIES:
+        if scene_builder.FAMILY_LAYERS[family] not in layers:
+            scene[family] = []
+            scene['boxes'].pop(family, None)
+    return scene
+
+
+def _merge(stored, built, groups):
+    """已存储的场景与新构建的分组 groups 合并"""
+    scene = dict(built, layers=frozenset(stored['layers']) | frozenset(built['layers']))
+    if 'rooms' not in groups:
+        scene.pop('walls', None)
+        for key in ('rooms', 'room_coordinates', 'room_stats', 'walls'):
+            if key in stored:
+                scene[key] = stored[key]
+    scene['boxes'] = dict(built.get('boxes', {}))
+    for key in ('bboxes', 'spatial'):
+        scene.pop(key, None)
+    for family, _, _, _ in scene_builder.FAMILIES:
+        if family not in groups:
+            scene[family] = stored[family]
+            scene['boxes'].pop(family, None)
+            if family in stored.get('boxes', {}):
+                scene['boxes'][family] = stored['boxes'][family]
+    return scene
+
+
+def get_scene(url, layers, fetch):
+    """
+    按BimJson地址取场景：场景存储中有未过期且包含所需分组的文件时直接加载，
+    否则用 fetch() 取得BimJson，只构建缺少的分组，与已存储的分组合并后写入存储，再按请求的图层裁剪返回
+    """
+    if not SCENE_STORE_DIR or not url:
+        return scene_builder.build_scene(fetch(), layers=layers)
+    path = scene_path(url)
+    with metrics.stage('scene_load'):
+        scene = load_scene(path, layers)
+    metrics.record_cache('scene_store', scene is not None)
+    if scene is not None:
+        return scene
+
+    stored_groups, stored, built_at = set(), None, None
+    opened = _open_fresh(path)
+    if opened is not None:
+        stored_groups, built_at = _stored_groups(opened[0]), opened[0].get('built_at')
+        stored = load_scene(path, _group_layers(stored_groups))
+        if stored is None:
+            stored_groups = set()
+    missing = scene_groups(layers) - stored_groups
+    full = scene_builder.build_scene(fetch(), layers=_group_layers(missing))
+    if stored is not None:
+        full = _merge(stored, full, missing)
+    # 模型查询降级时部分构件是默认尺寸，不写入存储，下次请求重新查询
+    if 'catalog' in deadline.degraded():
+        return _trim(full, layers)
+    try:
+        write_scene(path, full, stored_groups | missing, built_at if stored is not None else None)
+    except OSError as e:
+        print(f"写入场景文件失败 {path}: {e}")
+        return _trim(full, layers)
+    return load_scene(path, layers) or _trim(full, layers)
@@ -0,0 +1,64 @@
+"""
+生产环境启动入口：用 gunicorn.conf.py 中的配置启动 gunicorn
+
+    python serve.py [其他 gunicorn 参数]
+
+- 预加载应用：matplotlib、字体和模型目录在主进程初始化一次，fork 出的worker写时复制共享这部分内存
+- worker 类型、数量和线程数由环境变量配置（见 gunicorn.conf.py）
+- worker 常驻内存超过水位线时处理完当前请求后平滑退出，由主进程重新拉起
+"""
+import gc
+import io
+import os
+import resource
+import sys
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gunicorn.conf.py')
+
+
+def warm_up():
+    """
+    在主进程中完成 fork 前的初始化：加载模型目录，绘制并编码一张小图，
+    让字体查找、文字排版和 Agg 渲染的缓存在主进程中建好，worker 不再各自重复；
+    用过的Figure留在Figure池中，worker 继承后直接借出
+    """
+    import catalog
+    import draw
+    import figpool
+    import geometry
+    import scene as scene_builder
+
+    catalog.warm_start()
+    scene = {'unit_scale': scene_builder.UNIT_SCALE, 'layers': scene_builder.DEFAULT_LAYERS,
+             'rooms': [], 'room_coordinates': [], 'hydropower': [], 'hard': [], 'parametric': []}
+    scene['room_stats'] = geometry.room_stats([])
+    fig, ax = draw.build_figure(scene)
+    ax.text(0, 0, '预热 0123456789cm', fontsize=10)
+    fig.savefig(io.BytesIO(), format='png', dpi=50)
+    figpool.release(fig)
+
+    # 预加载的对象移出垃圾回收的跟踪范围，避免 worker 中的回收扫描写入共享页面
+    gc.collect()
+    gc.freeze()
+
+
+def current_rss_mb():
+    """当前进程的常驻内存（MB）；不支持 /proc 的系统返回历史峰值"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux 单位为KB，macOS 为字节
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def main():
+    from gunicorn.app.wsgiapp import run
+    sys.argv = [sys.argv[0], '--config', CONFIG_PATH] + sys.argv[1:] + ['main:app']
+    run()
+
+
+if __name__ == '__main__':
+    main()
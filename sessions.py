@@ -0,0 +1,229 @@
+import base64
+import io
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+import check
+import draw
+import labels
+import metrics
+import scene as scene_builder
+
+# 编辑会话：服务端保留一个方案的Figure和不含被移动构件的背景位图，
+# 客户端每次只提交变动的 moveableMeshList / cab_data_list 条目，只重绘这些构件。
+# 会话保存在worker进程内存中，多worker部署时需要按 session_id 做会话保持；
+# 找不到会话（过期、被淘汰或落到其他worker）时返回404，客户端重新创建即可。
+# 每个会话持有画布位图和背景位图（各 宽×高×4 字节，14x12英寸的画布在100dpi时约13MB，300dpi时约120MB），
+# 按总字节数做LRU淘汰；上限应明显低于 gunicorn 的内存水位线（FLOORPLAN_MAX_RSS_MB），
+# 否则 worker 被平滑重启时会丢掉其上的全部会话
+SESSION_CACHE_MB = float(os.environ.get('FLOORPLAN_SESSION_CACHE_MB', 256))
+SESSION_TTL = float(os.environ.get('FLOORPLAN_SESSION_TTL', 900))
+DEFAULT_DPI = 100
+# 请求中 dpi 的上限，超过时按上限渲染（会话保留整张位图，dpi 过大时内存占用失控）
+MAX_DPI = int(os.environ.get('FLOORPLAN_SESSION_MAX_DPI', 300))
+
+_sessions = OrderedDict()
+_sessions_lock = threading.Lock()
+
+
+def parse_dpi(value):
+    """解析请求中的 dpi 参数，为空时返回 DEFAULT_DPI，超过 MAX_DPI 时取 MAX_DPI；格式错误时抛出 ValueError"""
+    if value is None or value == '':
+        return DEFAULT_DPI
+    try:
+        dpi = int(value)
+    except (TypeError, ValueError):
+        raise ValueError("dpi 应为正整数")
+    if dpi <= 0:
+        raise ValueError("dpi 应为正整数")
+    return min(dpi, MAX_DPI)
+
+
+class VersionConflict(Exception):
+    """编辑请求的 version 与会话当前版本不一致"""
+
+    def __init__(self, version):
+        super().__init__(f"version conflict: 会话当前版本为 {version}")
+        self.version = version
+
+
+def encode_canvas(fig):
+    """把已绘制的画布编码为base64 PNG（低压缩级别，优先速度）"""
+    buf = io.BytesIO()
+    Image.fromarray(np.asarray(fig.canvas.buffer_rgba())).save(buf, format='PNG', compress_level=1)
+    return base64.b64encode(buf.getvalue()).decode('utf-8')
+
+
+def raw_entries(bimjson):
+    """按 (类别, id, instance) 索引BimJson中三类构件的原始条目"""
+    entries = {}
+    for family, mode_key, list_key, id_key in scene_builder.FAMILIES:
+        items = bimjson.get(mode_key, {}).get(list_key, [])
+        for item, instance in zip(items, check.assign_instances(items, id_key)):
+            entries[(family, str(item.get(id_key)), instance)] = item
+    return entries
+
+
+def create_session(bimjson, dpi=DEFAULT_DPI, layers=scene_builder.DEFAULT_LAYERS):
+    """创建编辑会话并完整绘制一次，返回 (session, image_data)"""
+    with metrics.stage('session_create'):
+        modes = [mode_key for family, mode_key, _, _ in scene_builder.FAMILIES
+                 if scene_builder.FAMILY_LAYERS[family] in layers]
+        model_dict = {}
+        if modes:
+            model_dict = check.index_models(check.get_model(check.collect_model_ids(bimjson, modes)))
+        scene = scene_builder.build_scene(bimjson, model_dict, layers)
+        artists = {}
+        # 不传 dpi：会话图不做细节层次简化，没有聚合标记；尺寸线只与墙有关，构件移动后不变
+        fig, ax = draw.build_figure(scene, artists)
+        # 标注随构件移动重新放置，不进入背景
+        label_layer = artists.pop('labels', None)
+        # 每个构件的距离线与矩形一样，编辑后随构件单独重绘
+        clearances = artists.pop('clearances', {})
+        if label_layer is not None:
+            label_layer.set_animated(True)
+        # Figure由会话长期持有，不归还Figure池；Agg画布支持背景缓存和局部重绘
+        fig.set_dpi(dpi)
+        fig.canvas.draw()
+        if label_layer is not None:
+            ax.draw_artist(label_layer)
+        image_data = encode_canvas(fig)
+
+        session = {
+            'id': uuid.uuid4().hex,
+            'version': 1,
+            'fig': fig,
+            'ax': ax,
+            'unit_scale': scene['unit_scale'],
+            'layers': scene['layers'],
+            'models': model_dict,
+            'entries': raw_entries(bimjson),
+            'artists': artists,
+            'clearances': clearances,
+            'wall_edges': draw.scene_wall_edges(scene) if 'clearances' in scene['layers'] else [],
+            'labels': label_layer,
+            # 被编辑过的构件单独绘制，不进入背景
+            'dynamic': set(),
+            'background': None,
+            'lock': threading.Lock(),
+            'touched': time.time(),
+        }
+    width, height = fig.canvas.get_width_height()
+    session['bytes'] = width * height * 4 * 2
+    limit = SESSION_CACHE_MB * 1024 * 1024
+    with _sessions_lock:
+        _sessions[session['id']] = session
+        # 最新的会话总是保留，即使单个会话已超过上限
+        while len(_sessions) > 1 and sum(s['bytes'] for s in _sessions.values()) > limit:
+            _sessions.popitem(last=False)
+    return session, image_data
+
+
+def get_session(session_id):
+    """取出会话并刷新其使用时间，不存在或已过期时返回None"""
+    now = time.time()
+    with _sessions_lock:
+        for expired in [sid for sid, s in _sessions.items() if now - s['touched'] > SESSION_TTL]:
+            del _sessions[expired]
+        session = _sessions.get(session_id)
+        if session is not None:
+            session['touched'] = now
+            _sessions.move_to_end(session_id)
+        return session
+
+
+def close_session(session_id):
+    with _sessions_lock:
+        return _sessions.pop(session_id, None) is not None
+
+
+def apply_edits(session, edits):
+    """
+    按变动条目更新会话中的构件，返回 (image_data, 重绘的构件数, 编辑后的版本号)
+    edits 与BimJson结构一致，例如 {"hardMode": {"moveableMeshList": [...]}}；
+    条目用 id（参数化模型为 ContentItemID）和 instance（默认0）定位，
+    只需提供变动的字段；带 "deleted": true 时删除该构件
+    edits 带 version 时须与会话当前版本一致，否则抛出 VersionConflict（在会话锁内比较，并发编辑只有一个成功）
+    """
+    with metrics.stage('session_edit'), session['lock']:
+        if edits.get('version') is not None and edits.get('version') != session['version']:
+            raise VersionConflict(session['version'])
+        ax = session['ax']
+        changes = []
+        for family, mode_key, list_key, id_key in scene_builder.FAMILIES:
+            if scene_builder.FAMILY_LAYERS[family] not in session['layers']:
+                continue
+            for entry in (edits.get(mode_key) or {}).get(list_key) or []:
+                key = (family, str(entry.get(id_key)), entry.get('instance', 0))
+                changes.append((family, key, entry))
+
+        # 新出现的模型id补查一次模型接口
+        missing = [key[1] for _, key, entry in changes
+                   if not entry.get('deleted') and key[1] not in session['models']]
+        if missing:
+            session['models'].update(check.index_models(check.get_model(missing)))
+
+        label_layer = session['labels']
+        background_stale = session['background'] is None
+        for family, key, entry in changes:
+            old = session['artists'].pop(key, None)
+            if old is not None:
+                old.remove()
+            for artist in session['clearances'].pop(key, []):
+                artist.remove()
+            if key not in session['dynamic']:
+                # 该构件原本画在背景里，需要重新生成一次背景
+                session['dynamic'].add(key)
+                background_stale = True
+            if label_layer is not None:
+                label_layer.set_label(key, None)
+            if entry.get('deleted'):
+                session['entries'].pop(key, None)
+                continue
+
+            merged = dict(session['entries'].get(key, {}), **entry)
+            merged['instance'] = key[2]
+            session['entries'][key] = merged
+            for item in scene_builder.resolve_items(family, [merged], session['models']):
+                rect = draw.draw_scene_item(ax, item, family, session['unit_scale'])
+                rect.set_animated(True)
+                session['artists'][key] = rect
+                if 'clearances' in session['layers'] and draw.has_clearances(item, family):
+                    box = draw.item_boxes([item], family, session['unit_scale'])
+                    lines = draw.draw_clearance_segments(ax, draw.clearance_segments(
+                        box['center'][0], box['corners'][0], session['wall_edges']))
+                    for artist in lines:
+                        artist.set_animated(True)
+                    session['clearances'][key] = lines
+                if label_layer is not None:
+                    corners = draw.get_item_corners(item, family, session['unit_scale'])
+                    xs, ys = [p[0] for p in corners], [p[1] for p in corners]
+                    label_layer.set_label(key, labels.item_candidate(item['label'],
+                                                                     (min(xs), min(ys), max(xs), max(ys))))
+
+        fig = session['fig']
+        if background_stale:
+            # animated 的构件不参与完整绘制，绘制结果即为背景
+            fig.canvas.draw()
+            session['background'] = fig.canvas.copy_from_bbox(fig.bbox)
+        else:
+            fig.canvas.restore_region(session['background'])
+        for key in session['dynamic']:
+            artist = session['artists'].get(key)
+            if artist is not None:
+                ax.draw_artist(artist)
+            for artist in session['clearances'].get(key, []):
+                ax.draw_artist(artist)
+        if label_layer is not None:
+            if changes:
+                label_layer.place()
+            ax.draw_artist(label_layer)
+
+        session['version'] += 1
+        return encode_canvas(fig), len(changes), session['version']
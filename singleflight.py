@@ -0,0 +1,86 @@
+import threading
+import time
+from concurrent.futures import Future
+
+import metrics
+
+# 进程内的请求合并：同一key的并发调用只真正执行一次，其余调用等待并共享结果。
+# 只合并正在进行中的调用，完成后不缓存结果；共享的结果对象调用方不应修改。
+_calls = {}  # key → Future
+_lock = threading.Lock()
+
+
+def do(key, fn, timeout=None):
+    """
+    key 相同的并发调用只执行一次 fn()，返回（或抛出）同一个结果
+    timeout: 等待其他调用结果的上限（秒），超时抛出 TimeoutError
+    """
+    with _lock:
+        future = _calls.get(key)
+        leader = future is None
+        if leader:
+            future = _calls[key] = Future()
+    metrics.record_cache(f'singleflight_{key[0]}', not leader)
+    if not leader:
+        return future.result(timeout=timeout)
+
+    try:
+        result = fn()
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        with _lock:
+            _calls.pop(key, None)
+
+
+def do_many(namespace, ids, fetch, timeout=None):
+    """
+    按id合并并发的批量请求：其他调用正在请求的id直接等待其结果，剩余id由本调用一次性请求
+    fetch(ids) 返回 {str(id): 结果}，缺失的id结果为None
+    timeout: 等待其他调用结果的上限（秒），超时的id按未找到处理
+    返回 {str(id): 结果}
+    """
+    own, waiting = {}, {}
+    with _lock:
+        for item_id in dict.fromkeys(ids):
+            key = (namespace, str(item_id))
+            future = _calls.get(key)
+            if future is None:
+                own[item_id] = _calls[key] = Future()
+            else:
+                waiting[item_id] = future
+    for _ in own:
+        metrics.record_cache(f'singleflight_{namespace}', False)
+    for _ in waiting:
+        metrics.record_cache(f'singleflight_{namespace}', True)
+
+    if own:
+        try:
+            fetched = fetch(list(own)) or {}
+        except BaseException as e:
+            for future in own.values():
+                future.set_exception(e)
+            raise
+        else:
+            for item_id, future in own.items():
+                future.set_result(fetched.get(str(item_id)))
+        finally:
+            with _lock:
+                for item_id in own:
+                    _calls.pop((namespace, str(item_id)), None)
+
+    results = {}
+    deadline = None if timeout is None else time.monotonic() + timeout
+    for item_id, future in list(own.items()) + list(waiting.items()):
+        try:
+            left = None if deadline is None else max(0.0, deadline - time.monotonic())
+            results[str(item_id)] = future.result(timeout=left)
+        except Exception as e:
+            # 其他调用的请求失败时按未找到处理
+            print(f"等待合并请求失败: {namespace} {item_id}: {e}")
+            results[str(item_id)] = None
+    return results
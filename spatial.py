@@ -0,0 +1,95 @@
+import math
+
+import numpy as np
+
+# 均匀网格空间索引：按包围盒把构件放入网格，查询时只检查与查询框相交的网格
+# 包围盒格式统一为 [xmin, ymin, xmax, ymax]
+
+
+def build_grid(bboxes, cell_size=None):
+    """
+    为一组包围盒建立网格索引
+    bboxes: (N, 4) 数组
+    cell_size: 网格边长，为None时按包围盒范围和数量估算
+    """
+    bboxes = np.asarray(bboxes, dtype=float).reshape(-1, 4)
+    grid = {'bboxes': bboxes, 'cells': {}, 'cell_size': 1.0, 'origin': (0.0, 0.0)}
+    if len(bboxes) == 0:
+        return grid
+
+    x0, y0 = bboxes[:, 0].min(), bboxes[:, 1].min()
+    x1, y1 = bboxes[:, 2].max(), bboxes[:, 3].max()
+    if cell_size is None:
+        # 平均每个网格约放4个构件，且网格不小于构件的中位尺寸
+        area = max((x1 - x0) * (y1 - y0), 1.0)
+        sizes = np.maximum(bboxes[:, 2] - bboxes[:, 0], bboxes[:, 3] - bboxes[:, 1])
+        cell_size = max(math.sqrt(area * 4 / len(bboxes)), float(np.median(sizes)), 1.0)
+    grid['cell_size'] = cell_size
+    grid['origin'] = (x0, y0)
+
+    i0 = np.floor((bboxes[:, 0] - x0) / cell_size).astype(int)
+    j0 = np.floor((bboxes[:, 1] - y0) / cell_size).astype(int)
+    i1 = np.floor((bboxes[:, 2] - x0) / cell_size).astype(int)
+    j1 = np.floor((bboxes[:, 3] - y0) / cell_size).astype(int)
+    cells = grid['cells']
+    for index in range(len(bboxes)):
+        for i in range(i0[index], i1[index] + 1):
+            for j in range(j0[index], j1[index] + 1):
+                cells.setdefault((i, j), []).append(index)
+    return grid
+
+
+def query_grid(grid, bbox):
+    """返回包围盒与 bbox 相交的构件下标（升序数组）"""
+    bboxes = grid['bboxes']
+    if len(bboxes) == 0:
+        return np.zeros(0, dtype=int)
+    qx0, qy0, qx1, qy1 = bbox
+    x0, y0 = grid['origin']
+    size = grid['cell_size']
+    i0, i1 = math.floor((qx0 - x0) / size), math.floor((qx1 - x0) / size)
+    j0, j1 = math.floor((qy0 - y0) / size), math.floor((qy1 - y0) / size)
+
+    if (i1 - i0 + 1) * (j1 - j0 + 1) >= len(grid['cells']):
+        # 查询框覆盖大部分网格时直接全量比较
+        candidates = np.arange(len(bboxes))
+    else:
+        found = set()
+        for i in range(i0, i1 + 1):
+            for j in range(j0, j1 + 1):
+                found.update(grid['cells'].get((i, j), ()))
+        candidates = np.fromiter(sorted(found), dtype=int, count=len(found))
+    if len(candidates) == 0:
+        return candidates
+
+    boxes = bboxes[candidates]
+    hit = (boxes[:, 0] <= qx1) & (boxes[:, 2] >= qx0) & (boxes[:, 1] <= qy1) & (boxes[:, 3] >= qy0)
+    return candidates[hit]
+
+
+def new_hash(cell_size):
+    """新建可逐个插入的空间哈希，用于标注等增量放置的碰撞检测"""
+    return {'cell_size': float(cell_size), 'cells': {}}
+
+
+def _hash_cells(spatial_hash, bbox):
+    size = spatial_hash['cell_size']
+    for i in range(math.floor(bbox[0] / size), math.floor(bbox[2] / size) + 1):
+        for j in range(math.floor(bbox[1] / size), math.floor(bbox[3] / size) + 1):
+            yield (i, j)
+
+
+def hash_collides(spatial_hash, bbox):
+    """bbox 是否与已插入的任一包围盒相交"""
+    cells = spatial_hash['cells']
+    for cell in _hash_cells(spatial_hash, bbox):
+        for other in cells.get(cell, ()):
+            if other[0] < bbox[2] and other[2] > bbox[0] and other[1] < bbox[3] and other[3] > bbox[1]:
+                return True
+    return False
+
+
+def hash_insert(spatial_hash, bbox):
+    cells = spatial_hash['cells']
+    for cell in _hash_cells(spatial_hash, bbox):
+        cells.setdefault(cell, []).append(bbox)
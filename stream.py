@@ -0,0 +1,51 @@
+import json
+import time
+
+import deadline
+import draw
+import metrics
+import scene as scene_builder
+
+# 渐进式平面图（Server-Sent Events）：房间轮廓解析完成后立即发送底图，
+# 之后每类构件的模型查询完成时发送只含该类构件的透明叠加层。
+# 叠加层与底图的画布尺寸、坐标区域和坐标轴范围一致，客户端按到达顺序叠放即得到完整平面图。
+# 坐标轴范围只按房间轮廓确定，超出房间范围的构件会被裁掉。
+
+
+def sse_event(event, data):
+    """编码一条SSE消息"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def stream_floorplan(bimjson, layers=scene_builder.DEFAULT_LAYERS, pixel_size=None):
+    """
+    依次产出SSE消息：
+    rooms   {'image_data', 'rooms'}            底图
+    family  {'family', 'count', 'image_data'}  一类构件的叠加层
+    done    {'families', 'degraded'}           各类构件数量和降级标记（见 deadline）
+    error   {'error'}                          中途失败，之后不再有消息
+    """
+    start = time.perf_counter()
+    dpi = draw.output_dpi(pixel_size)
+    counts = {}
+    try:
+        steps = scene_builder.build_scene_steps(bimjson, layers=layers)
+        _, scene = next(steps)
+        # 底图用场景快照绘制：此时构件列表为空，绘图缓存不能写回场景
+        image_data, frame = draw.plot_base(dict(scene), dpi)
+        metrics.observe_stage('first_paint', start)
+        yield sse_event('rooms', {'image_data': image_data, 'rooms': len(scene['rooms'])})
+
+        for family, scene in steps:
+            counts[family] = len(scene[family])
+            yield sse_event('family', {
+                'family': family,
+                'count': counts[family],
+                'image_data': draw.plot_overlay(scene, family, frame, dpi),
+            })
+    except Exception as e:
+        print(f"渐进式平面图生成失败: {e}")
+        yield sse_event('error', {'error': str(e)})
+        return
+    metrics.observe_stage('total', start)
+    yield sse_event('done', {'families': counts, 'degraded': deadline.degraded()})
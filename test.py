@@ -515,8 +515,10 @@ def plot_room_with_furniture():
     # 收集所有房间坐标用于距离计算
     all_room_coordinates = []
 
+    bimjson = check.get_bim_json()
+
     # 绘制房间轮廓和边长
-    for i, room in enumerate(check.get_roomList()):
+    for i, room in enumerate(check.get_roomList(bimjson)):
         room_id = room['SpaceId']
         room_name = room['Name']
         points = room['points']
@@ -553,7 +555,7 @@ def plot_room_with_furniture():
         )
 
     # # 绘制普通插座（hydropowerMode）
-    for item in check.get_hydropowerModeList():
+    for item in check.get_hydropowerModeList(bimjson):
         if not item:
             continue
 
@@ -568,7 +570,7 @@ def plot_room_with_furniture():
         draw_furniture(ax, loc[0], loc[1], length, width, rot, 'blue', name, unit_scale)
 
     # 绘制硬件设备（hardMode）
-    for item in check.get_hardModeList():
+    for item in check.get_hardModeList(bimjson):
         if not item:
             continue
 
@@ -587,7 +589,7 @@ def plot_room_with_furniture():
         # draw_distance_lines(ax, item, all_room_coordinates, unit_scale)
 
     # 绘制参数化模型（NewWHCMode）
-    for item in check.get_NewWHCModeList():
+    for item in check.get_NewWHCModeList(bimjson):
         if not item:
             continue
 
@@ -631,18 +633,18 @@ def plot_room_with_furniture():
     plt.ylabel('Y坐标（cm）', fontsize=12)
 
     # 调整坐标轴范围
-    all_points = [p for room in check.get_roomList() for p in parse_points(room['points'])]
-    all_points += [parse_location(item.get('location', '')) for item in check.get_hydropowerModeList() if item]
-    all_points += [parse_location(item.get('location', '')) for item in check.get_hardModeList() if item]
+    all_points = [p for room in check.get_roomList(bimjson) for p in parse_points(room['points'])]
+    all_points += [parse_location(item.get('location', '')) for item in check.get_hydropowerModeList(bimjson) if item]
+    all_points += [parse_location(item.get('location', '')) for item in check.get_hardModeList(bimjson) if item]
 
     if all_points:
         all_x = [p[0] for p in all_points]
         all_y = [p[1] for p in all_points]
         max_size = max(
-            [float(item.get('length', 0)) * unit_scale for item in check.get_hydropowerModeList() if item] +
-            [float(item.get('width', 0)) * unit_scale for item in check.get_hydropowerModeList() if item] +
-            [float(item.get('length', 0)) * unit_scale for item in check.get_hardModeList() if item] +
-            [float(item.get('width', 0)) * unit_scale for item in check.get_hardModeList() if item] +
+            [float(item.get('length', 0)) * unit_scale for item in check.get_hydropowerModeList(bimjson) if item] +
+            [float(item.get('width', 0)) * unit_scale for item in check.get_hydropowerModeList(bimjson) if item] +
+            [float(item.get('length', 0)) * unit_scale for item in check.get_hardModeList(bimjson) if item] +
+            [float(item.get('width', 0)) * unit_scale for item in check.get_hardModeList(bimjson) if item] +
             [50]
         )
         plt.xlim(min(all_x) - max_size, max(all_x) + max_size)
@@ -0,0 +1,54 @@
+"""BimJson下载失败回归检查：python -m pytest tests"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+
+import check
+import main
+import scenestore
+
+
+def test_bim_timeout_returns_504_without_refetch(monkeypatch):
+    """BimJson下载超时时只下载一次，返回504并标记 bim 降级"""
+    calls = []
+
+    def get(url, **kwargs):
+        calls.append(url)
+        raise requests.exceptions.Timeout('read timed out')
+
+    monkeypatch.setattr(check.requests, 'get', get)
+    monkeypatch.setattr(scenestore, 'SCENE_STORE_DIR', '')
+    response = main.app.test_client().post('/generate-floorplan', json={'url': 'http://example.invalid/bim.json'})
+    assert response.status_code == 504
+    assert response.json['degraded'] == ['bim']
+    assert response.headers['X-Floorplan-Degraded'] == 'bim'
+    assert len(calls) == 1
+
+
+def test_tile_fetch_failure_returns_502_uncached(monkeypatch):
+    """瓦片的BimJson下载失败时返回502 JSON错误，且不允许缓存"""
+    def get(url, **kwargs):
+        raise requests.exceptions.ConnectionError('connection refused')
+
+    monkeypatch.setattr(check.requests, 'get', get)
+    monkeypatch.setattr(scenestore, 'SCENE_STORE_DIR', '')
+    response = main.app.test_client().get('/tiles/0/0/0.png?url=http://example.invalid/tile.json')
+    assert response.status_code == 502
+    assert 'error' in response.json
+    assert response.headers['Cache-Control'] == 'no-store'
+
+
+def test_diff_names_the_side_that_failed(monkeypatch):
+    """/diff 中某个版本的地址下载失败时返回502，并指明是 before 还是 after"""
+    def get(url, **kwargs):
+        raise requests.exceptions.ConnectionError('connection refused')
+
+    monkeypatch.setattr(check.requests, 'get', get)
+    response = main.app.test_client().post('/diff', json={'before': 'http://example.invalid/before.json',
+                                                          'after': {'layoutMode': {'roomList': []}}})
+    assert response.status_code == 502
+    assert response.json['side'] == 'before'
+    assert response.json['error'].startswith('before: ')
@@ -0,0 +1,51 @@
+"""模型查询降级回归检查：python -m pytest tests"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import catalog
+import check
+import deadline
+
+
+def _fresh_catalog(monkeypatch, tmp_path):
+    monkeypatch.setattr(catalog, 'CATALOG_DB_PATH', str(tmp_path / 'catalog.sqlite3'))
+    monkeypatch.setattr(catalog, 'CATALOG_REFRESH_INTERVAL', 0)
+    for name in ('_models', '_fetched_at', '_missing'):
+        monkeypatch.setattr(catalog, name, {})
+    monkeypatch.setattr(catalog, '_state', {'loaded': False, 'synced_at': 0.0, 'missing_synced_at': 0.0,
+                                            'thread_pid': None})
+
+
+def test_unknown_id_is_not_degraded_and_not_refetched(monkeypatch, tmp_path):
+    """模型接口正常返回但不含的id不算降级，也不在每次请求时重新查询"""
+    _fresh_catalog(monkeypatch, tmp_path)
+    posted = []
+
+    def post(id_list, timeout):
+        posted.append(list(id_list))
+        return [{'id': 1, 'length': 100, 'width': 50}]
+
+    monkeypatch.setattr(check, '_post_models', post)
+    for _ in range(3):
+        deadline.start(None)
+        models = check.get_model([1, 999999])
+        assert [model['id'] for model in models] == [1]
+        assert deadline.degraded() == {}
+    assert posted == [[1, 999999]]
+
+
+def test_failed_lookup_is_degraded(monkeypatch, tmp_path):
+    """模型接口失败时缺少尺寸的id记为降级，且不记为不存在"""
+    _fresh_catalog(monkeypatch, tmp_path)
+
+    def post(id_list, timeout):
+        raise ValueError('模型接口返回异常')
+
+    monkeypatch.setattr(check, '_post_models', post)
+    monkeypatch.setattr(check.resilience, '_breaker', {'failures': 0, 'opened_at': None, 'trial_running': False})
+    deadline.start(None)
+    assert check.get_model([2]) == []
+    assert deadline.degraded() == {'catalog': 1}
+    assert catalog._missing == {}
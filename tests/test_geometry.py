@@ -0,0 +1,53 @@
+"""墙体图回归检查：python -m pytest tests"""
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+
+import draw
+import geometry
+
+
+def _sample_rooms():
+    with open(os.path.join(ROOT, 'Room.json'), encoding='utf-8') as f:
+        rooms = json.load(f)
+    return [room['Name'] for room in rooms], [draw.parse_points(room['points']) for room in rooms]
+
+
+def test_sample_walls_are_paired_across_thickness():
+    """示例户型相邻房间之间有 10-24cm 的墙厚，两侧边界应配对为共用墙"""
+    names, polygons = _sample_rooms()
+    walls = geometry.wall_graph(polygons)
+    pairs = {frozenset((names[a], names[b])) for a, b in walls['adjacency'].tolist()}
+    assert frozenset(('储物间', '主卧')) in pairs
+    assert frozenset(('次卧', '客厅')) in pairs
+    # 储物间 / 主卧 之间的墙：中心线 y=5.125，延伸到 x=568.75，墙厚 10cm
+    shared = walls['shared'] & np.isclose(walls['starts'][:, 1], 5.125) & np.isclose(walls['ends'][:, 1], 5.125)
+    assert shared.sum() == 1
+    assert np.isclose(walls['ends'][shared, 0].max(), 568.75)
+    assert np.isclose(walls['thickness'][shared], 10).all()
+    # 房间边界不变：距离线和净空检查仍按墙体内侧表面计算
+    assert len(walls['faces']['starts']) == len(geometry.wall_graph(polygons, thickness=0)['starts'])
+
+
+def test_thick_wall_grid():
+    """2x2 房间，墙厚 20cm：4 段共用墙，未重叠的部分仍为单侧墙"""
+    size, gap = 300, 20
+    polygons = []
+    for row in range(2):
+        for col in range(2):
+            x, y = col * (size + gap), row * (size + gap)
+            polygons.append([(x, y), (x + size, y), (x + size, y + size), (x, y + size)])
+    walls = geometry.wall_graph(polygons)
+    assert sorted(map(tuple, walls['adjacency'].tolist())) == [(0, 1), (0, 2), (1, 3), (2, 3)]
+    assert np.allclose(walls['adjacency_lengths'], size)
+    assert np.allclose(walls['thickness'][walls['shared']], gap)
+    # 共用墙在两侧边界中间
+    centers = np.concatenate([walls['starts'][walls['shared']], walls['ends'][walls['shared']]])
+    assert np.isclose(centers, size + gap / 2).any(axis=1).all()
+    # 超过最大墙厚时不配对
+    assert len(geometry.wall_graph(polygons, thickness=gap - 1)['adjacency']) == 0
@@ -0,0 +1,48 @@
+"""熔断器回归检查：python -m pytest tests"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import check
+import deadline
+import resilience
+
+
+def _half_open(monkeypatch):
+    monkeypatch.setattr(resilience, '_breaker', {'failures': resilience.BREAKER_FAILURES, 'trial_running': False,
+                                                 'opened_at': time.monotonic() - resilience.BREAKER_COOLDOWN - 1})
+    assert resilience.breaker_state() == 'half_open'
+
+
+def test_breaker_recovers_after_budget_timeout_trial(monkeypatch):
+    """半开试探请求因延迟预算不足超时后，下一个请求仍可试探，成功后熔断器恢复"""
+    _half_open(monkeypatch)
+
+    def timed_out(id_list, timeout):
+        raise TimeoutError('budget')
+
+    monkeypatch.setattr(check, '_post_models', timed_out)
+    deadline.start(0.5)
+    assert check.fetch_models([1]) is None
+    assert resilience.breaker_state() == 'half_open'
+    assert not resilience._breaker['trial_running']
+
+    monkeypatch.setattr(check, '_post_models', lambda id_list, timeout: [{'id': 1}])
+    deadline.start(None)
+    assert check.fetch_models([1]) == [{'id': 1}]
+    assert resilience.breaker_state() == 'closed'
+
+
+def test_breaker_reopens_after_failed_trial(monkeypatch):
+    """试探请求真正失败时重新熔断"""
+    _half_open(monkeypatch)
+
+    def failed(id_list, timeout):
+        raise ValueError('模型接口返回异常')
+
+    monkeypatch.setattr(check, '_post_models', failed)
+    deadline.start(None)
+    assert check.fetch_models([1]) is None
+    assert resilience.breaker_state() == 'open'
@@ -0,0 +1,75 @@
+"""编辑会话回归检查：python -m pytest tests"""
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+import check
+import sessions
+from benchmarks import synthetic
+
+
+def _session(monkeypatch, layers):
+    bim, catalog = synthetic.generate_bim(rooms=4, vertices=4, hard=3, hydropower=0, parametric=0, seed=1)
+    monkeypatch.setattr(check, 'DUMP_JSON', False)
+    monkeypatch.setattr(check, 'get_model', lambda ids, *args: [catalog[str(i)] for i in ids if str(i) in catalog])
+    session, _ = sessions.create_session(bim, layers=frozenset(layers))
+    return bim, session
+
+
+def _segments(artists):
+    return [np.asarray(artist.get_segments()).round(3).tolist() for artist in artists if hasattr(artist, 'get_segments')]
+
+
+def test_moved_device_redraws_its_clearances(monkeypatch):
+    """移动设备后其距离线随之重绘，旧的距离线从图中移除"""
+    bim, session = _session(monkeypatch, {'rooms', 'hard', 'clearances'})
+    key = next(key for key in session['artists'] if key[0] == 'hard' and session['clearances'].get(key))
+    old = session['clearances'][key]
+    entry = bim['hardMode']['moveableMeshList'][[str(item['id']) for item in
+                                                 bim['hardMode']['moveableMeshList']].index(key[1])]
+    x, y = [float(part.split('=')[1]) for part in entry['location'].split()[:2]]
+    moved = {'id': entry['id'], 'instance': key[2], 'location': f'X={x + 10} Y={y} Z=0'}
+    sessions.apply_edits(session, {'hardMode': {'moveableMeshList': [moved]}})
+
+    new = session['clearances'][key]
+    assert new and all(artist.get_animated() for artist in new)
+    assert _segments(new) != _segments(old)
+    assert all(artist.axes is None for artist in old)
+
+
+def test_concurrent_edits_with_same_version_conflict(monkeypatch):
+    """携带相同 version 的并发编辑只有一个成功，其余返回版本冲突"""
+    bim, session = _session(monkeypatch, {'rooms', 'hard'})
+    entry = bim['hardMode']['moveableMeshList'][0]
+    barrier = threading.Barrier(4)
+    outcomes = []
+
+    def edit(n):
+        barrier.wait()
+        try:
+            sessions.apply_edits(session, {'version': 1, 'hardMode': {'moveableMeshList': [
+                {'id': entry['id'], 'location': f'X={n * 10} Y=0 Z=0'}]}})
+            outcomes.append('ok')
+        except sessions.VersionConflict as e:
+            outcomes.append(e.version)
+
+    threads = [threading.Thread(target=edit, args=(n,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(outcomes, key=str) == [2, 2, 2, 'ok']
+    assert session['version'] == 2
+
+
+def test_sessions_are_evicted_by_total_bytes(monkeypatch):
+    """会话按位图总字节数淘汰，最新的会话总是保留"""
+    monkeypatch.setattr(sessions, '_sessions', sessions.OrderedDict())
+    _, first = _session(monkeypatch, {'rooms'})
+    monkeypatch.setattr(sessions, 'SESSION_CACHE_MB', first['bytes'] * 1.5 / 1024 / 1024)
+    _, second = _session(monkeypatch, {'rooms'})
+    assert list(sessions._sessions) == [second['id']]
@@ -0,0 +1,121 @@
+import io
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import deadline
+import draw
+import figpool
+import metrics
+import scenestore
+
+# 平面图瓦片（z/x/y）：以BimJson坐标原点为基准，第 z 级瓦片边长为 TILE_WORLD_CM / 2^z（cm），
+# 瓦片 (x, y) 覆盖 X∈[x·边长, (x+1)·边长)、Y∈[y·边长, (y+1)·边长)（BimJson坐标，Y向下增大，与地图瓦片行号方向一致），
+# x、y 可以为负。每个瓦片只绘制空间索引中与其相交的房间和构件，按瓦片分辨率做细节层次简化；
+# 标注按瓦片单独放置，跨瓦片边界的标注可能被截断。
+# 渲染结果按 (方案, 图层, z, x, y) 缓存在进程内，按总字节数做LRU淘汰；场景文件更新后旧瓦片自动失效，
+# 未启用场景存储（没有场景文件版本）时不缓存。
+
+# 瓦片像素边长
+TILE_PIXELS = int(os.environ.get('FLOORPLAN_TILE_PX', 256))
+# 第0级瓦片的边长（cm）
+TILE_WORLD_CM = float(os.environ.get('FLOORPLAN_TILE_WORLD_CM', 16384))
+TILE_MAX_ZOOM = int(os.environ.get('FLOORPLAN_TILE_MAX_ZOOM', 10))
+# 瓦片缓存上限（MB）
+TILE_CACHE_MB = float(os.environ.get('FLOORPLAN_TILE_CACHE_MB', 256))
+# 瓦片绘制时的分辨率；线宽、字号按磅计，与缩放级别无关
+TILE_DPI = 100
+# 进程内保留最近使用的场景数，同一方案的相邻瓦片复用场景及其空间索引
+TILE_SCENES = 8
+
+_cache = OrderedDict()  # 键 → PNG字节
+_scenes = OrderedDict()  # (地址, 图层, 版本) → 场景
+_cache_state = {'bytes': 0}
+_lock = threading.Lock()
+
+
+def tile_size(z):
+    """第 z 级瓦片的边长（cm）"""
+    return TILE_WORLD_CM / 2 ** z
+
+
+def tile_bounds(z, x, y):
+    """瓦片在绘图坐标（Y轴取反）下的范围 (xmin, ymin, xmax, ymax)"""
+    size = tile_size(z)
+    return (x * size, -(y + 1) * size, (x + 1) * size, -y * size)
+
+
+def render_tile(scene, z, x, y):
+    """绘制一个瓦片，返回PNG字节"""
+    start = time.perf_counter()
+    xmin, ymin, xmax, ymax = tile_bounds(z, x, y)
+    inches = TILE_PIXELS / TILE_DPI
+    fig = figpool.new_figure((inches, inches))
+    ax = fig.add_axes([0, 0, 1, 1])
+    ax.set_axis_off()
+    ax.set_xlim(xmin, xmax)
+    ax.set_ylim(ymin, ymax)
+    # 标注可能超出构件范围，裁剪范围四周各放宽10%
+    margin = (xmax - xmin) * 0.1
+    cull_box = (xmin - margin, ymin - margin, xmax + margin, ymax + margin)
+    scale = TILE_PIXELS / (xmax - xmin)
+    draw.draw_scene(fig, ax, scene, ((xmin, xmax), (ymin, ymax)), cull_box, scale, TILE_DPI)
+    metrics.observe_stage('tile_draw', start)
+
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png', dpi=TILE_DPI)
+    metrics.observe_stage('tile_render', start)
+    return buf.getvalue()
+
+
+def _cache_get(key):
+    with _lock:
+        data = _cache.get(key)
+        if data is not None:
+            _cache.move_to_end(key)
+        return data
+
+
+def _cache_put(key, data):
+    limit = TILE_CACHE_MB * 1024 * 1024
+    with _lock:
+        if key in _cache:
+            return
+        _cache[key] = data
+        _cache_state['bytes'] += len(data)
+        while _cache_state['bytes'] > limit and _cache:
+            _, evicted = _cache.popitem(last=False)
+            _cache_state['bytes'] -= len(evicted)
+
+
+def get_tile(url, layers, z, x, y, fetch):
+    """
+    取瓦片PNG：缓存命中时直接返回，否则从场景存储加载场景并绘制
+    fetch: 场景存储中没有该方案时取BimJson的函数
+    """
+    # 没有场景文件版本（未启用场景存储或写入失败）时无法判断方案是否变化，不查缓存
+    key = (str(url), tuple(sorted(layers)), scenestore.scene_version(url), z, x, y)
+    data = _cache_get(key) if key[2] is not None else None
+    metrics.record_cache('tile', data is not None)
+    if data is not None:
+        return data
+    scene_key = key[:3]
+    with _lock:
+        scene = _scenes.get(scene_key) if key[2] is not None else None
+        if scene is not None:
+            _scenes.move_to_end(scene_key)
+    if scene is None:
+        scene = scenestore.get_scene(url, layers, fetch)
+        # 场景文件可能刚刚写入，按写入后的版本缓存
+        scene_key = key[:2] + (scenestore.scene_version(url),)
+        # 没有版本、或模型查询降级（部分构件为默认尺寸）的场景和瓦片不缓存，下次请求重新查询
+        if scene_key[2] is None or 'catalog' in deadline.degraded():
+            return render_tile(scene, z, x, y)
+        with _lock:
+            _scenes[scene_key] = scene
+            while len(_scenes) > TILE_SCENES:
+                _scenes.popitem(last=False)
+    data = render_tile(scene, z, x, y)
+    _cache_put(scene_key + key[3:], data)
+    return data